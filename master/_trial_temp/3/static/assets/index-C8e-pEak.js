@@ -0,0 +1 @@
+hashed js
\ No newline at end of file
@@ -13,7 +13,13 @@
 #
 # Copyright Buildbot Team Members
 
+from __future__ import annotations
+
+import fnmatch
+import re
+from typing import Any
 from typing import ClassVar
+from typing import Hashable
 from typing import Sequence
 
 from buildbot.util import ComparableMixin
@@ -21,6 +27,9 @@ from buildbot.util import NotABranch
 from buildbot.util.ssfilter import _create_branch_filters
 from buildbot.util.ssfilter import _create_filters
 from buildbot.util.ssfilter import _create_property_filters
+from buildbot.util.ssfilter import _FilterExactMatch
+from buildbot.util.ssfilter import _FilterRegex
+from buildbot.util.ssfilter import extract_filter_values
 
 
 class ChangeFilter(ComparableMixin):
@@ -186,3 +195,339 @@ class ChangeFilter(ComparableMixin):
             return ChangeFilter(**cfargs)
         else:
             return None
+
+
+class _RegexRoutes:
+    # The keys whose filter is a regex filter on a given change attribute. The filters with the
+    # same regexes are evaluated once, and all of them are first checked at once with a combined
+    # regex, which is enough to discard the changes that match none of them.
+
+    _DEFAULT_FLAGS = re.compile('').flags
+
+    def __init__(self) -> None:
+        # regex patterns and flags -> (filter, keys)
+        self.routes: dict[tuple, tuple[_FilterRegex, set[Hashable]]] = {}
+        self._combined: re.Pattern | None = None
+        self._combined_valid = False
+
+    def add(self, filter: _FilterRegex, key: Hashable) -> None:
+        regexes = tuple((r.pattern, r.flags) for r in filter.regexes)
+        self.routes.setdefault(regexes, (filter, set()))[1].add(key)
+        self._combined_valid = False
+
+    def remove(self, filter: _FilterRegex, key: Hashable) -> None:
+        regexes = tuple((r.pattern, r.flags) for r in filter.regexes)
+        keys = self.routes[regexes][1]
+        keys.discard(key)
+        if not keys:
+            del self.routes[regexes]
+        self._combined_valid = False
+
+    @classmethod
+    def _can_combine(cls, regex: re.Pattern) -> bool:
+        # the group numbers change once combined, which breaks the backreferences
+        return (
+            isinstance(regex.pattern, str)
+            and regex.flags == cls._DEFAULT_FLAGS
+            and re.search(r'\\[1-9]|\(\?P=', regex.pattern) is None
+        )
+
+    def _get_combined(self) -> re.Pattern | None:
+        if not self._combined_valid:
+            self._combined = None
+            self._combined_valid = True
+            patterns = [r for f, _ in self.routes.values() for r in f.regexes]
+            if all(self._can_combine(r) for r in patterns):
+                try:
+                    self._combined = re.compile('|'.join(f'(?:{r.pattern})' for r in patterns))
+                except re.error:
+                    # e.g. a pattern with global inline flags, which must come first
+                    pass
+        return self._combined
+
+    def match(self, value: Any) -> set[Hashable]:
+        if value is None:
+            return set()
+        combined = self._get_combined()
+        if combined is not None and combined.match(value) is None:
+            return set()
+        keys: set[Hashable] = set()
+        for filter, filter_keys in self.routes.values():
+            if filter.is_matched(value):
+                keys |= filter_keys
+        return keys
+
+
+class ChangeFilterIndex:
+    """
+    Index of change filters, which finds the filters that may match a change without evaluating
+    all of them.
+
+    Each filter is indexed on one of its filters on a change attribute, an exact match if it has
+    one and a regex otherwise: as all the filters must match, a change can only match the
+    filters whose indexed filter matches. The candidates must then be checked with
+    L{ChangeFilter.filter_change}, and the cost of finding them only depends on the number of
+    matching filters and of distinct regexes.
+    """
+
+    # the exact match filters are indexed on the first of these attributes they filter on
+    INDEXED_ATTRIBUTES = ('branch', 'repository', 'project', 'codebase', 'category')
+
+    def __init__(self) -> None:
+        # attribute -> value -> keys
+        self._exact: dict[str, dict[Any, set[Hashable]]] = {}
+        self._regex: dict[str, _RegexRoutes] = {}
+        self._unindexed: set[Hashable] = set()
+        # key -> how it is indexed, for removal
+        self._routes: dict[Hashable, tuple[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def add(self, key: Hashable, change_filter: ChangeFilter | None) -> None:
+        """
+        Adds a change filter, identified by C{key}. The filters that cannot be indexed, and
+        None, match all the changes.
+        """
+        assert key not in self._routes
+        filters = []
+        # the filters can only be relied on if they are the ones used to filter the changes
+        if (
+            isinstance(change_filter, ChangeFilter)
+            and type(change_filter).filter_change is ChangeFilter.filter_change
+        ):
+            filters = change_filter.filters
+        for attribute in self.INDEXED_ATTRIBUTES:
+            for filter in filters:
+                if isinstance(filter, _FilterExactMatch) and filter.prop == attribute:
+                    by_value = self._exact.setdefault(attribute, {})
+                    for value in filter.values:
+                        by_value.setdefault(value, set()).add(key)
+                    self._routes[key] = ('exact', filter)
+                    return
+        for filter in filters:
+            if isinstance(filter, _FilterRegex):
+                self._regex.setdefault(filter.prop, _RegexRoutes()).add(filter, key)
+                self._routes[key] = ('regex', filter)
+                return
+        self._unindexed.add(key)
+        self._routes[key] = ('unindexed', None)
+
+    def remove(self, key: Hashable) -> None:
+        kind, filter = self._routes.pop(key)
+        if kind == 'exact':
+            by_value = self._exact[filter.prop]
+            for value in filter.values:
+                keys = by_value.get(value)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del by_value[value]
+        elif kind == 'regex':
+            routes = self._regex[filter.prop]
+            routes.remove(filter, key)
+            if not routes.routes:
+                del self._regex[filter.prop]
+        else:
+            self._unindexed.discard(key)
+
+    def match(self, change) -> set[Hashable]:
+        """Returns the keys of the filters that may match the change"""
+        keys = set(self._unindexed)
+        for attribute, by_value in self._exact.items():
+            value = getattr(change, attribute, '')
+            try:
+                keys.update(by_value.get(value, ()))
+            except TypeError:
+                # not hashable, so it can match none of the values
+                pass
+        for attribute, routes in self._regex.items():
+            keys |= routes.match(getattr(change, attribute, ''))
+        return keys
+
+
+def _normalize_path_pattern(pattern: str) -> tuple[str, ...]:
+    if not pattern.strip('/'):
+        raise ValueError(f"Invalid path pattern {pattern!r}")
+    if pattern.endswith('/'):
+        # a directory matches all the files below it
+        pattern += '**'
+    if '/' not in pattern.rstrip('/'):
+        # a file name matches in any directory
+        pattern = '**/' + pattern
+    components = [c for c in pattern.strip('/').split('/') if c]
+    # consecutive '**' are equivalent to a single one
+    return tuple(
+        c for i, c in enumerate(components) if c != '**' or components[i - 1 : i] != ['**']
+    )
+
+
+class _PathTrieNode:
+    __slots__ = ('literals', 'wildcards', 'recursive', 'patterns')
+
+    def __init__(self) -> None:
+        # component -> node
+        self.literals: dict[str, _PathTrieNode] = {}
+        # component glob -> (compiled glob, node)
+        self.wildcards: dict[str, tuple[re.Pattern, _PathTrieNode]] = {}
+        # the node of '**', which matches any number of components
+        self.recursive: _PathTrieNode | None = None
+        # the patterns ending at this node
+        self.patterns: set[str] = set()
+
+
+class _PathTrie:
+    # Trie of the path patterns, split into components, so that the patterns sharing a prefix
+    # are matched once, and a path is only compared to the literal components through a hash
+    # lookup.
+
+    def __init__(self, patterns) -> None:
+        self.root = _PathTrieNode()
+        for pattern in patterns:
+            node = self.root
+            for component in _normalize_path_pattern(pattern):
+                if component == '**':
+                    if node.recursive is None:
+                        node.recursive = _PathTrieNode()
+                    node = node.recursive
+                elif any(c in component for c in '*?['):
+                    if component not in node.wildcards:
+                        regex = re.compile(fnmatch.translate(component))
+                        node.wildcards[component] = (regex, _PathTrieNode())
+                    node = node.wildcards[component][1]
+                else:
+                    node = node.literals.setdefault(component, _PathTrieNode())
+            node.patterns.add(pattern)
+
+    def match(self, path: str) -> frozenset[str]:
+        """Returns the patterns matching the path"""
+        components = [c for c in path.split('/') if c]
+        patterns: set[str] = set()
+        # (node, index of the next component, whether the node is a '**' node)
+        states = [(self.root, 0, False)]
+        seen = set()
+        while states:
+            node, index, recursive = states.pop()
+            if (id(node), index) in seen:
+                continue
+            seen.add((id(node), index))
+
+            if node.recursive is not None:
+                states.append((node.recursive, index, True))
+            if index == len(components):
+                patterns |= node.patterns
+                continue
+            if recursive:
+                # '**' consumes one more component
+                states.append((node, index + 1, True))
+            component = components[index]
+            child = node.literals.get(component)
+            if child is not None:
+                states.append((child, index + 1, False))
+            for regex, child in node.wildcards.values():
+                if regex.match(component):
+                    states.append((child, index + 1, False))
+        return frozenset(patterns)
+
+
+class ImportantFiles(ComparableMixin):
+    """
+    Declarative form of C{fileIsImportant}: a change is important if one of its files matches
+    one of the C{include} glob patterns, all the files if there are none, and none of the
+    C{exclude} patterns.
+    """
+
+    compare_attrs: ClassVar[Sequence[str]] = ('include', 'exclude')
+
+    def __init__(self, include=None, exclude=None):
+        self.include = tuple(
+            extract_filter_values(include, 'include') if include is not None else []
+        )
+        self.exclude = tuple(
+            extract_filter_values(exclude, 'exclude') if exclude is not None else []
+        )
+        for pattern in self.include + self.exclude:
+            _normalize_path_pattern(pattern)
+        self._index: ImportantFilesIndex | None = None
+
+    def __call__(self, change) -> bool:
+        if self._index is None:
+            self._index = ImportantFilesIndex()
+            self._index.add(None, self)
+        return bool(self._index.match(change.files))
+
+    def __repr__(self):
+        return f'<ImportantFiles include={list(self.include)} exclude={list(self.exclude)}>'
+
+
+class ImportantFilesIndex:
+    """
+    Index of L{ImportantFiles} rules, whose patterns are compiled together into a single path
+    trie: the files of a change are matched once, whatever the number of rules, and yield the
+    rules for which the change is important.
+    """
+
+    def __init__(self) -> None:
+        self._rules: dict[Hashable, ImportantFiles] = {}
+        # pattern -> keys of the rules including or excluding it
+        self._include: dict[str, set[Hashable]] = {}
+        self._exclude: dict[str, set[Hashable]] = {}
+        # keys of the rules without include patterns
+        self._include_all: set[Hashable] = set()
+        self._trie: _PathTrie | None = None
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def add(self, key: Hashable, rules: ImportantFiles) -> None:
+        assert key not in self._rules
+        self._rules[key] = rules
+        if not rules.include:
+            self._include_all.add(key)
+        for pattern in rules.include:
+            self._include.setdefault(pattern, set()).add(key)
+        for pattern in rules.exclude:
+            self._exclude.setdefault(pattern, set()).add(key)
+        self._trie = None
+
+    def remove(self, key: Hashable) -> None:
+        rules = self._rules.pop(key)
+        self._include_all.discard(key)
+        for patterns, pattern_keys in [
+            (rules.include, self._include),
+            (rules.exclude, self._exclude),
+        ]:
+            for pattern in patterns:
+                keys = pattern_keys[pattern]
+                keys.discard(key)
+                if not keys:
+                    del pattern_keys[pattern]
+        self._trie = None
+
+    def match(self, files, keys=None) -> set[Hashable]:
+        """
+        Returns the keys of the rules, among C{keys} if given, for which a change with the given
+        files is important.
+        """
+        wanted = set(self._rules) if keys is None else set(keys) & self._rules.keys()
+        if self._trie is None:
+            self._trie = _PathTrie(set(self._include) | set(self._exclude))
+
+        important: set[Hashable] = set()
+        seen_matches = set()
+        for path in files:
+            if important >= wanted:
+                break
+            patterns = self._trie.match(path)
+            # the files matching the same patterns are important for the same rules
+            if patterns in seen_matches:
+                continue
+            seen_matches.add(patterns)
+
+            included = set(self._include_all)
+            excluded: set[Hashable] = set()
+            for pattern in patterns:
+                included |= self._include.get(pattern, set())
+                excluded |= self._exclude.get(pattern, set())
+            important |= (included - excluded) & wanted
+        return important
@@ -44,6 +44,7 @@ from buildbot.util import service as util_service
 from buildbot.warnings import ConfigWarning
 from buildbot.www import auth
 from buildbot.www import avatar
+from buildbot.www import encoding
 from buildbot.www.authz import authz
 
 DEFAULT_DB_URL = 'sqlite:///state.sqlite'
@@ -156,6 +157,7 @@ class MasterConfig(util.ComparableMixin):
         self.codebaseGenerator = None
         self.prioritizeBuilders = None
         self.select_next_worker = None
+        self.build_distribution_concurrency = 1
         self.multiMaster = False
         self.manhole = None
         self.protocols = {}
@@ -194,6 +196,7 @@ class MasterConfig(util.ComparableMixin):
 
     _known_config_keys = set([
         "buildbotNetUsageData",
+        "build_distribution_concurrency",
         "buildbotURL",
         "buildCacheSize",
         "builders",
@@ -444,6 +447,15 @@ class MasterConfig(util.ComparableMixin):
         else:
             self.select_next_worker = select_next_worker
 
+        build_distribution_concurrency = config_dict.get('build_distribution_concurrency', 1)
+        if (
+            not isinstance(build_distribution_concurrency, int)
+            or build_distribution_concurrency < 1
+        ):
+            error("build_distribution_concurrency must be a positive integer")
+        else:
+            self.build_distribution_concurrency = build_distribution_concurrency
+
         protocols = config_dict.get('protocols', {})
         if isinstance(protocols, dict):
             for proto, options in protocols.items():
@@ -767,6 +779,7 @@ class MasterConfig(util.ComparableMixin):
             'allowed_origins',
             'auth',
             'authz',
+            'avatar_cache',
             'avatar_methods',
             'change_hook_auth',
             'change_hook_dialects',
@@ -781,6 +794,7 @@ class MasterConfig(util.ComparableMixin):
             'maxRotatedFiles',
             'plugins',
             'port',
+            'response_encoding',
             'rest_minimum_version',
             'ui_default_config',
             'versions',
@@ -816,6 +830,22 @@ class MasterConfig(util.ComparableMixin):
                     'be a datetime.timedelta'
                 )
 
+        avatar_cache = www_cfg.get('avatar_cache')
+        if avatar_cache is not None:
+            if not isinstance(avatar_cache, avatar.AvatarCache):
+                error(
+                    'Invalid www["avatar_cache"] configuration should '
+                    'be a buildbot.www.avatar.AvatarCache'
+                )
+
+        response_encoding = www_cfg.get('response_encoding')
+        if response_encoding is not None:
+            if not isinstance(response_encoding, encoding.ResponseEncodingPolicy):
+                error(
+                    'Invalid www["response_encoding"] configuration should '
+                    'be a buildbot.www.encoding.ResponseEncodingPolicy'
+                )
+
         self.www.update(www_cfg)
 
     def load_services(self, filename, config_dict):
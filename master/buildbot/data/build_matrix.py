@@ -0,0 +1,148 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import TYPE_CHECKING
+from typing import Any
+
+from buildbot.data import base
+from buildbot.data import changes
+from buildbot.data import types
+from buildbot.util import datetime2epoch
+from buildbot.util.twisted import async_to_deferred
+
+if TYPE_CHECKING:
+    from buildbot.db.builds import ChangeBuildModel
+    from buildbot.db.changes import ChangeModel
+
+
+BUILD_COLUMNS = ('buildrequestid', 'builderid', 'buildid', 'number', 'results', 'complete')
+
+
+def row_db_to_data(change: ChangeModel, builds: list[ChangeBuildModel]) -> dict[str, Any]:
+    return {
+        'changeid': change.changeid,
+        'author': change.author,
+        'comments': change.comments,
+        'branch': change.branch,
+        'revision': change.revision,
+        'revlink': change.revlink,
+        'when_timestamp': datetime2epoch(change.when_timestamp),
+        'repository': change.repository,
+        'codebase': change.codebase,
+        'project': change.project,
+        'sourcestampid': change.sourcestampid,
+        # the builds are sent column by column, which is much more compact than a list of
+        # objects repeating the keys
+        'builds': {column: [getattr(b, column) for b in builds] for column in BUILD_COLUMNS},
+    }
+
+
+class BuildColumnsType(types.Entity):
+    buildrequestid = types.List(of=types.Integer())
+    builderid = types.List(of=types.Integer())
+    buildid = types.List(of=types.NoneOk(types.Integer()))
+    number = types.List(of=types.NoneOk(types.Integer()))
+    results = types.List(of=types.NoneOk(types.Integer()))
+    complete = types.List(of=types.Boolean())
+
+
+class BuildMatrixEndpoint(base.Endpoint):
+    """
+    Returns the recent changes along with the builds started for them, which is all that the
+    grid and console views need, in two database queries.
+    """
+
+    kind = base.EndpointKind.COLLECTION
+    pathPatterns = """
+        /build_matrix
+    """
+
+    # number of changes returned when the request does not specify a limit
+    default_limit = 100
+
+    @async_to_deferred
+    async def get(
+        self, result_spec: base.ResultSpec, kwargs: Any
+    ) -> list[dict[str, Any]] | base.ListResult:
+        result_spec.fieldMapping = changes.FixerMixin.fieldMapping
+        if not result_spec.order:
+            result_spec.order = ('-changeid',)
+        if result_spec.limit is None:
+            result_spec.limit = self.default_limit
+
+        change_models = await self.master.db.changes.get_changes_without_details(
+            resultSpec=result_spec
+        )
+
+        builds_by_changeid = defaultdict(list)
+        for build in await self.master.db.builds.get_builds_for_changes([
+            c.changeid for c in change_models
+        ]):
+            builds_by_changeid[build.changeid].append(build)
+
+        rows = [row_db_to_data(c, builds_by_changeid[c.changeid]) for c in change_models]
+        if isinstance(change_models, base.ListResult):
+            return base.ListResult(
+                rows,
+                offset=change_models.offset,
+                total=change_models.total,
+                limit=change_models.limit,
+            )
+        return rows
+
+
+class BuildMatrixRow(base.ResourceType):
+    name = "build_matrix_row"
+    plural = "build_matrix"
+    endpoints = [BuildMatrixEndpoint]
+
+    # Rows are not sent as events, as finding the changes of a build would need additional
+    # queries for each build. Instead, the cells are sent keyed by build request, which allows
+    # the clients to update the rows they know about.
+    eventPathPatterns = """
+        /build_matrix/cells/:buildrequestid
+    """
+
+    class EntityType(types.Entity):
+        changeid = types.Integer()
+        author = types.String()
+        comments = types.String()
+        branch = types.NoneOk(types.String())
+        revision = types.NoneOk(types.String())
+        revlink = types.NoneOk(types.String())
+        when_timestamp = types.Integer()
+        repository = types.String()
+        codebase = types.String()
+        project = types.String()
+        sourcestampid = types.Integer()
+        builds = BuildColumnsType('build_matrix_builds')
+
+    entityType = EntityType(name)
+
+    def produce_build_event(self, build: dict[str, Any], event: str) -> None:
+        if build.get('buildrequestid') is None:
+            return
+        cell = {
+            'buildrequestid': build['buildrequestid'],
+            'builderid': build['builderid'],
+            'buildid': build['buildid'],
+            'number': build['number'],
+            'results': build['results'],
+            'complete': build['complete'],
+        }
+        self.produceEvent(cell, event)
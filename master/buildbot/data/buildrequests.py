@@ -115,6 +115,9 @@ class BuildRequestEndpoint(Db2DataMixin, base.Endpoint):
         yield self.master.db.buildrequests.set_build_requests_priority(
             brids=[brid], priority=priority
         )
+        # let the consumers keeping the requests in memory know about the new priority
+        brResource = self.master.data.getResourceType("buildrequest")
+        yield brResource.generateEvent([brid], 'priority_changed')
 
     @defer.inlineCallbacks
     def control(self, action, args, kwargs):
@@ -205,6 +208,17 @@ class BuildRequest(base.ResourceType):
         for br in events:
             self.produceEvent(br, event)
 
+    @defer.inlineCallbacks
+    def generate_buildset_events(self, bsid, brids, event):
+        """
+        Same as L{generateEvent} for build requests of a single buildset, which are all loaded
+        with a single query.
+        """
+        buildrequests = yield self.master.db.buildrequests.getBuildRequests(bsid=bsid)
+        by_brid = {br.buildrequestid: br for br in buildrequests}
+        for brid in brids:
+            self.produceEvent(_db2data(by_brid[brid], None), event)
+
     @defer.inlineCallbacks
     def callDbBuildRequests(self, brids, db_callable, event, **kw):
         if not brids:
@@ -229,6 +243,21 @@ class BuildRequest(base.ResourceType):
             claimed_at=claimed_at,
         )
 
+    @base.updateMethod
+    @defer.inlineCallbacks
+    def claimBuildRequestGroups(self, groups, claimed_at=None):
+        # like claimBuildRequests, but with a result for each group of brids
+        if not any(groups):
+            # empty buildrequest lists. No need to call db API
+            return [True] * len(groups)
+        claimed = yield self.master.db.buildrequests.claim_buildrequest_groups(
+            groups, claimed_at=claimed_at
+        )
+        yield self.generateEvent(
+            [brid for brids, ok in zip(groups, claimed) if ok for brid in brids], "claimed"
+        )
+        return claimed
+
     @base.updateMethod
     @defer.inlineCallbacks
     def unclaimBuildRequests(self, brids):
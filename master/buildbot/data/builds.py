@@ -224,6 +224,8 @@ class Build(base.ResourceType):
         # get the build and munge the result for the notification
         build = yield self.master.data.get(('builds', str(_id)))
         self.produceEvent(build, event)
+        if build is not None and event in ('new', 'finished'):
+            self.master.data.rtypes.build_matrix_row.produce_build_event(build, event)
 
     @base.updateMethod
     @defer.inlineCallbacks
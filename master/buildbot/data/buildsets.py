@@ -188,7 +188,7 @@ class Buildset(base.ResourceType):
 
         # notify about the component build requests
         brResource = self.master.data.getResourceType("buildrequest")
-        brResource.generateEvent(list(brids.values()), 'new')
+        yield brResource.generate_buildset_events(bsid, list(brids.values()), 'new')
 
         # and the buildset itself
         msg = {
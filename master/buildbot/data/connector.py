@@ -41,6 +41,7 @@ class RTypes:
 class DataConnector(service.AsyncService):
     submodules = [
         'buildbot.data.build_data',
+        'buildbot.data.build_matrix',
         'buildbot.data.builders',
         'buildbot.data.builds',
         'buildbot.data.buildrequests',
@@ -54,6 +55,7 @@ class DataConnector(service.AsyncService):
         'buildbot.data.buildsets',
         'buildbot.data.changes',
         'buildbot.data.changesources',
+        'buildbot.data.distributor_cycles',
         'buildbot.data.masters',
         'buildbot.data.sourcestamps',
         'buildbot.data.schedulers',
@@ -0,0 +1,78 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from typing import Any
+
+from twisted.internet import defer
+
+from buildbot.data import base
+from buildbot.data import types
+
+if TYPE_CHECKING:
+    from buildbot.data.resultspec import ResultSpec
+    from buildbot.master import BuildMaster
+
+
+def _get_recent_cycles(master: BuildMaster) -> list[dict[str, Any]]:
+    # the cycles are only kept in memory, by the build request distributor of this master
+    brd = getattr(master.botmaster, 'brd', None)
+    if brd is None:
+        return []
+    return [cycle.as_dict() for cycle in brd.recent_cycles]
+
+
+class DistributorCycleEndpoint(base.Endpoint):
+    kind = base.EndpointKind.SINGLE
+    pathPatterns = """
+        /distributor_cycles/n:cycleid
+    """
+
+    def get(
+        self, result_spec: ResultSpec, kwargs: dict[str, Any]
+    ) -> defer.Deferred[dict[str, Any] | None]:
+        for cycle in _get_recent_cycles(self.master):
+            if cycle['cycleid'] == kwargs['cycleid']:
+                return defer.succeed(cycle)
+        return defer.succeed(None)
+
+
+class DistributorCyclesEndpoint(base.Endpoint):
+    kind = base.EndpointKind.COLLECTION
+    pathPatterns = """
+        /distributor_cycles
+    """
+
+    def get(
+        self, result_spec: ResultSpec, kwargs: dict[str, Any]
+    ) -> defer.Deferred[list[dict[str, Any]]]:
+        return defer.succeed(_get_recent_cycles(self.master))
+
+
+class DistributorCycle(base.ResourceType):
+    name = "distributor_cycle"
+    plural = "distributor_cycles"
+    endpoints = [DistributorCycleEndpoint, DistributorCyclesEndpoint]
+
+    class EntityType(types.Entity):
+        cycleid = types.Integer()
+        started_at = types.Integer()
+        complete_at = types.NoneOk(types.Integer())
+        phases = types.JsonObject()
+        builders = types.JsonObject()
+
+    entityType = EntityType(name)
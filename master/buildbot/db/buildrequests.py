@@ -221,6 +221,43 @@ class BuildRequestsConnectorComponent(base.DBConnectorComponent):
 
         yield self.db.pool.do(thd)
 
+    @defer.inlineCallbacks
+    def claim_buildrequest_groups(self, groups, claimed_at=None):
+        """
+        Claims several groups of build requests, e.g. one group per build to start. All the
+        groups are inserted in a single transaction; if any of the requests turns out to be
+        already claimed, each group is claimed in its own transaction, so that a conflict only
+        fails the groups it affects.
+
+        @returns: a list of booleans telling whether each group was claimed, via Deferred
+        """
+        if claimed_at is not None:
+            claimed_at = datetime2epoch(claimed_at)
+        else:
+            claimed_at = int(self.master.reactor.seconds())
+        masterid = self.db.master.masterid
+
+        def claim(conn, brids):
+            transaction = conn.begin()
+            try:
+                conn.execute(
+                    self.db.model.buildrequest_claims.insert(),
+                    [{"brid": id, "masterid": masterid, "claimed_at": claimed_at} for id in brids],
+                )
+            except (sa.exc.IntegrityError, sa.exc.ProgrammingError):
+                transaction.rollback()
+                return False
+            transaction.commit()
+            return True
+
+        def thd(conn):
+            if claim(conn, [brid for brids in groups for brid in brids]):
+                return [True] * len(groups)
+            return [not brids or claim(conn, brids) for brids in groups]
+
+        res = yield self.db.pool.do(thd)
+        return res
+
     @defer.inlineCallbacks
     def unclaimBuildRequests(self, brids):
         yield self._unclaim_buildrequests_for_master(brids, self.db.master.masterid)
@@ -309,7 +346,7 @@ class BuildRequestsConnectorComponent(base.DBConnectorComponent):
                 q = reqs_tbl.update()
                 q = q.where(reqs_tbl.c.id.in_(batch))
                 q = q.where(reqs_tbl.c.complete != 1)
-                res = conn.execute(q, priority=priority)
+                res = conn.execute(q.values(priority=priority))
 
                 # if an incorrect number of rows were updated, then we failed.
                 if res.rowcount != len(batch):
@@ -69,6 +69,19 @@ class BuildModel:
         raise KeyError(key)
 
 
+@dataclass
+class ChangeBuildModel:
+    """A build request of a buildset created for a change, along with its latest build"""
+
+    changeid: int
+    buildrequestid: int
+    builderid: int
+    buildid: int | None
+    number: int | None
+    results: int | None
+    complete: bool
+
+
 class BuildsConnectorComponent(base.DBConnectorComponent):
     def _getBuild(self, whereclause) -> defer.Deferred[BuildModel | None]:
         def thd(conn) -> BuildModel | None:
@@ -180,6 +193,63 @@ class BuildsConnectorComponent(base.DBConnectorComponent):
 
         return self.db.pool.do(thd)
 
+    def get_builds_for_changes(
+        self, changeids: list[int]
+    ) -> defer.Deferred[list[ChangeBuildModel]]:
+        """
+        Returns the build requests created for the given changes, together with their builds,
+        using a single joined query per batch of changes. Requests that have not started yet
+        are returned with buildid set to None. A request with multiple builds (e.g. retried
+        builds) is returned once for each build, ordered by build id.
+        """
+
+        def thd(conn) -> list[ChangeBuildModel]:
+            changes_tbl = self.db.model.changes
+            bsss_tbl = self.db.model.buildset_sourcestamps
+            reqs_tbl = self.db.model.buildrequests
+            builds_tbl = self.db.model.builds
+
+            from_clause = changes_tbl.join(
+                bsss_tbl, changes_tbl.c.sourcestampid == bsss_tbl.c.sourcestampid
+            )
+            from_clause = from_clause.join(reqs_tbl, bsss_tbl.c.buildsetid == reqs_tbl.c.buildsetid)
+            from_clause = from_clause.outerjoin(
+                builds_tbl, reqs_tbl.c.id == builds_tbl.c.buildrequestid
+            )
+
+            rv: list[ChangeBuildModel] = []
+            for batch in self.doBatch(changeids, 100):
+                q = (
+                    sa.select(
+                        changes_tbl.c.changeid,
+                        reqs_tbl.c.id.label('buildrequestid'),
+                        reqs_tbl.c.builderid,
+                        builds_tbl.c.id.label('buildid'),
+                        builds_tbl.c.number,
+                        builds_tbl.c.results,
+                        builds_tbl.c.complete_at,
+                    )
+                    .select_from(from_clause)
+                    .where(changes_tbl.c.changeid.in_(batch))
+                    .order_by(reqs_tbl.c.id, builds_tbl.c.id)
+                )
+                res = conn.execute(q)
+                rv.extend(
+                    ChangeBuildModel(
+                        changeid=row.changeid,
+                        buildrequestid=row.buildrequestid,
+                        builderid=row.builderid,
+                        buildid=row.buildid,
+                        number=row.number,
+                        results=row.results,
+                        complete=row.complete_at is not None,
+                    )
+                    for row in res.fetchall()
+                )
+            return rv
+
+        return self.db.pool.do(thd)
+
     def getBuilds(
         self,
         builderid: int | None = None,
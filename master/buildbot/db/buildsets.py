@@ -159,30 +159,37 @@ class BuildsetsConnectorComponent(base.DBConnectorComponent):
 
             # and finish with a build request for each builder.  Note that
             # sqlalchemy and the Python DBAPI do not provide a way to recover
-            # inserted IDs from a multi-row insert, so this is done one row at
-            # a time.
+            # inserted IDs from a multi-row insert, so they are selected back
+            # once all the rows of this new buildset are inserted.
             brids = {}
             br_tbl = self.db.model.buildrequests
-            ins = br_tbl.insert()
-            for builderid in builderids:
-                r = conn.execute(
-                    ins,
-                    {
-                        "buildsetid": bsid,
-                        "builderid": builderid,
-                        "priority": priority,
-                        "claimed_at": 0,
-                        "claimed_by_name": None,
-                        "claimed_by_incarnation": None,
-                        "complete": 0,
-                        "results": -1,
-                        "submitted_at": submitted_at,
-                        "complete_at": None,
-                        "waited_for": 1 if waited_for else 0,
-                    },
+            if builderids:
+                conn.execute(
+                    br_tbl.insert(),
+                    [
+                        {
+                            "buildsetid": bsid,
+                            "builderid": builderid,
+                            "priority": priority,
+                            "claimed_at": 0,
+                            "claimed_by_name": None,
+                            "claimed_by_incarnation": None,
+                            "complete": 0,
+                            "results": -1,
+                            "submitted_at": submitted_at,
+                            "complete_at": None,
+                            "waited_for": 1 if waited_for else 0,
+                        }
+                        for builderid in builderids
+                    ],
                 )
-
-                brids[builderid] = r.inserted_primary_key[0]
+                q = (
+                    sa.select(br_tbl.c.id, br_tbl.c.builderid)
+                    .where(br_tbl.c.buildsetid == bsid)
+                    .order_by(br_tbl.c.id)
+                )
+                for row in conn.execute(q):
+                    brids[row.builderid] = row.id
 
             transaction.commit()
 
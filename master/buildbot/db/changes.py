@@ -347,6 +347,23 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
 
         return changes
 
+    def get_changes_without_details(self, resultSpec=None) -> defer.Deferred[list[ChangeModel]]:
+        """
+        Like getChanges, but retrieves all changes with a single query. The files and properties
+        of the returned changes are left empty.
+        """
+
+        def thd(conn) -> list[ChangeModel]:
+            changes_tbl = self.db.model.changes
+            q = changes_tbl.select()
+            if resultSpec is not None:
+                return resultSpec.thd_execute(conn, q, self._model_from_row_without_details)
+
+            res = conn.execute(q)
+            return [self._model_from_row_without_details(row) for row in res.fetchall()]
+
+        return self.db.pool.do(thd)
+
     def getChangesCount(self) -> defer.Deferred[int]:
         def thd(conn) -> int:
             changes_tbl = self.db.model.changes
@@ -425,17 +442,13 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
 
         yield self.db.pool.do_with_transaction(thd)
 
-    def _thd_model_from_row(self, conn, ch_row) -> ChangeModel:
-        # This method must be run in a db.pool thread
-        change_files_tbl = self.db.model.change_files
-        change_properties_tbl = self.db.model.change_properties
-
+    def _model_from_row_without_details(self, ch_row) -> ChangeModel:
         if ch_row.parent_changeids:
             parent_changeids = [ch_row.parent_changeids]
         else:
             parent_changeids = []
 
-        chdict = ChangeModel(
+        return ChangeModel(
             changeid=ch_row.changeid,
             parent_changeids=parent_changeids,
             author=ch_row.author,
@@ -452,6 +465,13 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
             sourcestampid=int(ch_row.sourcestampid),
         )
 
+    def _thd_model_from_row(self, conn, ch_row) -> ChangeModel:
+        # This method must be run in a db.pool thread
+        change_files_tbl = self.db.model.change_files
+        change_properties_tbl = self.db.model.change_properties
+
+        chdict = self._model_from_row_without_details(ch_row)
+
         query = change_files_tbl.select().where(change_files_tbl.c.changeid == ch_row.changeid)
         rows = conn.execute(query)
         chdict.files.extend(r.filename for r in rows)
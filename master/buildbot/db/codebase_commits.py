@@ -15,11 +15,17 @@
 
 from __future__ import annotations
 
+from array import array
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import TYPE_CHECKING
 from typing import Any
 from typing import Awaitable
 from typing import Callable
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
 
 import sqlalchemy as sa
 from twisted.internet import defer
@@ -30,6 +36,10 @@ from buildbot.util.twisted import async_to_deferred
 if TYPE_CHECKING:
     from buildbot.data.resultspec import ResultSpec
 
+    # (id, parent id, generation) of a commit
+    CommitParent = Tuple[int, Optional[int], Optional[int]]
+    GetAncestorsFallback = Callable[[List[int], int], Awaitable[List[CommitParent]]]
+
 
 @dataclass
 class CodebaseCommitModel:
@@ -44,35 +54,151 @@ class CodebaseCommitModel:
 
 
 UNKNOWN_COMMIT_ID = -1
+# parent id stored for the root commits
+NO_PARENT = -2
+UNKNOWN_GENERATION = -1
 
 
 class CodebaseCommitCache:
-    def __init__(self) -> None:
-        self._parents: dict[int, int] = {}
-
-    def add_parent(self, id: int, parent_id: int) -> None:
-        self._parents[id] = parent_id
+    """
+    Caches the parents and the generations of the commits whose ids are within a window of
+    C{max_size} ids, which slides to the newest commits as they are added. These are stored in
+    arrays indexed by commit id, so that walking the commit graph does not involve hashing.
+    The older commits are cached apart, evicting the least recently used ones beyond
+    C{old_max_size}.
+    """
+
+    def __init__(self, max_size: int = 100000, old_max_size: int = 10000) -> None:
+        self.max_size = max_size
+        self.old_max_size = old_max_size
+        self._base = 0
+        self._parents = array('q')
+        self._generations = array('q')
+        # id -> (parent, generation) of the commits older than the window
+        self._old: OrderedDict[int, tuple[int, int]] = OrderedDict()
+
+    def _index(self, id: int) -> int | None:
+        index = id - self._base
+        if 0 <= index < len(self._parents):
+            return index
+        return None
 
-    def get_parent(self, id: int) -> int:
-        return self._parents.get(id, UNKNOWN_COMMIT_ID)
+    def _make_room(self, id: int) -> int | None:
+        # grows the window so that it includes id, and returns the index of id in it
+        if not self._parents or id - self._base >= len(self._parents) + self.max_size:
+            self._base = id
+            self._parents = array('q', [UNKNOWN_COMMIT_ID])
+            self._generations = array('q', [UNKNOWN_GENERATION])
+            return 0
+
+        if id < self._base:
+            # older commits are only cached if they fit in the window
+            if self._base + len(self._parents) - id > self.max_size:
+                return None
+            count = self._base - id
+            self._parents = array('q', [UNKNOWN_COMMIT_ID]) * count + self._parents
+            self._generations = array('q', [UNKNOWN_GENERATION]) * count + self._generations
+            self._base = id
+            return 0
+
+        count = id - self._base + 1 - len(self._parents)
+        if count > 0:
+            self._parents.extend(array('q', [UNKNOWN_COMMIT_ID]) * count)
+            self._generations.extend(array('q', [UNKNOWN_GENERATION]) * count)
+            if len(self._parents) > self.max_size:
+                # drop a quarter of the window at once, so that sliding it is amortized
+                drop = len(self._parents) - self.max_size + self.max_size // 4
+                del self._parents[:drop]
+                del self._generations[:drop]
+                self._base += drop
+        return id - self._base
+
+    def add_parent(self, id: int, parent_id: int | None, generation: int | None = None) -> None:
+        parent = NO_PARENT if parent_id is None else parent_id
+        generation = UNKNOWN_GENERATION if generation is None else generation
+        index = self._make_room(id)
+        if index is None:
+            self._old[id] = (parent, generation)
+            self._old.move_to_end(id)
+            while len(self._old) > self.old_max_size:
+                self._old.popitem(last=False)
+            return
+        self._old.pop(id, None)
+        self._parents[index] = parent
+        self._generations[index] = generation
+
+    def _get(self, id: int) -> tuple[int, int]:
+        # returns the (parent, generation) of id, as stored
+        index = self._index(id)
+        if index is not None:
+            return self._parents[index], self._generations[index]
+        entry = self._old.get(id)
+        if entry is None:
+            return UNKNOWN_COMMIT_ID, UNKNOWN_GENERATION
+        self._old.move_to_end(id)
+        return entry
+
+    def add_parents(self, parents: Iterable[CommitParent]) -> None:
+        for id, parent_id, generation in parents:
+            self.add_parent(id, parent_id, generation)
+
+    def get_parent(self, id: int) -> int | None:
+        parent_id, _ = self._get(id)
+        return None if parent_id == NO_PARENT else parent_id
+
+    def get_generation(self, id: int) -> int | None:
+        _, generation = self._get(id)
+        return None if generation == UNKNOWN_GENERATION else generation
+
+    def _walk(
+        self, id: int, depth: int, fetched: dict[int, tuple[int | None, int | None]]
+    ) -> tuple[list[int], bool]:
+        # returns the chain of at most depth parents of id (including id), and whether it ends
+        # at a commit whose parent is unknown
+        chain = [id]
+        while True:
+            parent_id = self.get_parent(chain[-1])
+            if parent_id == UNKNOWN_COMMIT_ID and chain[-1] in fetched:
+                parent_id = fetched[chain[-1]][0]
+            if parent_id == UNKNOWN_COMMIT_ID:
+                return chain, True
+            if parent_id is None or len(chain) > depth:
+                return chain, False
+            chain.append(parent_id)
 
-    async def get_parent_with_fallback(
-        self, id: int, get_parent_fallback: Callable[[int], Awaitable[int]], default: int | None
+    def _lookup_generation(
+        self, id: int, fetched: dict[int, tuple[int | None, int | None]]
     ) -> int | None:
-        parent_id: int | None = self.get_parent(id)
-        if parent_id == UNKNOWN_COMMIT_ID:
-            parent_id = await get_parent_fallback(id)
-            if parent_id == UNKNOWN_COMMIT_ID:
-                parent_id = default
-            else:
-                self.add_parent(id, parent_id)
-        return parent_id
+        generation = self.get_generation(id)
+        if generation is None and id in fetched:
+            generation = fetched[id][1]
+        return generation
+
+    async def _prefill(
+        self, ids: list[int], depth: int, get_ancestors_fallback: GetAncestorsFallback
+    ) -> dict[int, tuple[int | None, int | None]]:
+        # loads the parts of the chains of ids missing from the cache with a single query
+        missing = []
+        missing_depth = 0
+        for id in ids:
+            chain, unknown_end = self._walk(id, depth, {})
+            if unknown_end:
+                missing.append(chain[-1])
+                missing_depth = max(missing_depth, depth + 1 - len(chain))
+
+        fetched: dict[int, tuple[int | None, int | None]] = {}
+        if missing:
+            ancestors = await get_ancestors_fallback(missing, missing_depth)
+            self.add_parents(ancestors)
+            # the old ancestors may not all stay cached
+            fetched = {id: (parent_id, generation) for id, parent_id, generation in ancestors}
+        return fetched
 
     async def first_common_parent_with_ranges(
         self,
         id1: int,
         id2: int,
-        get_parent_fallback: Callable[[int], Awaitable[int]],
+        get_ancestors_fallback: GetAncestorsFallback,
         depth: int = 100,
     ) -> tuple[int, list[int], list[int]] | None:
         """
@@ -84,37 +210,52 @@ class CodebaseCommitCache:
         - list of commit IDs from the parent commit to id2 (including parent commit and id2)
 
         If no parent is found, returns None
+
+        The ancestors missing from the cache are loaded by C{get_ancestors_fallback(ids, depth)},
+        which returns the (id, parent id, generation) tuples of C{ids} and of up to C{depth} of
+        their parents.
         """
         if id1 == id2:
-            parent1 = await self.get_parent_with_fallback(
-                id1, get_parent_fallback, UNKNOWN_COMMIT_ID
-            )
-            if parent1 == UNKNOWN_COMMIT_ID:
+            fetched = await self._prefill([id1], 0, get_ancestors_fallback)
+            _, unknown_end = self._walk(id1, 0, fetched)
+            if unknown_end:
                 return None
             return (id1, [id1], [id1])
 
-        parent1 = id1
-        parent2 = id2
-        known1 = [id1]
-        known2 = [id2]
-
-        for i in range(depth):
-            parent1 = await self.get_parent_with_fallback(parent1, get_parent_fallback, None)
-            if parent1 is None:
-                break
-            known1.append(parent1)
-
-        if parent2 in known1:
-            return (parent2, known1[known1.index(parent2) + 1 :: -1], known2)
-
-        for i in range(depth):
-            parent2_new = await self.get_parent_with_fallback(parent2, get_parent_fallback, None)
-            if parent2_new is None:
-                break
-            parent2 = parent2_new
-            known2.append(parent2)
-            if parent2 in known1:
-                return (parent2, known1[known1.index(parent2) :: -1], known2[::-1])
+        # the common parent is at most depth generations below both commits
+        generation1 = self.get_generation(id1)
+        generation2 = self.get_generation(id2)
+        if (
+            generation1 is not None
+            and generation2 is not None
+            and abs(generation1 - generation2) > depth
+        ):
+            return None
+
+        fetched = await self._prefill([id1, id2], depth, get_ancestors_fallback)
+        known1, _ = self._walk(id1, depth, fetched)
+        known2, _ = self._walk(id2, depth, fetched)
+
+        generation1 = self._lookup_generation(id1, fetched)
+        generation2 = self._lookup_generation(id2, fetched)
+        if generation1 is not None and generation2 is not None:
+            # each commit has a single parent, so the common parent is the first commit at the
+            # same generation in both chains
+            common_generation = min(generation1, generation2)
+            i1 = generation1 - common_generation
+            i2 = generation2 - common_generation
+            while i1 < len(known1) and i2 < len(known2):
+                if known1[i1] == known2[i2]:
+                    return (known1[i1], known1[i1::-1], known2[i2::-1])
+                i1 += 1
+                i2 += 1
+            return None
+
+        index1 = {id: i for i, id in enumerate(known1)}
+        for i2, parent in enumerate(known2):
+            found = index1.get(parent)
+            if found is not None:
+                return (parent, known1[found::-1], known2[i2::-1])
 
         return None
 
@@ -128,7 +269,7 @@ class CodebaseCommitsConnectorComponent(base.DBConnectorComponent):
     async def get_commit_by_revision(
         self, *, codebaseid: int, revision: str
     ) -> CodebaseCommitModel | None:
-        def thd(conn: sa.engine.Connection) -> CodebaseCommitModel | None:
+        def thd(conn: sa.engine.Connection) -> tuple[CodebaseCommitModel | None, int | None]:
             tbl = self.db.model.codebase_commits
             q = tbl.select().where(
                 (tbl.c.codebaseid == codebaseid) & (tbl.c.revision == revision),
@@ -137,41 +278,74 @@ class CodebaseCommitsConnectorComponent(base.DBConnectorComponent):
             row = res.fetchone()
 
             rv = None
+            generation: int | None = None
             if row:
                 rv = self._model_from_row(row)
+                generation = row.generation
             res.close()
-            return rv
+            return rv, generation
 
-        commit = await self.db.pool.do(thd)
+        commit, generation = await self.db.pool.do(thd)
         if commit is not None:
-            self._cache.add_parent(commit.id, commit.parent_commitid)
+            self._cache.add_parent(commit.id, commit.parent_commitid, generation)
         return commit
 
-    @async_to_deferred
-    async def _get_commit_parent_commitid(self, id: int) -> int:
-        def thd(conn: sa.engine.Connection) -> int | None:
-            q = self.db.model.codebase_commits.select().where(
-                self.db.model.codebase_commits.c.id == id,
+    def _get_commit_ancestors(
+        self, ids: list[int], depth: int
+    ) -> defer.Deferred[list[CommitParent]]:
+        """
+        Returns the (id, parent id, generation) tuples of the commits C{ids} and of up to C{depth}
+        of their ancestors, walking the commit graph with a single recursive query. The walk stops
+        at the commits more than C{depth} generations older than the newest of C{ids}.
+        """
+
+        def thd(conn: sa.engine.Connection) -> list[CommitParent]:
+            tbl = self.db.model.codebase_commits
+            starts = tbl.alias('starts')
+            min_generation = (
+                sa.select(sa.func.max(starts.c.generation) - depth)
+                .where(starts.c.id.in_(ids))
+                .scalar_subquery()
             )
+            ancestors = (
+                sa.select(
+                    tbl.c.id,
+                    tbl.c.parent_commitid,
+                    tbl.c.generation,
+                    sa.literal(0).label('depth'),
+                )
+                .where(tbl.c.id.in_(ids))
+                .cte('ancestors', recursive=True)
+            )
+            ancestors = ancestors.union_all(
+                sa.select(
+                    tbl.c.id, tbl.c.parent_commitid, tbl.c.generation, ancestors.c.depth + 1
+                ).where(
+                    tbl.c.id == ancestors.c.parent_commitid,
+                    ancestors.c.depth < depth,
+                    sa.or_(
+                        tbl.c.generation.is_(None),
+                        min_generation.is_(None),
+                        tbl.c.generation >= min_generation,
+                    ),
+                )
+            )
+            q = sa.select(
+                ancestors.c.id, ancestors.c.parent_commitid, ancestors.c.generation
+            ).distinct()
             res = conn.execute(q)
-            row = res.fetchone()
-
-            rv = None
-            if row:
-                rv = row.parent_commitid
-            else:
-                rv = UNKNOWN_COMMIT_ID
+            rv = [(row.id, row.parent_commitid, row.generation) for row in res.fetchall()]
             res.close()
             return rv
 
-        return await self.db.pool.do(thd)
+        return self.db.pool.do(thd)
 
     @async_to_deferred
     async def get_first_common_commit_with_ranges(
         self, first_commitid: int, last_commitid: int, depth: int = 100
     ) -> tuple[int, list[int], list[int]] | None:
         return await self._cache.first_common_parent_with_ranges(
-            first_commitid, last_commitid, self._get_commit_parent_commitid, depth=depth
+            first_commitid, last_commitid, self._get_commit_ancestors, depth=depth
         )
 
     def get_commit(self, id: int) -> defer.Deferred[CodebaseCommitModel | None]:
@@ -248,10 +422,17 @@ class CodebaseCommitsConnectorComponent(base.DBConnectorComponent):
 
         # TODO: handle files
 
-        def thd(conn: sa.engine.Connection) -> int:
-            q = self.db.model.codebase_commits.insert()
+        def thd(conn: sa.engine.Connection) -> tuple[int, int | None, list[CommitParent]]:
+            tbl = self.db.model.codebase_commits
+            generation: int | None = 0
+            if parent_commitid is not None:
+                res = conn.execute(sa.select(tbl.c.generation).where(tbl.c.id == parent_commitid))
+                parent_generation = res.scalar()
+                res.close()
+                generation = None if parent_generation is None else parent_generation + 1
+
             r = conn.execute(
-                q.values(
+                tbl.insert().values(
                     codebaseid=codebaseid,
                     author=author,
                     committer=committer,
@@ -259,12 +440,39 @@ class CodebaseCommitsConnectorComponent(base.DBConnectorComponent):
                     when_timestamp=when_timestamp,
                     revision=revision,
                     parent_commitid=parent_commitid,
+                    generation=generation,
                 )
             )
-            conn.commit()
             got_id = r.inserted_primary_key[0]
             r.close()
 
-            return got_id
+            # the commits added before their parent have no generation yet; now that their chain
+            # of parents is known, compute it level by level
+            backfilled: list[CommitParent] = []
+            level = [got_id]
+            level_generation = generation
+            while level and level_generation is not None:
+                level_generation += 1
+                res = conn.execute(
+                    sa.select(tbl.c.id, tbl.c.parent_commitid).where(
+                        tbl.c.parent_commitid.in_(level), tbl.c.generation.is_(None)
+                    )
+                )
+                children = [(row.id, row.parent_commitid) for row in res.fetchall()]
+                res.close()
+                level = [id for id, _ in children]
+                for i in range(0, len(level), 100):
+                    conn.execute(
+                        tbl.update()
+                        .where(tbl.c.id.in_(level[i : i + 100]))
+                        .values(generation=level_generation)
+                    )
+                backfilled.extend((id, parent_id, level_generation) for id, parent_id in children)
+            conn.commit()
+
+            return got_id, generation, backfilled
 
-        return await self.db.pool.do_with_transaction(thd)
+        id, generation, backfilled = await self.db.pool.do_with_transaction(thd)
+        self._cache.add_parent(id, parent_commitid, generation)
+        self._cache.add_parents(backfilled)
+        return id
@@ -0,0 +1,95 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+"""add generation column to codebase_commits table
+
+Revision ID: 068
+Revises: 067
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+from buildbot.util import sautils
+
+# revision identifiers, used by Alembic.
+revision = "068"
+down_revision = "067"
+branch_labels = None
+depends_on = None
+
+
+def _compute_generations(parents: dict[int, int | None]) -> dict[int, int | None]:
+    # the generation of a commit is the number of its ancestors, or None if its chain of parents
+    # does not end at a root
+    generations: dict[int, int | None] = {}
+    for id in parents:
+        chain: list[int] = []
+        on_chain: set[int] = set()
+        generation: int | None = None
+        while id not in generations:
+            if id not in parents or id in on_chain:
+                break
+            chain.append(id)
+            on_chain.add(id)
+            if parents[id] is None:
+                generation = -1
+                break
+            id = parents[id]  # type: ignore[assignment]
+        else:
+            generation = generations[id]
+
+        for id in reversed(chain):
+            if generation is not None:
+                generation += 1
+            generations[id] = generation
+    return generations
+
+
+def upgrade() -> None:
+    op.add_column("codebase_commits", sa.Column("generation", sa.Integer, nullable=True))
+
+    metadata = sa.MetaData()
+    commits_tbl = sautils.Table(
+        "codebase_commits",
+        metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("parent_commitid", sa.Integer, nullable=True),
+        sa.Column("generation", sa.Integer, nullable=True),
+    )
+
+    conn = op.get_bind()
+    res = conn.execute(sa.select(commits_tbl.c.id, commits_tbl.c.parent_commitid))
+    parents: dict[int, int | None] = {row.id: row.parent_commitid for row in res.fetchall()}
+    res.close()
+
+    by_generation: dict[int, list[int]] = {}
+    for id, generation in _compute_generations(parents).items():
+        if generation is not None:
+            by_generation.setdefault(generation, []).append(id)
+
+    for generation, ids in by_generation.items():
+        for i in range(0, len(ids), 100):
+            op.execute(
+                commits_tbl.update()
+                .where(commits_tbl.c.id.in_(ids[i : i + 100]))
+                .values({commits_tbl.c.generation: generation})
+            )
+
+
+def downgrade() -> None:
+    op.drop_column("codebase_commits", "generation")
@@ -709,6 +709,8 @@ class Model(base.DBConnectorComponent):
             sa.ForeignKey('codebase_commits.id', ondelete='SET NULL'),
             nullable=True,
         ),
+        # number of ancestors of the commit, NULL if its chain of parents is not completely known
+        sa.Column('generation', sa.Integer, nullable=True),
     )
 
     codebase_branches = sautils.Table(
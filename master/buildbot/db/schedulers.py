@@ -28,6 +28,7 @@ from buildbot.warnings import warn_deprecated
 
 if TYPE_CHECKING:
     from typing import Literal
+    from typing import Sequence
 
 
 class SchedulerAlreadyClaimedError(Exception):
@@ -89,20 +90,30 @@ class SchedulersConnectorComponent(base.DBConnectorComponent):
                     update_values=((tbl.c.important, imp_int),),
                     _race_hook=None,
                 )
-                conn.commit()
 
-        return self.db.pool.do(thd)
+        # the classifications are written in batches, in a single transaction
+        return self.db.pool.do_with_transaction(thd)
 
     def flushChangeClassifications(
-        self, schedulerid: int, less_than: int | None = None
+        self,
+        schedulerid: int,
+        less_than: int | None = None,
+        changeids: Sequence[int] | None = None,
     ) -> defer.Deferred[None]:
         def thd(conn) -> None:
             sch_ch_tbl = self.db.model.scheduler_changes
             wc = sch_ch_tbl.c.schedulerid == schedulerid
             if less_than is not None:
                 wc = wc & (sch_ch_tbl.c.changeid < less_than)
-            q = sch_ch_tbl.delete().where(wc)
-            conn.execute(q).close()
+            if changeids is None:
+                conn.execute(sch_ch_tbl.delete().where(wc)).close()
+                return
+            # limit the number of bound parameters of each query
+            for i in range(0, len(changeids), 100):
+                q = sch_ch_tbl.delete().where(
+                    wc & sch_ch_tbl.c.changeid.in_(changeids[i : i + 100])
+                )
+                conn.execute(q).close()
 
         return self.db.pool.do_with_transaction(thd)
 
@@ -145,6 +156,29 @@ class SchedulersConnectorComponent(base.DBConnectorComponent):
 
         return self.db.pool.do(thd)
 
+    def getChangeClassificationsForSchedulers(
+        self, schedulerids: Sequence[int]
+    ) -> defer.Deferred[dict[int, dict[int, bool]]]:
+        """
+        Returns the change classifications of several schedulers at once, as a dictionary
+        mapping each of C{schedulerids} to what L{getChangeClassifications} would return for it.
+        """
+
+        def thd(conn) -> dict[int, dict[int, bool]]:
+            sch_ch_tbl = self.db.model.scheduler_changes
+            rv: dict[int, dict[int, bool]] = {schedulerid: {} for schedulerid in schedulerids}
+            ids = list(rv)
+            # limit the number of bound parameters of each query
+            for i in range(0, len(ids), 100):
+                q = sa.select(
+                    sch_ch_tbl.c.schedulerid, sch_ch_tbl.c.changeid, sch_ch_tbl.c.important
+                ).where(sch_ch_tbl.c.schedulerid.in_(ids[i : i + 100]))
+                for r in conn.execute(q):
+                    rv[r.schedulerid][r.changeid] = bool(r.important)
+            return rv
+
+        return self.db.pool.do(thd)
+
     def findSchedulerId(self, name: str) -> int:
         tbl = self.db.model.schedulers
         name_hash = hash_columns(name)
@@ -119,6 +119,37 @@ class StateConnectorComponent(base.DBConnectorComponent):
         except ValueError as e:
             raise TypeError(f"JSON error loading state value '{name}' for {objectid}") from e
 
+    # returns a Deferred that returns a dictionary
+    def getStates(self, objectids, name):
+        """
+        Returns the value of the state C{name} of several objects at once, as a dictionary
+        mapping the objectids to the values; the objects without that state are omitted.
+        """
+
+        def thd(conn):
+            object_state_tbl = self.db.model.object_state
+            ids = sorted(set(objectids))
+            rv = {}
+            # limit the number of bound parameters of each query
+            for i in range(0, len(ids), 100):
+                q = sa.select(
+                    object_state_tbl.c.objectid,
+                    object_state_tbl.c.value_json,
+                ).where(
+                    object_state_tbl.c.objectid.in_(ids[i : i + 100]),
+                    object_state_tbl.c.name == name,
+                )
+                for row in conn.execute(q):
+                    try:
+                        rv[row.objectid] = json.loads(row.value_json)
+                    except ValueError as e:
+                        raise TypeError(
+                            f"JSON error loading state value '{name}' for {row.objectid}"
+                        ) from e
+            return rv
+
+        return self.db.pool.do(thd)
+
     # returns a Deferred that returns a value
     def setState(self, objectid, name, value):
         def thd(conn):
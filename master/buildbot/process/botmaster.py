@@ -26,6 +26,7 @@ from buildbot.db.buildrequests import AlreadyClaimedError
 from buildbot.process import metrics
 from buildbot.process.builder import Builder
 from buildbot.process.buildrequestdistributor import BuildRequestDistributor
+from buildbot.process.buildrequestindex import PendingBuildRequestIndex
 from buildbot.process.results import CANCELLED
 from buildbot.process.results import RETRY
 from buildbot.process.workerforbuilder import States
@@ -112,6 +113,10 @@ class BotMaster(service.ReconfigurableServiceMixin, service.AsyncMultiService, L
         self.buildrequest_consumer_unclaimed = None
         self.buildrequest_consumer_cancel = None
 
+        # the unclaimed build requests of each builder, kept in memory
+        self.pending_requests = PendingBuildRequestIndex()
+        self.pending_requests.setServiceParent(self)
+
         # a distributor for incoming build requests; see below
         self.brd = BuildRequestDistributor(self)
         self.brd.setServiceParent(self)
@@ -476,9 +481,12 @@ class BotMaster(service.ReconfigurableServiceMixin, service.AsyncMultiService, L
         builders = self.getBuildersForWorker(worker_name)
         self.brd.maybeStartBuildsOn([b.name for b in builders])
 
-    def maybeStartBuildsForAllBuilders(self):
+    def maybeStartBuildsForAllBuilders(self, skip_blocked=False):
         """
         Call this when something suggests that this would be a good time to
         start some builds, but nothing more specific.
+
+        @param skip_blocked: if true, skip the builders waiting for a lock to be
+        released; they are retried when it is
         """
-        self.brd.maybeStartBuildsOn(self.builderNames)
+        self.brd.maybeStartBuildsOn(self.builderNames, skip_parked=skip_blocked)
@@ -797,11 +797,8 @@ class Build(properties.PropertiesMixin):
         # may be started for a completely unrelated builder and yet depend on
         # a lock released by this build.
         #
-        # TODO: the current approach is dumb as we just attempt to schedule
-        # all buildrequests. A much better idea would be to record the reason
-        # of why a buildrequest was not scheduled in the BuildRequestDistributor
-        # and then attempt to schedule only these buildrequests which may have
-        # had that reason resolved.
+        # The builders that the BuildRequestDistributor saw blocked on a lock
+        # are skipped: they are retried when that lock is released.
 
         # this function is complicated by the fact that the botmaster must be
         # informed only when all locks have been released and the actions in
@@ -814,7 +811,7 @@ class Build(properties.PropertiesMixin):
             return
 
         if self._locks_released and self._build_finished:
-            self.builder.botmaster.maybeStartBuildsForAllBuilders()
+            self.builder.botmaster.maybeStartBuildsForAllBuilders(skip_blocked=True)
 
     def getSummaryStatistic(self, name, summary_fn, initial_value=_sentinel):
         step_stats_list = [
@@ -25,9 +25,9 @@ from twisted.internet import defer
 from twisted.python import log
 
 from buildbot import interfaces
-from buildbot.data import resultspec
 from buildbot.data.workers import Worker
 from buildbot.interfaces import IRenderable
+from buildbot.locks import LockAccess
 from buildbot.process import buildrequest
 from buildbot.process import workerforbuilder
 from buildbot.process.build import Build
@@ -77,6 +77,14 @@ class Builder(util_service.ReconfigurableServiceMixin, service.MultiService):
         # old_building holds active builds that were stolen from a predecessor
         self.old_building: weakref.WeakKeyDictionary[Build, Any] = weakref.WeakKeyDictionary()
 
+        # locks that prevented builds from starting, with the requested access; the
+        # BuildRequestDistributor clears it and waits for these locks to be released
+        self.blocking_locks: dict[Any, Any] = {}
+        # locks of the builds chosen by canStartBuild but not started yet, with the requested
+        # access; these count as claimed, so that the builds chosen together do not overbook the
+        # locks. The BuildRequestDistributor clears it once the chosen builds are started
+        self.lock_reservations: list[tuple[Any, Any]] = []
+
         # workers which have connected but which are not yet available.
         # These are always in the ATTACHING state.
         self.attaching_workers: list[Worker] = []
@@ -183,15 +191,8 @@ class Builder(util_service.ReconfigurableServiceMixin, service.MultiService):
         @returns: datetime instance or None, via Deferred
         """
         bldrid = yield self.getBuilderId()
-        unclaimed = yield self.master.data.get(
-            ('builders', bldrid, 'buildrequests'),
-            [resultspec.Filter('claimed', 'eq', [False])],
-            order=['submitted_at'],
-            limit=1,
-        )
-        if unclaimed:
-            return unclaimed[0]['submitted_at']
-        return None
+        queue = yield self.botmaster.pending_requests.get_queue(bldrid)
+        return queue.get_oldest_request_time()
 
     @defer.inlineCallbacks
     def getNewestCompleteTime(self):
@@ -201,16 +202,8 @@ class Builder(util_service.ReconfigurableServiceMixin, service.MultiService):
         @returns: datetime instance or None, via Deferred
         """
         bldrid = yield self.getBuilderId()
-        completed = yield self.master.data.get(
-            ('builders', bldrid, 'buildrequests'),
-            [resultspec.Filter('complete', 'eq', [True])],
-            order=['-complete_at'],
-            limit=1,
-        )
-        if completed:
-            return completed[0]['complete_at']
-        else:
-            return None
+        newest = yield self.botmaster.pending_requests.get_newest_complete_time(bldrid)
+        return newest
 
     @defer.inlineCallbacks
     def get_highest_priority(self):
@@ -220,15 +213,40 @@ class Builder(util_service.ReconfigurableServiceMixin, service.MultiService):
         @returns: priority or None, via Deferred
         """
         bldrid = yield self.getBuilderId()
-        unclaimed = yield self.master.data.get(
-            ('builders', bldrid, 'buildrequests'),
-            [resultspec.Filter('claimed', 'eq', [False])],
-            order=['-priority'],
-            limit=1,
-        )
-        if unclaimed:
-            return unclaimed[0]['priority']
-        return None
+        queue = yield self.botmaster.pending_requests.get_queue(bldrid)
+        return queue.get_highest_priority()
+
+    @defer.inlineCallbacks
+    def load_request_stats(self):
+        """Loads the build request statistics of this builder into memory, so
+        that oldest_request_time, newest_complete_time and highest_priority
+        can be read without I/O.  They are then kept up to date from the
+        buildrequests messages.
+        """
+        bldrid = yield self.getBuilderId()
+        yield self.botmaster.pending_requests.get_queue(bldrid)
+        yield self.botmaster.pending_requests.get_newest_complete_time(bldrid)
+
+    @property
+    def oldest_request_time(self):
+        """The submitted_at of the oldest unclaimed build request, or None if
+        there are none or they have not been loaded by load_request_stats"""
+        queue = self.botmaster.pending_requests.peek_queue(self._builderid)
+        return queue.get_oldest_request_time() if queue is not None else None
+
+    @property
+    def newest_complete_time(self):
+        """The complete_at of the latest completed build request, or None if
+        there are none or it has not been loaded by load_request_stats"""
+        return self.botmaster.pending_requests.peek_newest_complete_time(self._builderid)
+
+    @property
+    def highest_priority(self):
+        """The priority of the highest priority unclaimed build request, or
+        None if there are none or they have not been loaded by
+        load_request_stats"""
+        queue = self.botmaster.pending_requests.peek_queue(self._builderid)
+        return queue.get_highest_priority() if queue is not None else None
 
     def getBuild(self, number):
         for b in self.building:
@@ -370,13 +388,29 @@ class Builder(util_service.ReconfigurableServiceMixin, service.MultiService):
 
         if callable(self.config.canStartBuild):
             can_start = yield self.config.canStartBuild(self, workerforbuilder, buildrequest)
+        if can_start and locks_to_acquire:
+            self.lock_reservations.extend(locks_to_acquire)
         return can_start
 
     def _can_acquire_locks(self, lock_list):
+        can_acquire = True
         for lock, access in lock_list:
             if not lock.isAvailable(None, access):
-                return False
-        return True
+                self.blocking_locks[lock] = access
+                can_acquire = False
+            elif not self._can_reserve_lock(lock, access):
+                # the lock is free, but reserved by a build that is not started yet
+                can_acquire = False
+        return can_acquire
+
+    def _can_reserve_lock(self, lock, access):
+        reserved = [a for reserved_lock, a in self.lock_reservations if reserved_lock is lock]
+        if not reserved or not access.count:
+            return True
+        if access.mode != 'counting' or any(a.mode != 'counting' for a in reserved):
+            return False
+        count = access.count + sum(a.count for a in reserved)
+        return lock.isAvailable(None, LockAccess(access.lockid, 'counting', count))
 
     @defer.inlineCallbacks
     def _startBuildFor(self, workerforbuilder, buildrequests):
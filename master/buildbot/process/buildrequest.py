@@ -16,11 +16,13 @@
 from __future__ import annotations
 
 import calendar
+import json
 from typing import TYPE_CHECKING
 
 from twisted.internet import defer
 
 from buildbot.data import resultspec
+from buildbot.process import builder
 from buildbot.process import properties
 from buildbot.process.results import SKIPPED
 
@@ -51,35 +53,71 @@ class BuildRequestCollapser:
     @defer.inlineCallbacks
     def _getUnclaimedBrs(self, builderid):
         # Retrieve the list of Brs for all unclaimed builds
-        unclaim_brs = yield self.master.data.get(
-            ('builders', builderid, 'buildrequests'), [resultspec.Filter('claimed', 'eq', [False])]
-        )
+        queue = yield self.master.botmaster.pending_requests.get_queue(builderid)
+        unclaim_brs = list(queue.requests.values())
         # sort by submitted_at, so the first is the oldest
         unclaim_brs.sort(key=lambda brd: brd['submitted_at'])
         return unclaim_brs
 
+    @defer.inlineCallbacks
+    def _getCollapsibleBrids(self, br):
+        # Default collapse strategy: rather than comparing the new request with every unclaimed
+        # request, look up the requests that have the same collapse key
+        index = self.master.botmaster.pending_requests
+        queue = yield index.get_queue(br['builderid'])
+        # the keys of the requests are computed once, when they are first needed
+        for unclaim_br in queue.get_unkeyed():
+            key = yield index.get_collapse_key(unclaim_br['buildsetid'])
+            queue.set_collapse_key(unclaim_br['buildrequestid'], key)
+
+        key = yield index.get_collapse_key(br['buildsetid'])
+        if key is None:
+            return []
+        return [
+            brid
+            for brid in queue.get_collapsible(key)
+            if brid < br['buildrequestid']
+            or (
+                brid != br['buildrequestid']
+                and queue.requests[brid]['buildsetid'] == br['buildsetid']
+            )
+        ]
+
     @defer.inlineCallbacks
     def collapse(self):
         brids_to_collapse = set()
 
+        # Get the BuildRequest objects, and the names of their builders, at once
+        brs = yield self.master.data.get(
+            ('buildrequests',), filters=[resultspec.Filter('buildrequestid', 'in', self.brids)]
+        )
+        brs_by_id = {br['buildrequestid']: br for br in brs}
+        bldrdicts = yield self.master.data.get(
+            ('builders',),
+            filters=[resultspec.Filter('builderid', 'in', [br['builderid'] for br in brs])],
+        )
+        builder_names = {bldrdict['builderid']: bldrdict['name'] for bldrdict in bldrdicts}
+
         for brid in self.brids:
-            # Get the BuildRequest object
-            br = yield self.master.data.get(('buildrequests', brid))
-            # Retrieve the buildername
+            br = brs_by_id.get(brid)
+            if br is None:
+                continue
             builderid = br['builderid']
-            bldrdict = yield self.master.data.get(('builders', builderid))
             # Get the builder object
-            bldr = self.master.botmaster.builders.get(bldrdict['name'])
+            bldr = self.master.botmaster.builders.get(builder_names.get(builderid))
             if not bldr:
                 continue
             # Get the Collapse BuildRequest function (from the configuration)
             collapseRequestsFn = bldr.getCollapseRequestsFn()
-            unclaim_brs = yield self._getUnclaimedBrs(builderid)
+            if not collapseRequestsFn:
+                continue
 
-            # short circuit if there is no merging to do
-            if not collapseRequestsFn or not unclaim_brs:
+            if collapseRequestsFn is builder.Builder._defaultCollapseRequestFn:
+                brids = yield self._getCollapsibleBrids(br)
+                brids_to_collapse.update(brids)
                 continue
 
+            unclaim_brs = yield self._getUnclaimedBrs(builderid)
             for unclaim_br in unclaim_brs:
                 if unclaim_br['buildrequestid'] == br['buildrequestid']:
                     continue
@@ -88,12 +126,16 @@ class BuildRequestCollapser:
                 if canCollapse is True:
                     brids_to_collapse.add(unclaim_br['buildrequestid'])
 
-        collapsed_brids = []
-        for brid in brids_to_collapse:
-            claimed = yield self.master.data.updates.claimBuildRequests([brid])
-            if claimed:
-                yield self.master.data.updates.completeBuildRequests([brid], SKIPPED)
-                collapsed_brids.append(brid)
+        if not brids_to_collapse:
+            return []
+
+        # claim each request separately, so that the requests claimed by someone else in the
+        # meantime do not prevent collapsing the others, but in a single transaction
+        groups = [[brid] for brid in sorted(brids_to_collapse)]
+        claimed = yield self.master.data.updates.claimBuildRequestGroups(groups)
+        collapsed_brids = [brids[0] for brids, ok in zip(groups, claimed) if ok]
+        if collapsed_brids:
+            yield self.master.data.updates.completeBuildRequests(collapsed_brids, SKIPPED)
 
         return collapsed_brids
 
@@ -274,6 +316,38 @@ class BuildRequest:
             if name != 'scheduler' and source == 'Scheduler'
         }
 
+    @staticmethod
+    @defer.inlineCallbacks
+    def getCollapseKey(master, buildsetid):
+        """
+        Returns the attributes of a buildset that the default collapse strategy compares, via
+        Deferred: the requests of two buildsets with the same key can be collapsed by
+        canBeCollapsed, provided the new request is newer than the old one. The requests of a
+        buildset with a patch are only collapsed with the other requests of the same buildset, so
+        the key of such a buildset is its id.
+        """
+        buildset = yield master.data.get(('buildsets', str(buildsetid)))
+        sources = []
+        for ss in sorted(buildset['sourcestamps'], key=lambda ss: ss['codebase']):
+            # anything with a patch won't be collapsed with other buildsets
+            if ss['patch']:
+                return ('buildset', buildsetid)
+            changes = yield master.data.get(('sourcestamps', ss['ssid'], 'changes'), limit=1)
+            # the revisions only matter if there are no changes
+            revision = None if changes else ss['revision']
+            sources.append((
+                ss['codebase'],
+                ss['repository'],
+                ss['branch'],
+                ss['project'],
+                bool(changes),
+                revision,
+            ))
+
+        bs_props = yield master.data.get(('buildsets', str(buildsetid), 'properties'))
+        bs_props = BuildRequest.filter_buildset_props_for_collapsing(bs_props)
+        return (tuple(sources), json.dumps(bs_props, sort_keys=True))
+
     @staticmethod
     @defer.inlineCallbacks
     def canBeCollapsed(master, new_br, old_br):
@@ -15,28 +15,38 @@
 
 from __future__ import annotations
 
+import collections
+import contextlib
 import copy
+import functools
+import heapq
 import math
 import random
+import statistics
 from datetime import datetime
 from typing import TYPE_CHECKING
+from typing import Any
 
 from twisted.internet import defer
 from twisted.python import log
 from twisted.python.failure import Failure
 
+from buildbot.config.errors import error
 from buildbot.data import resultspec
 from buildbot.db.buildrequests import BuildRequestModel
 from buildbot.process import metrics
 from buildbot.process.buildrequest import BuildRequest
+from buildbot.process.results import CANCELLED
+from buildbot.process.results import EXCEPTION
+from buildbot.process.results import RETRY
 from buildbot.util import deferwaiter
 from buildbot.util import epoch2datetime
 from buildbot.util import service
-from buildbot.util.async_sort import async_sort
 from buildbot.util.twisted import async_to_deferred
 
 if TYPE_CHECKING:
     from buildbot.process.builder import Builder
+    from buildbot.process.buildrequestindex import PendingBuildRequestIndex
 
 
 class BuildChooserBase:
@@ -57,11 +67,21 @@ class BuildChooserBase:
     # chooseNextBuild() that delegates out to two other functions:
     #   * bc.popNextBuild() - get the next (worker, breq) pair
 
+    # set by the BuildRequestDistributor, so that the unclaimed requests are read from memory
+    pending_requests: PendingBuildRequestIndex | None = None
+    # time spent fetching the unclaimed requests, reported in the distribution cycle profile
+    fetch_time = 0.0
+
     def __init__(self, bldr, master):
         self.bldr = bldr
         self.master = master
         self.breqCache = {}
+        # brid -> brdict, ordered by brid; see _fetchUnclaimedBrdicts
         self.unclaimedBrdicts = None
+        # (-priority, brid) heap; may contain brids removed from unclaimedBrdicts
+        self._brdictsByPriority = None
+        # builderid -> builder name
+        self._builderNames = {}
 
     @defer.inlineCallbacks
     def chooseNextBuild(self):
@@ -82,21 +102,51 @@ class BuildChooserBase:
     # - Helper functions that are generally useful to all subclasses -
     @defer.inlineCallbacks
     def _fetchUnclaimedBrdicts(self):
-        # Sets up a cache of all the unclaimed brdicts. The cache is
+        # Sets up a cache of all the unclaimed brdicts, keyed by buildrequestid. The cache is
         # saved at self.unclaimedBrdicts cache. If the cache already
         # exists, this function does nothing. If a refetch is desired, set
         # the self.unclaimedBrdicts to None before calling."""
         if self.unclaimedBrdicts is None:
-            # TODO: use order of the DATA API
-            brdicts = yield self.master.data.get(
-                ('builders', (yield self.bldr.getBuilderId()), 'buildrequests'),
-                [resultspec.Filter('claimed', 'eq', [False])],
-            )
+            started_at = self.master.reactor.seconds()
+            builderid = yield self.bldr.getBuilderId()
+            if self.pending_requests is not None:
+                queue = yield self.pending_requests.get_queue(builderid)
+                brdicts = list(queue.requests.values())
+            else:
+                brdicts = yield self.master.data.get(
+                    ('builders', builderid, 'buildrequests'),
+                    [resultspec.Filter('claimed', 'eq', [False])],
+                )
             # sort by buildrequestid, so the first is the oldest
             brdicts.sort(key=lambda brd: brd['buildrequestid'])
-            self.unclaimedBrdicts = brdicts
+            self.unclaimedBrdicts = {brd['buildrequestid']: brd for brd in brdicts}
+            self._brdictsByPriority = [(-brd['priority'], brd['buildrequestid']) for brd in brdicts]
+            heapq.heapify(self._brdictsByPriority)
+            self.fetch_time += self.master.reactor.seconds() - started_at
         return self.unclaimedBrdicts
 
+    def _getHighestPriorityBrdict(self):
+        # Returns the unclaimed brdict with the highest priority, the oldest one
+        # if several have the same priority
+        heap = self._brdictsByPriority
+        while heap:
+            brdict = self.unclaimedBrdicts.get(heap[0][1])
+            if brdict is not None:
+                return brdict
+            heapq.heappop(heap)
+        return None
+
+    @defer.inlineCallbacks
+    def _getBuilderName(self, builderid):
+        if builderid not in self._builderNames:
+            builder = yield self.master.data.get(
+                ('builders', builderid), [resultspec.ResultSpec(fields=['name'])]
+            )
+            if not builder:
+                return None
+            self._builderNames[builderid] = builder['name']
+        return self._builderNames[builderid]
+
     @defer.inlineCallbacks
     def _getBuildRequestForBrdict(self, brdict: dict):
         # Turn a brdict into a BuildRequest into a brdict. This is useful
@@ -104,17 +154,15 @@ class BuildChooserBase:
 
         breq = self.breqCache.get(brdict['buildrequestid'])
         if not breq:
-            builder = yield self.master.data.get(
-                ('builders', brdict['builderid']), [resultspec.ResultSpec(fields=['name'])]
-            )
-            if not builder:
+            buildername = yield self._getBuilderName(brdict['builderid'])
+            if buildername is None:
                 return None
 
             model = BuildRequestModel(
                 buildrequestid=brdict['buildrequestid'],
                 buildsetid=brdict['buildsetid'],
                 builderid=brdict['builderid'],
-                buildername=builder['name'],
+                buildername=buildername,
                 submitted_at=brdict['submitted_at'],
             )
             if 'complete_at' in brdict:
@@ -144,11 +192,7 @@ class BuildChooserBase:
         if breq is None:
             return None
 
-        brid = breq.id
-        for brdict in self.unclaimedBrdicts:
-            if brid == brdict['buildrequestid']:
-                return brdict
-        return None
+        return self.unclaimedBrdicts.get(breq.id)
 
     def _removeBuildRequest(self, breq):
         # Remove a BuildrRequest object (and its brdict)
@@ -157,17 +201,13 @@ class BuildChooserBase:
         if breq is None:
             return
 
-        brdict = self._getBrdictForBuildRequest(breq)
-        if brdict is not None:
-            self.unclaimedBrdicts.remove(brdict)
-
-        if breq.id in self.breqCache:
-            del self.breqCache[breq.id]
+        self.unclaimedBrdicts.pop(breq.id, None)
+        self.breqCache.pop(breq.id, None)
 
     def _getUnclaimedBuildRequests(self):
         # Retrieve the list of BuildRequest objects for all unclaimed builds
         return defer.gatherResults(
-            [self._getBuildRequestForBrdict(brdict) for brdict in self.unclaimedBrdicts],
+            [self._getBuildRequestForBrdict(brdict) for brdict in self.unclaimedBrdicts.values()],
             consumeErrors=True,
         )
 
@@ -268,9 +308,7 @@ class BasicBuildChooser(BuildChooserBase):
                 nextBreq = None
         else:
             # otherwise just return the build with highest priority
-            brdict = sorted(self.unclaimedBrdicts.data, key=lambda b: b['priority'], reverse=True)[
-                0
-            ]
+            brdict = self._getHighestPriorityBrdict()
             nextBreq = yield self._getBuildRequestForBrdict(brdict)
 
         return nextBreq
@@ -306,6 +344,325 @@ class BasicBuildChooser(BuildChooserBase):
         return self.bldr.canStartBuild(worker, breq)
 
 
+class PredictiveWorkerSelector:
+    """
+    A nextWorker function that picks the worker expected to run the build the fastest.
+
+    The expected duration of a build on a worker is the mean duration of its last builds for the
+    same builder if it ran one within ``warm_period`` seconds, as its build directory is likely
+    to be up to date. Otherwise the worker is cold, and the expected duration is the mean
+    duration of the builds of the builder on any worker multiplied by ``cold_penalty``. The last
+    ``history`` builds of each builder are kept in memory for ``cache_ttl`` seconds. Workers
+    without any history are picked at random.
+    """
+
+    def __init__(
+        self,
+        history: int = 50,
+        warm_period: float = 24 * 60 * 60,
+        cold_penalty: float = 1.5,
+        cache_ttl: float = 5 * 60,
+    ):
+        if not isinstance(history, int) or history <= 0:
+            error("history must be a positive integer")
+        if cold_penalty < 1:
+            error("cold_penalty must be at least 1")
+        self.history = history
+        self.warm_period = warm_period
+        self.cold_penalty = cold_penalty
+        self.cache_ttl = cache_ttl
+        # builderid -> (time of the load, workerid -> (last complete time, durations), durations)
+        self._stats: dict[int, tuple[float, dict[int, tuple[float, list[float]]], list[float]]] = {}
+
+    @async_to_deferred
+    async def _get_stats(self, bldr: Builder):
+        master = bldr.master
+        assert master is not None
+        builderid = await bldr.getBuilderId()
+        now = master.reactor.seconds()
+        if builderid in self._stats and now - self._stats[builderid][0] < self.cache_ttl:
+            return self._stats[builderid]
+
+        builds = await master.data.get(
+            ('builders', builderid, 'builds'),
+            [resultspec.Filter('complete', 'eq', [True])],
+            order=['-buildid'],
+            limit=self.history,
+        )
+        workers: dict[int, tuple[float, list[float]]] = {}
+        all_durations = []
+        for build in builds:
+            complete_at = build['complete_at'].timestamp()
+            last_complete, durations = workers.setdefault(build['workerid'], (complete_at, []))
+            # interrupted builds say nothing about the time a build takes
+            if build['results'] not in (EXCEPTION, RETRY, CANCELLED):
+                duration = complete_at - build['started_at'].timestamp()
+                durations.append(duration)
+                all_durations.append(duration)
+        stats = (now, workers, all_durations)
+        self._stats[builderid] = stats
+        return stats
+
+    @async_to_deferred
+    async def __call__(self, bldr: Builder, workers: list, buildrequest=None):
+        if not workers:
+            return None
+        assert bldr.master is not None
+        now = bldr.master.reactor.seconds()
+        _, worker_stats, all_durations = await self._get_stats(bldr)
+        if not all_durations:
+            return random.choice(workers)
+        cold_duration = statistics.fmean(all_durations) * self.cold_penalty
+
+        def expected_duration(wfb):
+            last_complete, durations = worker_stats.get(wfb.worker.workerid, (None, None))
+            if last_complete is None or now - last_complete > self.warm_period:
+                return (cold_duration, 0)
+            if not durations:
+                return (cold_duration, -last_complete)
+            return (statistics.fmean(durations), -last_complete)
+
+        return min(workers, key=expected_duration)
+
+
+class BuildRequestClaimer:
+    """
+    Claims groups of build requests, one group per build to start. The groups submitted while
+    a claim is running are claimed together, in a single database transaction, once it is done.
+    """
+
+    def __init__(self, master):
+        self.master = master
+        self._queue: list[tuple[list[list[int]], defer.Deferred[list[bool]]]] = []
+        self._running = False
+
+    def claim(self, groups: list[list[int]]) -> defer.Deferred[list[bool]]:
+        """@returns: a list of booleans telling whether each group was claimed, via Deferred"""
+        d: defer.Deferred[list[bool]] = defer.Deferred()
+        self._queue.append((groups, d))
+        if not self._running:
+            defer.ensureDeferred(self._run())
+        return d
+
+    async def _run(self) -> None:
+        self._running = True
+        try:
+            while self._queue:
+                batch = self._queue
+                self._queue = []
+                all_groups = [brids for groups, _ in batch for brids in groups]
+                metrics.MetricCountEvent.log('BuildRequestClaimer.claims', len(all_groups))
+                try:
+                    claimed = await self.master.data.updates.claimBuildRequestGroups(
+                        all_groups, claimed_at=epoch2datetime(self.master.reactor.seconds())
+                    )
+                except Exception:
+                    failure = Failure()
+                    for _, d in batch:
+                        d.errback(failure)
+                    continue
+                for groups, d in batch:
+                    d.callback(claimed[: len(groups)])
+                    claimed = claimed[len(groups) :]
+        finally:
+            self._running = False
+
+
+class DistributionCycle:
+    """
+    Profile of a distribution cycle, which lasts from the moment the distributor has builders to
+    consider to the moment it becomes idle.
+
+    It records the time spent in each phase of the distribution and, for each builder that was
+    considered, the number of unclaimed requests it had, the number of builds started and the
+    reason why the distributor moved on to the next builder.
+    """
+
+    PHASES = ('sort', 'fetch', 'choose', 'claim', 'start')
+
+    def __init__(self, cycleid: int, started_at: float) -> None:
+        self.cycleid = cycleid
+        self.started_at = started_at
+        self.complete_at: float | None = None
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        # builder name -> {'reason': ..., 'builds': ..., 'queue_depth': ...}
+        self.builders: dict[str, dict[str, Any]] = {}
+
+    def add_phase_time(self, phase: str, elapsed: float) -> None:
+        self.phases[phase] += elapsed
+
+    def _get_builder(self, name: str) -> dict[str, Any]:
+        return self.builders.setdefault(name, {'reason': None, 'builds': 0, 'queue_depth': None})
+
+    def set_queue_depth(self, name: str, depth: int | None) -> None:
+        builder = self._get_builder(name)
+        if builder['queue_depth'] is None:
+            builder['queue_depth'] = depth
+
+    def add_decision(self, name: str, reason: str, builds: int = 0) -> None:
+        builder = self._get_builder(name)
+        builder['reason'] = reason
+        builder['builds'] += builds
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'cycleid': self.cycleid,
+            'started_at': int(self.started_at),
+            'complete_at': int(self.complete_at) if self.complete_at is not None else None,
+            'phases': dict(self.phases),
+            'builders': {name: dict(builder) for name, builder in self.builders.items()},
+        }
+
+
+class BuilderPrioritizer:
+    """
+    Base class of the prioritizeBuilders policies that, besides ordering the builders, limit the
+    number of builds that can be started on them.
+    """
+
+    def __call__(self, master, builders):
+        raise NotImplementedError
+
+    def get_build_limit(self, master, bldr: Builder) -> int | None:
+        """
+        Returns the number of builds that may be started on the builder right now, or None if
+        there is no limit. Builders with a limit of 0 are reconsidered at the next distribution.
+        """
+        return None
+
+    def start_cycle(self, master) -> None:
+        """Called when a distribution cycle starts, before the builders are ordered"""
+
+    def builds_started(self, bldr: Builder, count: int) -> None:
+        """Called when builds have been started on the builder during the current cycle"""
+
+
+class FairShareBuilderPrioritizer(BuilderPrioritizer):
+    """
+    Shares the workers between the projects of the builders.
+
+    The builders are ordered so that the projects with the fewest running builds relative to
+    their weight go first, then by the priority of their build requests, increased with the time
+    they have been waiting for if ``aging`` is set. The number of builds running for a project
+    may also be capped by a quota. Everything is computed from the state kept in memory.
+
+    @param weights: project name -> share of the workers, 1 by default
+    @param quotas: project name -> maximum number of builds running at the same time
+    @param aging: number of seconds of waiting that raise the priority of a request by 1
+    """
+
+    def __init__(
+        self,
+        weights: dict[str | None, float] | None = None,
+        quotas: dict[str | None, int] | None = None,
+        aging: float | None = None,
+    ):
+        self.weights = weights or {}
+        self.quotas = quotas or {}
+        self.aging = aging
+        # running builds of each project, counted once per distribution cycle
+        self._running: collections.Counter | None = None
+
+        for project, weight in self.weights.items():
+            if not isinstance(weight, (int, float)) or weight <= 0:
+                error(f"weight of project {project!r} must be a positive number")
+        for project, quota in self.quotas.items():
+            if not isinstance(quota, int) or quota < 0:
+                error(f"quota of project {project!r} must be a non-negative integer")
+        if aging is not None and (not isinstance(aging, (int, float)) or aging <= 0):
+            error("aging must be a positive number of seconds")
+
+    @staticmethod
+    def _get_project(bldr) -> str | None:
+        return bldr.config.project if bldr.config else None
+
+    def _get_running_builds(self, master) -> collections.Counter:
+        running: collections.Counter = collections.Counter()
+        for bldr in master.botmaster.builders.values():
+            running[self._get_project(bldr)] += sum(1 for b in bldr.building if not b.finished)
+        return running
+
+    def _get_cycle_running_builds(self, master) -> collections.Counter:
+        if self._running is None:
+            self._running = self._get_running_builds(master)
+        return self._running
+
+    def start_cycle(self, master) -> None:
+        self._running = self._get_running_builds(master)
+
+    def builds_started(self, bldr: Builder, count: int) -> None:
+        if self._running is not None:
+            self._running[self._get_project(bldr)] += count
+
+    def _get_share(self, project: str | None, builds: int) -> float:
+        return builds / self.weights.get(project, 1)
+
+    def _is_over_quota(self, project: str | None, builds: int) -> bool:
+        quota = self.quotas.get(project)
+        return quota is not None and builds >= quota
+
+    @async_to_deferred
+    async def __call__(self, master, builders: list[Builder]) -> list[Builder]:
+        timer = metrics.Timer("FairShareBuilderPrioritizer()")
+        timer.start()
+
+        now = master.reactor.seconds()
+        # a copy, as the builds that would be started on the sorted builders are counted in it
+        running = collections.Counter(self._get_cycle_running_builds(master))
+
+        # project -> heap of (-priority, oldest request time, name, builder)
+        queues: dict[str | None, list[tuple]] = {}
+        idle = []
+        for bldr in builders:
+            priority = bldr.highest_priority
+            if priority is None:
+                idle.append(bldr)
+                continue
+            oldest = bldr.oldest_request_time
+            oldest = oldest.timestamp() if isinstance(oldest, datetime) else now
+            if self.aging:
+                priority += max(0, now - oldest) / self.aging
+            queue = queues.setdefault(self._get_project(bldr), [])
+            queue.append((-priority, oldest, bldr.name, bldr))
+
+        # take the next builder of the project with the smallest share, counting one more
+        # build for each builder taken
+        projects = []
+        over_quota = []
+        for project, queue in queues.items():
+            heapq.heapify(queue)
+            if self._is_over_quota(project, running[project]):
+                over_quota.extend(queue)
+                continue
+            projects.append((self._get_share(project, running[project]), queue[0][:3], project))
+        heapq.heapify(projects)
+
+        sorted_builders = []
+        while projects:
+            _, _, project = heapq.heappop(projects)
+            queue = queues[project]
+            sorted_builders.append(heapq.heappop(queue)[3])
+            running[project] += 1
+            if queue:
+                share = self._get_share(project, running[project])
+                heapq.heappush(projects, (share, queue[0][:3], project))
+
+        # the builders of the projects over their quota do not start builds, but they are kept
+        # so that their requests are looked at when the quota allows it
+        sorted_builders.extend(entry[3] for entry in sorted(over_quota, key=lambda e: e[:3]))
+        sorted_builders.extend(sorted(idle, key=lambda b: b.name))
+
+        timer.stop()
+        return sorted_builders
+
+    def get_build_limit(self, master, bldr: Builder) -> int | None:
+        project = self._get_project(bldr)
+        quota = self.quotas.get(project)
+        if quota is None:
+            return None
+        return max(0, quota - self._get_cycle_running_builds(master)[project])
+
+
 class BuildRequestDistributor(service.AsyncMultiService):
     """
     Special-purpose class to handle distributing build requests to builders by
@@ -335,6 +692,24 @@ class BuildRequestDistributor(service.AsyncMultiService):
 
         self._deferwaiter = deferwaiter.DeferWaiter()
         self._activity_loop_deferred = None
+        # fired to wake up the parallel activity loop when it can start more builders
+        self._activity_wakeup: defer.Deferred[None] | None = None
+        # created once the master is known
+        self._claimer: BuildRequestClaimer | None = None
+        # names of the builders that could not start builds because of a BuilderPrioritizer
+        # limit, and are reconsidered at the next distribution
+        self._held_builders: set[str] = set()
+        # builder name -> {lock: time since which the builder is blocked on it}; these builders
+        # are skipped by the distributions that do not target them, and retried when one of the
+        # locks is released
+        self._parked_builders: dict[str, dict[Any, float]] = {}
+        # lock -> (subscription to its releases, names of the builders parked on it)
+        self._lock_waiters: dict[Any, tuple[Any, set[str]]] = {}
+        # profile of the current distribution cycle, and of the recent ones, as many as set by
+        # the distributor_cycles key of c['metrics']
+        self._cycle: DistributionCycle | None = None
+        self._cycle_count = 0
+        self.recent_cycles: collections.deque[DistributionCycle] = collections.deque(maxlen=0)
 
         # Use in Master clean shutdown
         # this flag will allow the distributor to still
@@ -353,6 +728,9 @@ class BuildRequestDistributor(service.AsyncMultiService):
         # self.running is false.
         yield self.activity_lock.run(service.AsyncService.stopService, self)
 
+        for name in list(self._parked_builders):
+            self._unparkBuilder(name)
+
         # now let any outstanding calls to maybeStartBuildsOn to finish, so
         # they don't get interrupted in mid-stride.  This tends to be
         # particularly painful because it can occur when a generator is gc'd.
@@ -360,7 +738,7 @@ class BuildRequestDistributor(service.AsyncMultiService):
         yield self._deferwaiter.wait()
 
     @async_to_deferred
-    async def maybeStartBuildsOn(self, new_builders: list[str]) -> None:
+    async def maybeStartBuildsOn(self, new_builders: list[str], skip_parked: bool = False) -> None:
         """
         Try to start any builds that can be started right now.  This function
         returns immediately, and promises to trigger those builders
@@ -368,10 +746,15 @@ class BuildRequestDistributor(service.AsyncMultiService):
 
         @param new_builders: names of new builders that should be given the
         opportunity to check for new requests.
+        @param skip_parked: whether to skip the builders waiting for a lock
+        to be released.
         """
         if not self.can_distribute:
             return
 
+        if skip_parked:
+            new_builders = [name for name in new_builders if name not in self._parked_builders]
+
         try:
             await self._deferwaiter.add(self._maybeStartBuildsOn(new_builders))
         except Exception as e:  # pragma: no cover
@@ -379,7 +762,7 @@ class BuildRequestDistributor(service.AsyncMultiService):
 
     @async_to_deferred
     async def _maybeStartBuildsOn(self, new_builders: list[str]) -> None:
-        new_builder_set = set(new_builders)
+        new_builder_set = set(new_builders) | self._held_builders
         existing_pending = set(self._pending_builders)
 
         # if we won't add any builders, there's nothing to do
@@ -392,6 +775,7 @@ class BuildRequestDistributor(service.AsyncMultiService):
                 # re-fetch existing_pending, in case it has changed
                 # while acquiring the lock
                 existing_pending = set(self._pending_builders)
+                self._held_builders.clear()
 
                 # then sort the new, expanded set of builders
                 self._pending_builders = await self._sortBuilders(
@@ -402,23 +786,24 @@ class BuildRequestDistributor(service.AsyncMultiService):
                 # working on that.
                 if not self.active:
                     self._activity_loop_deferred = defer.ensureDeferred(self._activityLoop())
+                elif self._activity_wakeup is not None and not self._activity_wakeup.called:
+                    # let a parallel activity loop start the new builders
+                    self._activity_wakeup.callback(None)
         except Exception:  # pragma: no cover
             log.err(Failure(), f"while attempting to start builds on {self.name}")
 
-    @defer.inlineCallbacks
     def _defaultSorter(self, master, builders):
         timer = metrics.Timer("BuildRequestDistributor._defaultSorter()")
         timer.start()
 
-        @defer.inlineCallbacks
         def key(bldr):
             # Sort primarily highest priority of build requests
-            priority = yield bldr.get_highest_priority()
+            priority = bldr.highest_priority
             if priority is None:
                 # for builders that do not have pending buildrequest, we just use large number
                 priority = -math.inf
             # Break ties using the time of oldest build request
-            time = yield bldr.getOldestRequestTime()
+            time = bldr.oldest_request_time
             if time is None:
                 # for builders that do not have pending buildrequest, we just use large number
                 time = math.inf
@@ -427,7 +812,7 @@ class BuildRequestDistributor(service.AsyncMultiService):
                     time = time.timestamp()
             return (-priority, time, bldr.name)
 
-        yield async_sort(builders, key)
+        builders.sort(key=key)
 
         timer.stop()
         return builders
@@ -447,11 +832,16 @@ class BuildRequestDistributor(service.AsyncMultiService):
         if not sorter:
             sorter = self._defaultSorter
 
-        # run it
-        try:
-            builders = yield sorter(self.master, builders)
-        except Exception:
-            log.err(Failure(), "prioritizing builders; order unspecified")
+        # run it, after loading the request statistics of the builders so that the sorter can
+        # read them synchronously
+        with self._profilePhase('sort'):
+            try:
+                yield defer.gatherResults(
+                    [bldr.load_request_stats() for bldr in builders], consumeErrors=True
+                )
+                builders = yield sorter(self.master, builders)
+            except Exception:
+                log.err(Failure(), "prioritizing builders; order unspecified")
 
         # and return the names
         rv = [b.name for b in builders]
@@ -462,6 +852,11 @@ class BuildRequestDistributor(service.AsyncMultiService):
     async def _activityLoop(self) -> None:
         self.active = True
 
+        concurrency = self.master.config.build_distribution_concurrency
+        if concurrency > 1:
+            await self._parallelActivityLoop(concurrency)
+            return
+
         pending_builders: list[Builder] = []
         while True:
             async with self.activity_lock:
@@ -489,17 +884,291 @@ class BuildRequestDistributor(service.AsyncMultiService):
                 except Exception:
                     log.err(Failure(), f"from maybeStartBuild for builder '{bldr_name}'")
 
+        self._finishCycle()
         self.active = False
 
+    async def _parallelActivityLoop(self, concurrency: int) -> None:
+        # Runs up to `concurrency` builders at once. The builders sharing a worker are run one
+        # after another, in the order of the pending builders, so that a worker is never offered
+        # to two builders at the same time.
+        running: dict[str, set] = {}
+        while True:
+            wakeup: defer.Deferred[None] = defer.Deferred()
+            self._activity_wakeup = wakeup
+
+            def done(_, name):
+                del running[name]
+                if self._activity_wakeup is not None and not self._activity_wakeup.called:
+                    self._activity_wakeup.callback(None)
+
+            async with self.activity_lock:
+                async with self.pending_builders_lock:
+                    started = (
+                        self._startPendingBuilders(concurrency, running)
+                        if self.can_distribute
+                        else []
+                    )
+                    if not running:
+                        # nothing left to do
+                        self._activity_wakeup = None
+                        self._finishCycle()
+                        self.active = False
+                        return
+                for name, d in started:
+                    d.addBoth(done, name)
+
+            await wakeup
+
+    def _startPendingBuilders(
+        self, concurrency: int, running: dict[str, set]
+    ) -> list[tuple[str, defer.Deferred]]:
+        started = []
+        reserved = set().union(*running.values())
+        # workers of the higher priority builders waiting for a reservation
+        waiting: set = set()
+        for name in list(self._pending_builders):
+            if len(running) >= concurrency:
+                break
+            if name in running:
+                # let the current run finish first
+                continue
+
+            bldr = self.botmaster.builders.get(name)
+            if not bldr:
+                self._pending_builders.remove(name)
+                continue
+
+            workers = {wfb.worker for wfb in bldr.workers}
+            if workers & (reserved | waiting):
+                waiting |= workers
+                continue
+
+            self._pending_builders.remove(name)
+            running[name] = workers
+            reserved |= workers
+            d = defer.ensureDeferred(self._maybeStartBuildsOnBuilder(bldr))
+            d.addErrback(log.err, f"from maybeStartBuild for builder '{name}'")
+            self._deferwaiter.add(d)
+            started.append((name, d))
+        return started
+
     async def _maybeStartBuildsOnBuilder(self, bldr: Builder) -> None:
-        # create a chooser to give us our next builds
-        # this object is temporary and will go away when we're done
-        bc = self.createBuildChooser(bldr, self.master)
+        bldr.blocking_locks.clear()
+        try:
+            await self._startBuildsOnBuilder(bldr)
+        finally:
+            self._parkBuilder(bldr)
+
+    def _parkBuilder(self, bldr: Builder) -> None:
+        # Parks the builder on the locks that are still blocking it, or unparks it if there
+        # are none
+        name = bldr.name
+        assert name is not None
+        now = self.master.reactor.seconds()
+        previous = self._parked_builders.get(name, {})
+        locks = {
+            lock: previous.get(lock, now)
+            for lock, access in bldr.blocking_locks.items()
+            if not lock.isAvailable(None, access)
+        }
+        if len(locks) < len(bldr.blocking_locks):
+            # some locks were released in the meantime, so retrying the builder may start builds
+            locks = {}
+
+        for lock in set(previous) - set(locks):
+            self._removeLockWaiter(lock, name)
+        if not locks:
+            self._parked_builders.pop(name, None)
+            return
+
+        self._parked_builders[name] = locks
+        for lock in locks:
+            if lock not in self._lock_waiters:
+                subscription = lock.subscribeToReleases(functools.partial(self._lockReleased, lock))
+                self._lock_waiters[lock] = (subscription, set())
+            self._lock_waiters[lock][1].add(name)
+
+    def _unparkBuilder(self, name: str) -> dict[Any, float]:
+        locks = self._parked_builders.pop(name, {})
+        for lock in locks:
+            self._removeLockWaiter(lock, name)
+        return locks
+
+    def _removeLockWaiter(self, lock, name: str) -> None:
+        subscription, names = self._lock_waiters[lock]
+        names.discard(name)
+        if not names:
+            subscription.unsubscribe()
+            del self._lock_waiters[lock]
+
+    def _lockReleased(self, lock) -> None:
+        if lock not in self._lock_waiters:
+            return
+        now = self.master.reactor.seconds()
+        names = sorted(self._lock_waiters[lock][1])
+        for name in names:
+            blocked_since = self._unparkBuilder(name)[lock]
+            metrics.MetricTimeEvent.log(
+                f"BuildRequestDistributor.blocked_on_lock.{lock.lockName}", now - blocked_since
+            )
+        self.maybeStartBuildsOn(names)
+
+    async def _startBuildsOnBuilder(self, bldr: Builder) -> None:
+        name = bldr.name
+        assert name is not None
+        prioritizer = self.master.config.prioritizeBuilders
+        if not isinstance(prioritizer, BuilderPrioritizer):
+            prioritizer = None
+
+        cycle = self._getCycle()
+        builderid = await bldr.getBuilderId()
 
         while True:
+            max_builds = None
+            if prioritizer is not None:
+                max_builds = prioritizer.get_build_limit(self.master, bldr)
+                if max_builds == 0:
+                    self._held_builders.add(name)
+                    cycle.add_decision(name, 'held')
+                    return
+
+            # create a chooser to give us our next builds
+            # this object is temporary and will go away when we're done
+            bc = self.createBuildChooser(bldr, self.master)
+            try:
+                started_at = self.master.reactor.seconds()
+                assignments, exhausted = await self._chooseBuilds(bc, max_builds)
+                cycle.add_phase_time('fetch', bc.fetch_time)
+                cycle.add_phase_time(
+                    'choose', self.master.reactor.seconds() - started_at - bc.fetch_time
+                )
+                # the requests are loaded by the first choice, and are not claimed yet
+                queue = self.botmaster.pending_requests.peek_queue(builderid)
+                queue_depth = len(queue.requests) if queue is not None else None
+                cycle.set_queue_depth(name, queue_depth)
+                if not assignments:
+                    cycle.add_decision(name, self._getIdleReason(bldr, queue_depth))
+                    return
+
+                # claim the requests of all the builds at once
+                brids_groups = [[br.id for br in breqs] for _, breqs in assignments]
+                for brids in brids_groups:
+                    self._add_in_progress_brids(brids)
+                if self._claimer is None:
+                    self._claimer = BuildRequestClaimer(self.master)
+                with self._profilePhase('claim'):
+                    claimed = await self._claimer.claim(brids_groups)
+
+                started = 0
+                for (worker, breqs), brids, ok in zip(assignments, brids_groups, claimed):
+                    if not ok:
+                        self._remove_in_progress_brids(brids)
+                        continue
+
+                    with self._profilePhase('start'):
+                        build_started = await bldr.maybeStartBuild(worker, breqs)
+                    if build_started:
+                        started += 1
+                    else:
+                        await self.master.data.updates.unclaimBuildRequests(brids)
+                        self._remove_in_progress_brids(brids)
+
+                        # try starting builds again.  If we still have a working worker,
+                        # then this may re-claim the same buildrequests
+                        self.botmaster.maybeStartBuildsForBuilder(self.name)
+            finally:
+                # the chosen builds are started, and claim their locks themselves
+                bldr.lock_reservations.clear()
+
+            if not all(claimed):
+                reason = 'claim_conflict'
+            elif not started:
+                reason = 'start_failed'
+            else:
+                reason = 'started'
+            cycle.add_decision(name, reason, started)
+            if prioritizer is not None and started:
+                prioritizer.builds_started(bldr, started)
+
+            if not all(claimed):
+                # some brids were already claimed, so the known requests are outdated: reload
+                # them and start over
+                self.botmaster.pending_requests.invalidate(builderid)
+            elif exhausted or not started:
+                return
+
+    @staticmethod
+    def _getIdleReason(bldr: Builder, queue_depth: int | None) -> str:
+        # Returns why no build could be chosen for the builder
+        if queue_depth == 0:
+            return 'no_requests'
+        if not bldr.getAvailableWorkers():
+            return 'no_available_worker'
+        if bldr.blocking_locks:
+            return 'blocked_on_locks'
+        # canStartBuild, nextWorker or nextBuild refused the remaining requests, or there were
+        # none if the queue depth is not known
+        return 'refused'
+
+    def _getCycle(self) -> DistributionCycle:
+        if self._cycle is None:
+            self._cycle_count += 1
+            self._cycle = DistributionCycle(self._cycle_count, self.master.reactor.seconds())
+            prioritizer = self.master.config.prioritizeBuilders
+            if isinstance(prioritizer, BuilderPrioritizer):
+                prioritizer.start_cycle(self.master)
+        return self._cycle
+
+    @contextlib.contextmanager
+    def _profilePhase(self, phase: str):
+        cycle = self._getCycle()
+        started_at = self.master.reactor.seconds()
+        try:
+            yield
+        finally:
+            cycle.add_phase_time(phase, self.master.reactor.seconds() - started_at)
+
+    def _finishCycle(self) -> None:
+        cycle = self._cycle
+        if cycle is None:
+            return
+        self._cycle = None
+        complete_at = self.master.reactor.seconds()
+        cycle.complete_at = complete_at
+
+        metrics.MetricTimeEvent.log("BuildRequestDistributor.cycle", complete_at - cycle.started_at)
+        for phase, elapsed in cycle.phases.items():
+            metrics.MetricTimeEvent.log(f"BuildRequestDistributor.cycle.{phase}", elapsed)
+        reasons = collections.Counter(b['reason'] for b in cycle.builders.values() if b['reason'])
+        for reason, count in sorted(reasons.items()):
+            metrics.MetricCountEvent.log(f"BuildRequestDistributor.decisions.{reason}", count)
+        metrics.MetricCountEvent.log(
+            "BuildRequestDistributor.queue_depth",
+            sum(b['queue_depth'] or 0 for b in cycle.builders.values()),
+            absolute=True,
+        )
+
+        size = (self.master.config.metrics or {}).get('distributor_cycles', 0)
+        if size != self.recent_cycles.maxlen:
+            self.recent_cycles = collections.deque(self.recent_cycles, maxlen=size)
+        self.recent_cycles.append(cycle)
+
+    async def _chooseBuilds(
+        self, bc: BuildChooserBase, max_builds: int | None = None
+    ) -> tuple[list[tuple], bool]:
+        # Returns the (worker, breqs) pairs offered by the chooser, and whether the chooser was
+        # exhausted. The chooser may offer a worker again once its pool is empty, as it expects
+        # the builds to be started in between: the choice stops there, and a new chooser must
+        # be created once the chosen builds are started. The choice also stops after max_builds
+        # builds.
+        assignments: list[tuple] = []
+        chosen_workers = set()
+        while max_builds is None or len(assignments) < max_builds:
             worker, breqs = await bc.chooseNextBuild()
             if not worker or not breqs:
-                break
+                return assignments, True
+            if worker in chosen_workers:
+                return assignments, False
 
             if self.distribute_only_waited_childs:
                 # parenting is a field of Buildset
@@ -522,27 +1191,10 @@ class BuildRequestDistributor(service.AsyncMultiService):
                 if not breqs:
                     continue
 
-            # claim brid's
-            brids = [br.id for br in breqs]
-            claimed_at_epoch = self.master.reactor.seconds()
-            claimed_at = epoch2datetime(claimed_at_epoch)
-
-            self._add_in_progress_brids(brids)
-            if not (
-                await self.master.data.updates.claimBuildRequests(brids, claimed_at=claimed_at)
-            ):
-                # some brids were already claimed, so start over
-                bc = self.createBuildChooser(bldr, self.master)
-                continue
-
-            buildStarted = await bldr.maybeStartBuild(worker, breqs)
-            if not buildStarted:
-                await self.master.data.updates.unclaimBuildRequests(brids)
-                self._remove_in_progress_brids(brids)
+            chosen_workers.add(worker)
+            assignments.append((worker, breqs))
 
-                # try starting builds again.  If we still have a working worker,
-                # then this may re-claim the same buildrequests
-                self.botmaster.maybeStartBuildsForBuilder(self.name)
+        return assignments, False
 
     def _add_in_progress_brids(self, brids):
         for brid in brids:
@@ -554,7 +1206,9 @@ class BuildRequestDistributor(service.AsyncMultiService):
 
     def createBuildChooser(self, bldr, master):
         # just instantiate the build chooser requested
-        return self.BuildChooser(bldr, master)
+        chooser = self.BuildChooser(bldr, master)
+        chooser.pending_requests = self.botmaster.pending_requests
+        return chooser
 
     @async_to_deferred
     async def _waitForFinish(self):
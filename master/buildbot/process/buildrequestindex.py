@@ -0,0 +1,313 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+import bisect
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any
+from typing import Hashable
+
+from twisted.internet import defer
+from twisted.internet import task
+from twisted.python import log
+from twisted.python.failure import Failure
+
+from buildbot.data import resultspec
+from buildbot.process import metrics
+from buildbot.process.buildrequest import BuildRequest
+from buildbot.util import datetime2epoch
+from buildbot.util import service
+from buildbot.util.twisted import async_to_deferred
+
+
+def _epoch(value: datetime | int | float | None) -> float:
+    if value is None:
+        return 0
+    if isinstance(value, datetime):
+        return datetime2epoch(value)
+    return value
+
+
+class BuilderRequestQueue:
+    """
+    The unclaimed build requests of a single builder, ordered both by priority (highest first,
+    then oldest first) and by submission time.
+    """
+
+    def __init__(self) -> None:
+        self.requests: dict[int, dict[str, Any]] = {}
+        self._by_priority: list[tuple[int, float, int]] = []
+        self._by_time: list[tuple[float, int]] = []
+        # requests by collapse key, see BuildRequest.getCollapseKey
+        self._collapse_keys: dict[int, Hashable] = {}
+        self._by_collapse_key: dict[Hashable, set[int]] = {}
+        self._unkeyed: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.requests)
+
+    def _keys(self, brdict: dict[str, Any]) -> tuple[tuple[int, float, int], tuple[float, int]]:
+        brid = brdict['buildrequestid']
+        submitted_at = _epoch(brdict['submitted_at'])
+        return (-brdict['priority'], submitted_at, brid), (submitted_at, brid)
+
+    def add(self, brdict: dict[str, Any]) -> None:
+        self.remove(brdict['buildrequestid'])
+        self.requests[brdict['buildrequestid']] = brdict
+        priority_key, time_key = self._keys(brdict)
+        bisect.insort(self._by_priority, priority_key)
+        bisect.insort(self._by_time, time_key)
+        self._unkeyed.add(brdict['buildrequestid'])
+
+    def remove(self, brid: int) -> None:
+        brdict = self.requests.pop(brid, None)
+        if brdict is None:
+            return
+        priority_key, time_key = self._keys(brdict)
+        del self._by_priority[bisect.bisect_left(self._by_priority, priority_key)]
+        del self._by_time[bisect.bisect_left(self._by_time, time_key)]
+        self._unkeyed.discard(brid)
+        if brid in self._collapse_keys:
+            collapse_key = self._collapse_keys.pop(brid)
+            brids = self._by_collapse_key[collapse_key]
+            brids.discard(brid)
+            if not brids:
+                del self._by_collapse_key[collapse_key]
+
+    def get_unkeyed(self) -> list[dict[str, Any]]:
+        """Returns the requests whose collapse key is not known yet"""
+        return [self.requests[brid] for brid in self._unkeyed]
+
+    def set_collapse_key(self, brid: int, collapse_key: Hashable | None) -> None:
+        if brid not in self._unkeyed:
+            # removed in the meantime
+            return
+        self._unkeyed.discard(brid)
+        self._collapse_keys[brid] = collapse_key
+        self._by_collapse_key.setdefault(collapse_key, set()).add(brid)
+
+    def get_collapsible(self, collapse_key: Hashable) -> set[int]:
+        """Returns the ids of the requests with the given collapse key"""
+        return self._by_collapse_key.get(collapse_key, set())
+
+    def get_highest_priority(self) -> int | None:
+        if not self._by_priority:
+            return None
+        return -self._by_priority[0][0]
+
+    def get_oldest_request_time(self) -> datetime | None:
+        if not self._by_time:
+            return None
+        return self.requests[self._by_time[0][1]]['submitted_at']
+
+    def get_ordered(self) -> list[dict[str, Any]]:
+        """Returns the requests, highest priority first, then oldest first"""
+        return [self.requests[key[2]] for key in self._by_priority]
+
+
+class PendingBuildRequestIndex(service.AsyncService):
+    """
+    Keeps in memory the unclaimed build requests of each builder, so that the build request
+    distributor does not need to query the database for every builder in every distribution cycle.
+
+    The requests of a builder are loaded from the database the first time they are needed, and
+    then maintained from the buildrequests new, claimed, unclaimed, priority_changed and complete
+    events. Events received while a builder is being loaded are replayed once it is loaded. The
+    builders in memory are periodically reloaded from the database, which repairs any divergence,
+    e.g. due to a lost event; the diverging requests are counted in the
+    PendingBuildRequestIndex.divergences metric.
+
+    The completion time of the newest completed request of each builder is kept the same way.
+    """
+
+    name: str | None = 'pending_buildrequest_index'  # type: ignore[assignment]
+
+    # seconds between two reconciliations with the database; None disables them
+    reconcile_interval: int | None = 5 * 60
+
+    # number of buildsets whose collapse key is kept in memory
+    collapse_key_cache_size = 10000
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._queues: dict[int, BuilderRequestQueue] = {}
+        # builderid -> (Deferreds waiting for the load, events received during the load)
+        self._loading: dict[int, tuple[list[defer.Deferred], list[tuple[str, dict[str, Any]]]]] = {}
+        self._consumer = None
+        self._reconcile_loop: task.LoopingCall | None = None
+        # buildsetid -> collapse key; these never change
+        self._collapse_keys: OrderedDict[int, Hashable | None] = OrderedDict()
+        # builderid -> complete_at of the newest completed request; it is only known for the
+        # builders in _newest_complete_loaded, the others have only seen complete events
+        self._newest_complete: dict[int, datetime] = {}
+        self._newest_complete_loaded: set[int] = set()
+
+    @async_to_deferred
+    async def startService(self) -> None:
+        self._consumer = await self.master.mq.startConsuming(
+            self._buildrequest_event, ('buildrequests', None, None)
+        )
+        if self.reconcile_interval:
+            self._reconcile_loop = task.LoopingCall(self.reconcile)
+            self._reconcile_loop.clock = self.master.reactor
+            self._reconcile_loop.start(self.reconcile_interval, now=False)
+        super().startService()
+
+    def stopService(self) -> defer.Deferred[None]:
+        if self._consumer is not None:
+            self._consumer.stopConsuming()
+            self._consumer = None
+        if self._reconcile_loop is not None:
+            self._reconcile_loop.stop()
+            self._reconcile_loop = None
+        self._queues.clear()
+        self._newest_complete.clear()
+        self._newest_complete_loaded.clear()
+        return super().stopService()
+
+    def _buildrequest_event(self, key: tuple[str, ...], msg: dict[str, Any]) -> None:
+        event = key[-1]
+        builderid = msg.get('builderid')
+        if builderid is None:
+            return
+        if builderid in self._loading:
+            self._loading[builderid][1].append((event, msg))
+        queue = self._queues.get(builderid)
+        if queue is not None:
+            self._apply_event(queue, event, msg)
+        if event == 'complete' and msg.get('complete_at') is not None:
+            self._set_newest_complete(builderid, msg['complete_at'])
+
+    def _set_newest_complete(self, builderid: int, complete_at: datetime | None) -> None:
+        newest = self._newest_complete.get(builderid)
+        if complete_at is not None and (newest is None or complete_at > newest):
+            self._newest_complete[builderid] = complete_at
+
+    @staticmethod
+    def _apply_event(queue: BuilderRequestQueue, event: str, msg: dict[str, Any]) -> None:
+        if event in ('new', 'unclaimed', 'priority_changed'):
+            if not msg['claimed'] and not msg['complete']:
+                queue.add(msg)
+            elif event == 'priority_changed':
+                queue.remove(msg['buildrequestid'])
+        elif event in ('claimed', 'complete', 'cancel'):
+            queue.remove(msg['buildrequestid'])
+
+    @async_to_deferred
+    async def reconcile(self) -> None:
+        """
+        Reloads from the database the requests of the builders in memory, and counts the requests
+        that were missing or outdated in memory
+        """
+        metrics.MetricCountEvent.log('PendingBuildRequestIndex.reconciliations')
+        divergences = 0
+        for builderid, queue in list(self._queues.items()):
+            if builderid in self._loading:
+                continue
+            try:
+                reloaded = await self._load_queue(builderid)
+            except Exception:
+                log.err(Failure(), f'while reconciling the build requests of builder {builderid}')
+                continue
+            divergences += len(queue.requests.keys() ^ reloaded.requests.keys())
+        metrics.MetricCountEvent.log('PendingBuildRequestIndex.divergences', divergences)
+
+    def invalidate(self, builderid: int) -> None:
+        """Forgets the requests of a builder, e.g. after they turned out to be outdated"""
+        self._queues.pop(builderid, None)
+
+    @async_to_deferred
+    async def get_queue(self, builderid: int) -> BuilderRequestQueue:
+        queue = self._queues.get(builderid)
+        if queue is not None:
+            return queue
+        return await self._load_queue(builderid)
+
+    @async_to_deferred
+    async def _load_queue(self, builderid: int) -> BuilderRequestQueue:
+        if builderid in self._loading:
+            # coalesce with the ongoing load
+            d: defer.Deferred[BuilderRequestQueue] = defer.Deferred()
+            self._loading[builderid][0].append(d)
+            return await d
+
+        waiters: list[defer.Deferred] = []
+        self._loading[builderid] = (waiters, [])
+        try:
+            brdicts = await self.master.data.get(
+                ('builders', builderid, 'buildrequests'),
+                [resultspec.Filter('claimed', 'eq', [False])],
+            )
+        except Exception:
+            failure = Failure()
+            del self._loading[builderid]
+            for d in waiters:
+                d.errback(failure)
+            raise
+
+        queue = BuilderRequestQueue()
+        for brdict in brdicts:
+            queue.add(brdict)
+        _, events = self._loading.pop(builderid)
+        for event, msg in events:
+            self._apply_event(queue, event, msg)
+
+        if self.running:
+            self._queues[builderid] = queue
+        for d in waiters:
+            d.callback(queue)
+        return queue
+
+    def peek_queue(self, builderid: int) -> BuilderRequestQueue | None:
+        """Returns the requests of a builder if they are in memory, without loading them"""
+        return self._queues.get(builderid)
+
+    @async_to_deferred
+    async def get_newest_complete_time(self, builderid: int) -> datetime | None:
+        if builderid not in self._newest_complete_loaded:
+            completed = await self.master.data.get(
+                ('builders', builderid, 'buildrequests'),
+                [resultspec.Filter('complete', 'eq', [True])],
+                order=['-complete_at'],
+                limit=1,
+            )
+            if completed:
+                self._set_newest_complete(builderid, completed[0]['complete_at'])
+            if self.running:
+                self._newest_complete_loaded.add(builderid)
+        return self._newest_complete.get(builderid)
+
+    def peek_newest_complete_time(self, builderid: int) -> datetime | None:
+        """
+        Returns the complete_at of the newest completed request of a builder, or None if there
+        are none or it is not in memory
+        """
+        if builderid not in self._newest_complete_loaded:
+            return None
+        return self._newest_complete.get(builderid)
+
+    @async_to_deferred
+    async def get_collapse_key(self, buildsetid: int) -> Hashable | None:
+        if buildsetid in self._collapse_keys:
+            self._collapse_keys.move_to_end(buildsetid)
+            return self._collapse_keys[buildsetid]
+
+        collapse_key = await BuildRequest.getCollapseKey(self.master, buildsetid)
+        self._collapse_keys[buildsetid] = collapse_key
+        while len(self._collapse_keys) > self.collapse_key_cache_size:
+            self._collapse_keys.popitem(last=False)
+        return collapse_key
@@ -24,7 +24,9 @@ from zope.interface import implementer
 from buildbot import config
 from buildbot import interfaces
 from buildbot.changes import changes
+from buildbot.changes.filter import ImportantFiles
 from buildbot.process.properties import Properties
+from buildbot.schedulers.manager import SchedulerManager
 from buildbot.util.service import ClusteredBuildbotService
 from buildbot.util.state import StateMixin
 from buildbot.warnings import warn_deprecated
@@ -191,8 +193,22 @@ class BaseScheduler(ClusteredBuildbotService, StateMixin):
     def startConsumingChanges(self, fileIsImportant=None, change_filter=None, onlyImportant=False):
         assert fileIsImportant is None or callable(fileIsImportant)
 
-        # register for changes with the data API
         assert not self._change_consumer
+        if isinstance(self.parent, SchedulerManager):
+            # let the scheduler manager load the changes once for all the schedulers, and match
+            # their files once against the declarative rules of all the schedulers
+            self._change_consumer = self.parent.subscribe_to_changes(
+                lambda change, important=None: self._processChange(
+                    change, fileIsImportant, change_filter, onlyImportant, important
+                ),
+                change_filter,
+                important_files=(
+                    fileIsImportant if isinstance(fileIsImportant, ImportantFiles) else None
+                ),
+            )
+            return
+
+        # register for changes with the data API
         self._change_consumer = yield self.master.mq.startConsuming(
             lambda k, m: self._changeCallback(k, m, fileIsImportant, change_filter, onlyImportant),
             ('changes', None, 'new'),
@@ -215,9 +231,16 @@ class BaseScheduler(ClusteredBuildbotService, StateMixin):
         chdict = yield self.master.db.changes.getChange(msg['changeid'])
         change = yield changes.Change.fromChdict(self.master, chdict)
 
+        self._processChange(change, fileIsImportant, change_filter, onlyImportant)
+
+    def _processChange(self, change, fileIsImportant, change_filter, onlyImportant, important=None):
+        # ignore changes delivered while we're not running
+        if not self._change_consumer:
+            return None
+
         # filter it
         if change_filter and not change_filter.filter_change(change):
-            return
+            return None
 
         if change.codebase not in self.codebases:
             log.msg(
@@ -226,16 +249,20 @@ class BaseScheduler(ClusteredBuildbotService, StateMixin):
                 codebase=change.codebase,
                 name=self.name,
             )
-            return
+            return None
 
-        if fileIsImportant:
+        if important is not None:
+            # already evaluated by the scheduler manager
+            if not important and onlyImportant:
+                return None
+        elif fileIsImportant:
             try:
                 important = fileIsImportant(change)
                 if not important and onlyImportant:
-                    return
+                    return None
             except Exception as e:
                 log.err(e, f'in fileIsImportant check for {change}')
-                return
+                return None
         else:
             important = True
 
@@ -243,6 +270,7 @@ class BaseScheduler(ClusteredBuildbotService, StateMixin):
         # while this change is being processed
         d = self._change_consumption_lock.run(self.gotChange, change, important)
         d.addErrback(log.err, 'while processing change')
+        return d
 
     def _stopConsumingChanges(self):
         # (note: called automatically in deactivate)
@@ -641,8 +669,22 @@ class ReconfigurableBaseScheduler(ClusteredBuildbotService, StateMixin):
     def startConsumingChanges(self, fileIsImportant=None, change_filter=None, onlyImportant=False):
         assert fileIsImportant is None or callable(fileIsImportant)
 
-        # register for changes with the data API
         assert not self._change_consumer
+        if isinstance(self.parent, SchedulerManager):
+            # let the scheduler manager load the changes once for all the schedulers, and match
+            # their files once against the declarative rules of all the schedulers
+            self._change_consumer = self.parent.subscribe_to_changes(
+                lambda change, important=None: self._processChange(
+                    change, fileIsImportant, change_filter, onlyImportant, important
+                ),
+                change_filter,
+                important_files=(
+                    fileIsImportant if isinstance(fileIsImportant, ImportantFiles) else None
+                ),
+            )
+            return
+
+        # register for changes with the data API
         self._change_consumer = yield self.master.mq.startConsuming(
             lambda k, m: self._changeCallback(k, m, fileIsImportant, change_filter, onlyImportant),
             ('changes', None, 'new'),
@@ -665,9 +707,16 @@ class ReconfigurableBaseScheduler(ClusteredBuildbotService, StateMixin):
         chdict = yield self.master.db.changes.getChange(msg['changeid'])
         change = yield changes.Change.fromChdict(self.master, chdict)
 
+        self._processChange(change, fileIsImportant, change_filter, onlyImportant)
+
+    def _processChange(self, change, fileIsImportant, change_filter, onlyImportant, important=None):
+        # ignore changes delivered while we're not running
+        if not self._change_consumer:
+            return None
+
         # filter it
         if change_filter and not change_filter.filter_change(change):
-            return
+            return None
 
         if change.codebase not in self.codebases:
             log.msg(
@@ -676,16 +725,20 @@ class ReconfigurableBaseScheduler(ClusteredBuildbotService, StateMixin):
                 codebase=change.codebase,
                 name=self.name,
             )
-            return
+            return None
 
-        if fileIsImportant:
+        if important is not None:
+            # already evaluated by the scheduler manager
+            if not important and onlyImportant:
+                return None
+        elif fileIsImportant:
             try:
                 important = fileIsImportant(change)
                 if not important and onlyImportant:
-                    return
+                    return None
             except Exception as e:
                 log.err(e, f'in fileIsImportant check for {change}')
-                return
+                return None
         else:
             important = True
 
@@ -693,6 +746,7 @@ class ReconfigurableBaseScheduler(ClusteredBuildbotService, StateMixin):
         # while this change is being processed
         d = self._change_consumption_lock.run(self.gotChange, change, important)
         d.addErrback(log.err, 'while processing change')
+        return d
 
     def _stopConsumingChanges(self):
         # (note: called automatically in deactivate)
@@ -47,20 +47,36 @@ class BaseBasicScheduler(base.ReconfigurableBaseScheduler):
         'fileIsImportant',
         'onlyImportant',
         'reason',
+        'classificationsWriteDelay',
     )
 
     fileIsImportant = None
     reason = ''
+    classificationsWriteDelay = 5
 
     class NotSet:
         pass
 
     def __init__(self, name, **kwargs):
         super().__init__(name=name, **kwargs)
+        if self._overridesGetChangeClassificationsForTimer():
+            warn_deprecated(
+                '4.3.0',
+                (
+                    'overriding getChangeClassificationsForTimer is deprecated; the change '
+                    'classifications of the timers are kept in memory, and the changes of a '
+                    'timer are selected by getTimerNameForChange'
+                ),
+            )
         # the IDelayedCall used to wake up when this scheduler's
         # treeStableTimer expires.
         self._stable_timers = defaultdict(lambda: None)
         self._stable_timers_lock = defer.DeferredLock()
+        # the classified changes of each timer, and the classifications not written yet
+        self._classifications = {}
+        self._unwritten_classifications = {}
+        self._classifications_write_timer = None
+        self._classifications_lock = defer.DeferredLock()
 
     def checkConfig(  # type: ignore[override]
         self,
@@ -74,12 +90,15 @@ class BaseBasicScheduler(base.ReconfigurableBaseScheduler):
         reason="The %(classname)s scheduler named '%(name)s' triggered this build",
         change_filter=None,
         onlyImportant=False,
+        classificationsWriteDelay=5,
         **kwargs,
     ):
         if shouldntBeSet is not self.NotSet:
             config.error("pass arguments to schedulers using keyword arguments")
         if fileIsImportant and not callable(fileIsImportant):
             config.error("fileIsImportant must be a callable")
+        if not isinstance(classificationsWriteDelay, (int, float)) or classificationsWriteDelay < 0:
+            config.error("classificationsWriteDelay must be a non-negative number")
 
         super().checkConfig(builderNames=builderNames, **kwargs)
 
@@ -96,6 +115,7 @@ class BaseBasicScheduler(base.ReconfigurableBaseScheduler):
         reason="The %(classname)s scheduler named '%(name)s' triggered this build",
         change_filter=None,
         onlyImportant=False,
+        classificationsWriteDelay=5,
         **kwargs,
     ):
         yield super().reconfigService(builderNames=builderNames, **kwargs)
@@ -103,6 +123,9 @@ class BaseBasicScheduler(base.ReconfigurableBaseScheduler):
         self.treeStableTimer = treeStableTimer
         self.fileIsImportant = fileIsImportant
         self.onlyImportant = onlyImportant
+        # the change classifications are kept in memory, and written to the database in batches
+        # at most this long after the changes are received, so that they survive a restart
+        self.classificationsWriteDelay = classificationsWriteDelay
         self.change_filter = self.getChangeFilter(
             branch=branch, branches=branches, change_filter=change_filter, categories=categories
         )
@@ -160,8 +183,11 @@ class BaseBasicScheduler(base.ReconfigurableBaseScheduler):
                 if timer:
                     timer.cancel()
             self._stable_timers.clear()
+            self._classifications.clear()
 
         yield cancel_timers()
+        # the scheduler may become active on another master, which reads them from the database
+        yield self.writeChangeClassifications()
 
     @util.deferredLocked('_stable_timers_lock')
     def gotChange(self, change, important):
@@ -194,7 +220,47 @@ class BaseBasicScheduler(base.ReconfigurableBaseScheduler):
             )
 
         # record the change's importance
-        return self.master.db.schedulers.classifyChanges(self.serviceid, {change.number: important})
+        self._classifications.setdefault(timer_name, {})[change.number] = important
+        self._unwritten_classifications[change.number] = important
+        if not self.classificationsWriteDelay:
+            return self.writeChangeClassifications()
+        if self._classifications_write_timer is None:
+            self._classifications_write_timer = self.master.reactor.callLater(
+                self.classificationsWriteDelay, self._classificationsWriteTimerFired
+            )
+        return defer.succeed(None)
+
+    def _classificationsWriteTimerFired(self):
+        self._classifications_write_timer = None
+        d = self.writeChangeClassifications()
+        d.addErrback(log.err, "while writing change classifications")
+
+    @util.deferredLocked('_classifications_lock')
+    @defer.inlineCallbacks
+    def writeChangeClassifications(self):
+        """Writes the change classifications that are only in memory to the database"""
+        if self._classifications_write_timer is not None:
+            self._classifications_write_timer.cancel()
+            self._classifications_write_timer = None
+        classifications = self._unwritten_classifications
+        if not classifications:
+            return
+        self._unwritten_classifications = {}
+        try:
+            yield self.master.db.schedulers.classifyChanges(self.serviceid, classifications)
+        except Exception:
+            # keep them to try again, unless they were classified again in the meantime
+            for changeid, important in classifications.items():
+                self._unwritten_classifications.setdefault(changeid, important)
+            raise
+
+    @util.deferredLocked('_classifications_lock')
+    def _forgetChangeClassifications(self, changeids):
+        for changeid in changeids:
+            self._unwritten_classifications.pop(changeid, None)
+        return self.master.db.schedulers.flushChangeClassifications(
+            self.serviceid, changeids=changeids
+        )
 
     @defer.inlineCallbacks
     def scanExistingClassifiedChanges(self):
@@ -207,22 +273,40 @@ class BaseBasicScheduler(base.ReconfigurableBaseScheduler):
         classifications = yield self.master.db.schedulers.getChangeClassifications(self.serviceid)
 
         # call gotChange for each change, after first fetching it from the db
+        missing = []
         for changeid, important in classifications.items():
             chdict = yield self.master.db.changes.getChange(changeid)
 
             if not chdict:
+                missing.append(changeid)
                 continue
 
             change = yield changes.Change.fromChdict(self.master, chdict)
             yield self.gotChange(change, important)
 
+        # no need to write them again
+        for changeid in classifications:
+            self._unwritten_classifications.pop(changeid, None)
+
+        # the classifications of the changes that are gone would never be built, nor flushed
+        if missing:
+            yield self.master.db.schedulers.flushChangeClassifications(
+                self.serviceid, changeids=missing
+            )
+
     def getTimerNameForChange(self, change):
         raise NotImplementedError  # see subclasses
 
     def getChangeClassificationsForTimer(self, sched_id, timer_name):
         """similar to db.schedulers.getChangeClassifications, but given timer
         name"""
-        raise NotImplementedError  # see subclasses
+        return defer.succeed(dict(self._classifications.get(timer_name, {})))
+
+    def _overridesGetChangeClassificationsForTimer(self):
+        return (
+            type(self).getChangeClassificationsForTimer
+            is not BaseBasicScheduler.getChangeClassificationsForTimer
+        )
 
     @util.deferredLocked('_stable_timers_lock')
     @defer.inlineCallbacks
@@ -232,6 +316,9 @@ class BaseBasicScheduler(base.ReconfigurableBaseScheduler):
         if not self._stable_timers.pop(timer_name, None):
             return
 
+        if self._overridesGetChangeClassificationsForTimer():
+            # the overridden method may read the classifications from the database
+            yield self.writeChangeClassifications()
         classifications = yield self.getChangeClassificationsForTimer(self.serviceid, timer_name)
 
         # just in case: databases do weird things sometimes!
@@ -243,10 +330,12 @@ class BaseBasicScheduler(base.ReconfigurableBaseScheduler):
             reason=self.reason, changeids=changeids, priority=self.priority
         )
 
-        max_changeid = changeids[-1]  # (changeids are sorted)
-        yield self.master.db.schedulers.flushChangeClassifications(
-            self.serviceid, less_than=max_changeid + 1
-        )
+        remaining = self._classifications.pop(timer_name, {})
+        for changeid in changeids:
+            remaining.pop(changeid, None)
+        if remaining:
+            self._classifications[timer_name] = remaining
+        yield self._forgetChangeClassifications(changeids)
 
 
 class SingleBranchScheduler(AbsoluteSourceStampsMixin, BaseBasicScheduler):
@@ -292,9 +381,6 @@ class SingleBranchScheduler(AbsoluteSourceStampsMixin, BaseBasicScheduler):
     def getTimerNameForChange(self, change):
         return "only"  # this class only uses one timer
 
-    def getChangeClassificationsForTimer(self, sched_id, timer_name):
-        return self.master.db.schedulers.getChangeClassifications(sched_id)
-
 
 class Scheduler(SingleBranchScheduler):
     "alias for SingleBranchScheduler"
@@ -321,13 +407,6 @@ class AnyBranchScheduler(BaseBasicScheduler):
         # Py2.6+: could be a namedtuple
         return (change.codebase, change.project, change.repository, change.branch)
 
-    def getChangeClassificationsForTimer(self, sched_id, timer_name):
-        # set in getTimerNameForChange
-        codebase, project, repository, branch = timer_name
-        return self.master.db.schedulers.getChangeClassifications(
-            sched_id, branch=branch, repository=repository, codebase=codebase, project=project
-        )
-
 
 # now at buildbot.schedulers.dependent, but keep the old name alive
 Dependent = dependent.Dependent
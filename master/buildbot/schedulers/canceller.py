@@ -27,19 +27,61 @@ from buildbot.util.ssfilter import extract_filter_values
 
 
 class _OldBuildFilterSet:
+    # the properties that SourceStampFilter looks at, unless it has a filter_fn
+    _MATCHED_PROPS = ('project', 'codebase', 'repository', 'branch')
+    _MAX_CACHED_MATCHES = 10000
+
     def __init__(self):
         self._by_builder = {}
+        # The builders with the same filters share a group, so that the filters are evaluated once
+        # per source stamp for all of them. The groups are computed on first use.
+        self._group_by_builder = None
+        self._cacheable_groups = set()
+        # (group, project, codebase, repository, branch) -> bool
+        self._matched_cache = {}
 
     def add_filter(self, builders, filter):
         assert builders is not None
 
         for builder in builders:
-            self._by_builder.setdefault(builder, []).append(filter)
+            filters = self._by_builder.setdefault(builder, [])
+            if filter not in filters:
+                filters.append(filter)
+        self._group_by_builder = None
+        self._matched_cache = {}
+
+    def _compute_groups(self):
+        groups = {}
+        self._group_by_builder = {}
+        self._cacheable_groups = set()
+        for builder, filters in self._by_builder.items():
+            group = groups.setdefault(tuple(id(f) for f in filters), len(groups))
+            self._group_by_builder[builder] = group
+            if all(f.filter_fn is None for f in filters):
+                self._cacheable_groups.add(group)
 
     def is_matched(self, builder_name, props):
         assert builder_name is not None
 
-        filters = self._by_builder.get(builder_name, [])
+        filters = self._by_builder.get(builder_name)
+        if not filters:
+            return False
+
+        if self._group_by_builder is None:
+            self._compute_groups()
+        group = self._group_by_builder[builder_name]
+        if group not in self._cacheable_groups:
+            return self._is_matched(filters, props)
+
+        key = (group, *(props.get(prop, '') for prop in self._MATCHED_PROPS))
+        matched = self._matched_cache.get(key)
+        if matched is None:
+            if len(self._matched_cache) >= self._MAX_CACHED_MATCHES:
+                self._matched_cache = {}
+            matched = self._matched_cache[key] = self._is_matched(filters, props)
+        return matched
+
+    def _is_matched(self, filters, props):
         for filter in filters:
             if filter.is_matched(props):
                 return True
@@ -77,10 +119,14 @@ class _OldBuildrequestTracker:
         # Note that a single branch may run multiple builds. Also, changes are not a source for
         # build request cancelling because a change may not result in builds being started due to
         # user scheduler configuration. In such case it makes sense to let the build finish.
+        #
+        # Build requests are only obsoleted by newer build requests of the same builder, thus they
+        # are indexed by builder and branch, so that finding the obsoleted ones only visits them.
 
-        # (is_build, id) -> _TrackedBuildRequest
+        # brid -> _TrackedBuildRequest
         self.br_by_id = {}
-        self.br_by_ss = {}
+        # (builder_name, ss_tuple) -> {brid: _TrackedBuildRequest}, in the order of start_time
+        self.br_by_builder_ss = {}
         self.change_time_by_ss = {}
         self._change_count_since_clean = 0
 
@@ -120,9 +166,22 @@ class _OldBuildrequestTracker:
         self.br_by_id[brid] = tracked_br
 
         for ss_tuple in ss_tuples:
-            br_dict = self.br_by_ss.setdefault(ss_tuple, {})
+            br_dict = self.br_by_builder_ss.setdefault((builder_name, ss_tuple), {})
             br_dict[tracked_br.brid] = tracked_br
 
+    def _remove_tracked_buildrequest(self, tracked_br, description):
+        for ss_tuple in tracked_br.ss_tuples:
+            br_dict = self.br_by_builder_ss.get((tracked_br.builder_name, ss_tuple), None)
+            if br_dict is None:
+                raise KeyError(
+                    f'{self.__class__.__name__}: Could not find {description} builds '
+                    f'by tuple {ss_tuple}'
+                )
+
+            del br_dict[tracked_br.brid]
+            if not br_dict:
+                del self.br_by_builder_ss[(tracked_br.builder_name, ss_tuple)]
+
     def _maybe_cancel_new_obsoleted_buildrequest(self, builder_name, sourcestamps):
         for sourcestamp in sourcestamps:
             ss_tuple = (
@@ -138,35 +197,22 @@ class _OldBuildrequestTracker:
                 # a change.
                 continue
 
-            br_dict = self.br_by_ss.get(ss_tuple, None)
+            br_dict = self.br_by_builder_ss.get((builder_name, ss_tuple), None)
             if br_dict is None:
                 continue
 
-            brids_to_cancel = []
-            for tracked_br in list(br_dict.values()):
-                if tracked_br.builder_name != builder_name:
-                    continue
-
+            tracked_brs_to_cancel = []
+            for tracked_br in br_dict.values():
                 if newest_change_time <= tracked_br.start_time:
                     # The existing build request is newer than the change, thus change should not
-                    # be a reason to cancel it.
-                    continue
+                    # be a reason to cancel it, nor the following ones.
+                    break
+                tracked_brs_to_cancel.append(tracked_br)
 
+            brids_to_cancel = []
+            for tracked_br in tracked_brs_to_cancel:
                 del self.br_by_id[tracked_br.brid]
-
-                # Clear the canceled buildrequest from self.br_by_ss
-                for i_ss_tuple in tracked_br.ss_tuples:
-                    other_br_dict = self.br_by_ss.get(i_ss_tuple, None)
-                    if other_br_dict is None:
-                        raise KeyError(
-                            f'{self.__class__.__name__}: Could not find running builds '
-                            f'by tuple {i_ss_tuple}'
-                        )
-
-                    del other_br_dict[tracked_br.brid]
-                    if not other_br_dict:
-                        del self.br_by_ss[i_ss_tuple]
-
+                self._remove_tracked_buildrequest(tracked_br, 'running')
                 brids_to_cancel.append(tracked_br.brid)
 
             for brid in brids_to_cancel:
@@ -177,16 +223,7 @@ class _OldBuildrequestTracker:
         if tracked_br is None:
             return
 
-        for ss_tuple in tracked_br.ss_tuples:
-            br_dict = self.br_by_ss.get(ss_tuple, None)
-            if br_dict is None:
-                raise KeyError(
-                    f'{self.__class__.__name__}: Could not find finished builds by tuple {ss_tuple}'
-                )
-
-            del br_dict[tracked_br.brid]
-            if not br_dict:
-                del self.br_by_ss[ss_tuple]
+        self._remove_tracked_buildrequest(tracked_br, 'finished')
 
     def on_change(self, change):
         now = self.reactor.seconds()
@@ -15,10 +15,202 @@
 
 from __future__ import annotations
 
+import itertools
+from typing import Any
+from typing import Callable
+
+from twisted.internet import defer
+from twisted.python import log
+
+from buildbot.changes import changes
+from buildbot.changes.filter import ChangeFilter
+from buildbot.changes.filter import ChangeFilterIndex
+from buildbot.changes.filter import ImportantFiles
+from buildbot.changes.filter import ImportantFilesIndex
+from buildbot.process import metrics
 from buildbot.process.measured_service import MeasuredBuildbotServiceManager
+from buildbot.util.timers import Timer
+from buildbot.util.timers import TimerQueue
+
+
+class ChangeSubscription:
+    """
+    Subscription of a scheduler to the new changes, which has the same interface as a message
+    queue consumer.
+    """
+
+    def __init__(
+        self,
+        manager: SchedulerManager,
+        callback: Callable[..., Any],
+        order: int,
+        important_files: ImportantFiles | None = None,
+    ):
+        self.manager = manager
+        self.callback = callback
+        self.order = order
+        self.important_files = important_files
+
+    def stopConsuming(self) -> None:
+        if self in self.manager._change_subscriptions:
+            del self.manager._change_subscriptions[self]
+            self.manager._change_index.remove(self)
+            if self.important_files is not None:
+                self.manager._important_files_index.remove(self)
 
 
 class SchedulerManager(MeasuredBuildbotServiceManager):
+    """
+    Manages the schedulers, and dispatches the new changes to them: each change is loaded once,
+    and the same L{Change} instance is then delivered to the subscribed schedulers whose change
+    filter may match it, as found by a L{ChangeFilterIndex}.
+
+    While running, it also provides the timed schedulers with a shared L{TimerQueue}, so that
+    a single reactor delayed call is pending whatever the number of schedulers. The schedulers
+    actuated at the same time have their state loaded together, see L{schedule_actuation}.
+    """
+
     name: str | None = "SchedulerManager"  # type: ignore[assignment]
     managed_services_name = "schedulers"
     config_attr = "schedulers"
+
+    def __init__(self):
+        super().__init__()
+        self._change_consumer = None
+        self._change_subscriptions: dict[ChangeSubscription, ChangeFilter | None] = {}
+        self._change_index = ChangeFilterIndex()
+        self._important_files_index = ImportantFilesIndex()
+        self._subscription_order = itertools.count()
+        self.timers: TimerQueue | None = None
+        self._due_actuations: list[tuple[int, int, Callable[..., Any]]] = []
+        self._due_actuations_call = None
+
+    @defer.inlineCallbacks
+    def startService(self):
+        self.timers = TimerQueue(self.master.reactor)
+        self._change_consumer = yield self.master.mq.startConsuming(
+            self._changeCallback, ('changes', None, 'new')
+        )
+        yield super().startService()
+
+    @defer.inlineCallbacks
+    def stopService(self):
+        yield super().stopService()
+        if self._change_consumer:
+            self._change_consumer.stopConsuming()
+            self._change_consumer = None
+        if self.timers is not None:
+            self.timers.stop()
+            self.timers = None
+        if self._due_actuations_call is not None:
+            self._due_actuations_call.cancel()
+            self._due_actuations_call = None
+        self._due_actuations = []
+
+    def subscribe_to_changes(
+        self,
+        callback: Callable[..., Any],
+        change_filter: ChangeFilter | None = None,
+        important_files: ImportantFiles | None = None,
+    ) -> ChangeSubscription:
+        """
+        Calls C{callback} with each new change, until the returned subscription is stopped.
+        The callback may return a Deferred, which is waited for before the fan-out of the change
+        is considered complete.
+
+        If C{change_filter} is given, the changes it certainly does not match are not delivered;
+        the callback must still check the others with L{ChangeFilter.filter_change}.
+
+        If C{important_files} is given, the callback is called with the change and whether it is
+        important: the files of the change are matched once against the rules of all the
+        subscriptions.
+        """
+        subscription = ChangeSubscription(
+            self, callback, next(self._subscription_order), important_files
+        )
+        self._change_subscriptions[subscription] = change_filter
+        self._change_index.add(subscription, change_filter)
+        if important_files is not None:
+            self._important_files_index.add(subscription, important_files)
+        return subscription
+
+    def schedule_actuation(
+        self, when: float, schedulerid: int, objectid: int | None, actuate: Callable[..., Any]
+    ) -> Timer:
+        """
+        Calls C{actuate} at C{when} with a C{(classifications, last_only_if_changed)} tuple: the
+        change classifications of the scheduler C{schedulerid} and its C{last_only_if_changed}
+        state, stored under C{objectid}. These are loaded with a single query each for all the
+        schedulers actuated at the same time. If loading them fails, C{actuate} is called
+        without arguments.
+        """
+        assert self.timers is not None
+        return self.timers.call_at(when, self._actuation_due, schedulerid, objectid, actuate)
+
+    def _actuation_due(self, schedulerid, objectid, actuate):
+        self._due_actuations.append((schedulerid, objectid, actuate))
+        if self._due_actuations_call is None:
+            # let all the timers due at the same time fire first
+            self._due_actuations_call = self.master.reactor.callLater(0, self._actuate_due)
+
+    @defer.inlineCallbacks
+    def _actuate_due(self):
+        self._due_actuations_call = None
+        due, self._due_actuations = self._due_actuations, []
+
+        try:
+            classifications = yield self.master.db.schedulers.getChangeClassificationsForSchedulers([
+                schedulerid for schedulerid, _, _ in due
+            ])
+            states = yield self.master.db.state.getStates(
+                [objectid for _, objectid, _ in due if objectid is not None],
+                'last_only_if_changed',
+            )
+            prefetched = [
+                ((classifications[schedulerid], states.get(objectid, True)),)
+                for schedulerid, objectid, _ in due
+            ]
+        except Exception as e:
+            log.err(e, 'while loading the state of the timed schedulers')
+            # let each scheduler load its own state
+            prefetched = [()] * len(due)
+
+        metrics.MetricCountEvent.log("SchedulerManager.actuation_batch", len(due), absolute=True)
+
+        for (_, _, actuate), args in zip(due, prefetched):
+            d = defer.maybeDeferred(actuate, *args)
+            d.addErrback(log.err, 'while actuating a scheduler')
+
+    @defer.inlineCallbacks
+    def _changeCallback(self, key, msg):
+        if not self._change_subscriptions:
+            return
+        started_at = self.master.reactor.seconds()
+
+        # the changes go through the Changes cache, so that recent changes are not reloaded
+        chdict = yield self.master.db.changes.getChange(msg['changeid'])
+        change = yield changes.Change.fromChdict(self.master, chdict)
+
+        subscriptions = sorted(self._change_index.match(change), key=lambda s: s.order)
+        metrics.MetricCountEvent.log(
+            "SchedulerManager.change_routed", len(subscriptions), absolute=True
+        )
+
+        with_rules = [s for s in subscriptions if s.important_files is not None]
+        important = set()
+        if with_rules:
+            important = self._important_files_index.match(change.files, with_rules)
+
+        dl = []
+        for subscription in subscriptions:
+            if subscription.important_files is not None:
+                d = defer.maybeDeferred(subscription.callback, change, subscription in important)
+            else:
+                d = defer.maybeDeferred(subscription.callback, change)
+            d.addErrback(log.err, f'while delivering change {change.number}')
+            dl.append(d)
+        yield defer.gatherResults(dl)
+
+        metrics.MetricTimeEvent.log(
+            "SchedulerManager.change_fanout", self.master.reactor.seconds() - started_at
+        )
@@ -14,6 +14,9 @@
 # Copyright Buildbot Team Members
 
 import datetime
+import functools
+import math
+import random
 from typing import Any
 from typing import ClassVar
 from typing import Sequence
@@ -30,6 +33,7 @@ from buildbot.interfaces import ITriggerableScheduler
 from buildbot.process import buildstep
 from buildbot.process import properties
 from buildbot.schedulers import base
+from buildbot.schedulers.manager import SchedulerManager
 from buildbot.util.codebase import AbsoluteSourceStampsMixin
 
 # States of objects which have to be observed are registered in the data base table `object_state`.
@@ -88,6 +92,7 @@ class Timed(AbsoluteSourceStampsMixin, base.ReconfigurableBaseScheduler):
         'fileIsImportant',
         'change_filter',
         'onlyImportant',
+        'jitter',
     )
     reason = ''
 
@@ -108,6 +113,10 @@ class Timed(AbsoluteSourceStampsMixin, base.ReconfigurableBaseScheduler):
 
         self.is_first_build = None
 
+        # the change classifications and last_only_if_changed state loaded by the scheduler
+        # manager for the current actuation, if any
+        self._prefetched = None
+
     def checkConfig(  # type: ignore[override]
         self,
         builderNames,
@@ -118,6 +127,7 @@ class Timed(AbsoluteSourceStampsMixin, base.ReconfigurableBaseScheduler):
         change_filter=None,
         fileIsImportant=None,
         onlyImportant=False,
+        jitter=0,
         **kwargs: Any,
     ):
         super().checkConfig(builderNames=builderNames, **kwargs)
@@ -125,6 +135,9 @@ class Timed(AbsoluteSourceStampsMixin, base.ReconfigurableBaseScheduler):
         if fileIsImportant and not callable(fileIsImportant):
             config.error("fileIsImportant must be a callable")
 
+        if not isinstance(jitter, (int, float)) or jitter < 0:
+            config.error("jitter must be a non-negative number")
+
     @defer.inlineCallbacks
     def reconfigService(  # type: ignore[override]
         self,
@@ -136,6 +149,7 @@ class Timed(AbsoluteSourceStampsMixin, base.ReconfigurableBaseScheduler):
         change_filter=None,
         fileIsImportant=None,
         onlyImportant=False,
+        jitter=0,
         **kwargs: Any,
     ):
         yield super().reconfigService(builderNames=builderNames, **kwargs)
@@ -148,6 +162,7 @@ class Timed(AbsoluteSourceStampsMixin, base.ReconfigurableBaseScheduler):
         self.fileIsImportant = fileIsImportant
         # If True, only important changes will be added to the buildset.
         self.onlyImportant = onlyImportant
+        self.jitter = jitter
 
         if self.active:
             # FIXME: there's a short time below where changes will not be picked up
@@ -242,7 +257,11 @@ class Timed(AbsoluteSourceStampsMixin, base.ReconfigurableBaseScheduler):
 
         # use the collected changes to start a build
         scheds = self.master.db.schedulers
-        classifications = yield scheds.getChangeClassifications(self.serviceid)
+        if self._prefetched is not None:
+            classifications, last_only_if_changed = self._prefetched
+        else:
+            classifications = yield scheds.getChangeClassifications(self.serviceid)
+            last_only_if_changed = yield self.getState('last_only_if_changed', True)
 
         # if onlyIfChanged is True, then we will skip this build if no important changes have
         # occurred since the last invocation. Note that when the scheduler has just been started
@@ -253,8 +272,6 @@ class Timed(AbsoluteSourceStampsMixin, base.ReconfigurableBaseScheduler):
         # at the point when startBuild finishes (it is not obvious, that all code paths lead
         # to this outcome)
 
-        last_only_if_changed = yield self.getState('last_only_if_changed', True)
-
         if (
             last_only_if_changed
             and self.onlyIfChanged
@@ -361,11 +378,24 @@ class Timed(AbsoluteSourceStampsMixin, base.ReconfigurableBaseScheduler):
                     f"{self.__class__.__name__} scheduler <{self.name}>: "
                     "missed scheduled build time - building immediately"
                 )
-            self.actuateAtTimer = self.master.reactor.callLater(untilNext, self._actuate)
+            # stagger the actuations of the schedulers due at the same time; self.actuateAt stays
+            # the nominal time, which is recorded as the last build time
+            fireAt = self.actuateAt
+            if self.jitter:
+                fireAt += random.uniform(0, self.jitter)
+            if isinstance(self.parent, SchedulerManager) and self.parent.timers is not None:
+                # the timers of all the schedulers share a single reactor delayed call, and the
+                # state of the schedulers actuated together is loaded at once
+                self.actuateAtTimer = self.parent.schedule_actuation(
+                    fireAt, self.serviceid, self._objectid, self._actuate
+                )
+            else:
+                self.actuateAtTimer = self.master.reactor.callLater(fireAt - now, self._actuate)
 
     @defer.inlineCallbacks
-    def _actuate(self):
-        # called from the timer when it's time to start a build
+    def _actuate(self, prefetched=None):
+        # called from the timer when it's time to start a build; prefetched is the
+        # (classifications, last_only_if_changed) tuple loaded by the scheduler manager, if any
         self.actuateAtTimer = None
         self.lastActuated = self.actuateAt
 
@@ -381,10 +411,12 @@ class Timed(AbsoluteSourceStampsMixin, base.ReconfigurableBaseScheduler):
 
             try:
                 # start the build
+                self._prefetched = prefetched
                 yield self.startBuild()
             except Exception as e:
                 log.err(e, 'while actuating')
             finally:
+                self._prefetched = None
                 # schedule the next build (noting the lock is already held)
                 yield self._scheduleNextBuild_locked()
 
@@ -423,6 +455,24 @@ class Periodic(Timed):
         return defer.succeed(lastActuated + self.periodicBuildTimer)
 
 
+@functools.lru_cache(maxsize=1024)
+def _cron_next_time(cron_line, ts, utc_offset):
+    tz = datetime.timezone(datetime.timedelta(seconds=utc_offset))
+    cron = croniter.croniter(cron_line, datetime.datetime.fromtimestamp(ts, tz))
+    return cron.get_next(float)
+
+
+def cron_next_time(cron_line, ts, utc_offset):
+    """
+    Returns the first time strictly after C{ts} matching C{cron_line} in the timezone at
+    C{utc_offset}. As a cron line has a one minute resolution, the result is the same for the
+    whole minute, which is used as the cache key: the schedulers sharing a cron line, or
+    recomputing their next build time within the same minute, parse it only once.
+    """
+    minute_start = math.floor((ts + utc_offset) / 60) * 60 - utc_offset
+    return _cron_next_time(cron_line, minute_start, utc_offset)
+
+
 class NightlyBase(Timed):
     compare_attrs: ClassVar[Sequence[str]] = (
         "minute",
@@ -497,6 +547,10 @@ class NightlyBase(Timed):
         self.force_at_month = default_if_none(force_at_month, "*")
         self.force_at_day_of_week = default_if_none(force_at_day_of_week, "*")
 
+        self._cron_line = self._times_to_cron_line(
+            self.minute, self.hour, self.dayOfMonth, self.month, self.dayOfWeek
+        )
+
     def _timeToCron(self, time, isDayOfWeek=False):
         if isinstance(time, int):
             if isDayOfWeek:
@@ -545,16 +599,7 @@ class NightlyBase(Timed):
 
     def getNextBuildTime(self, lastActuated):
         ts = lastActuated or self.now()
-        sched = self._times_to_cron_line(
-            self.minute,
-            self.hour,
-            self.dayOfMonth,
-            self.month,
-            self.dayOfWeek,
-        )
-
-        cron = croniter.croniter(sched, self._time_to_croniter_tz_time(ts))
-        nextdate = cron.get_next(float)
+        nextdate = cron_next_time(self._cron_line, ts, self.current_utc_offset(ts))
         return defer.succeed(nextdate)
 
     def maybe_force_build_on_unimportant_changes(self, current_actuation_time):
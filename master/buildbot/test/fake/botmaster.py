@@ -17,6 +17,7 @@
 from twisted.internet import defer
 
 from buildbot.process import botmaster
+from buildbot.process.buildrequestindex import PendingBuildRequestIndex
 from buildbot.util import service
 
 
@@ -28,6 +29,9 @@ class FakeBotMaster(service.AsyncMultiService, botmaster.LockRetrieverMixin):
         self.buildsStartedForWorkers = []
         self.delayShutdown = False
         self._starting_brid_to_cancel = {}
+        # not started, so that the requests are always loaded from the data API
+        self.pending_requests = PendingBuildRequestIndex()
+        self.pending_requests.parent = self
 
     def getBuildersForWorker(self, workername):
         return self.builders.get(workername, [])
@@ -35,7 +39,7 @@ class FakeBotMaster(service.AsyncMultiService, botmaster.LockRetrieverMixin):
     def maybeStartBuildsForWorker(self, workername):
         self.buildsStartedForWorkers.append(workername)
 
-    def maybeStartBuildsForAllBuilders(self):
+    def maybeStartBuildsForAllBuilders(self, skip_blocked=False):
         self.buildsStartedForWorkers += self.builders.keys()
 
     def workerLost(self, bot):
@@ -230,6 +230,30 @@ class FakeUpdates(service.AsyncService):
         self.claimedBuildRequests.update(set(brids))
         return True
 
+    @async_to_deferred
+    async def claimBuildRequestGroups(self, groups, claimed_at=None) -> list[bool]:
+        validation.verifyType(
+            self.testcase,
+            'groups',
+            groups,
+            validation.ListValidator(validation.ListValidator(validation.IntValidator())),
+        )
+        validation.verifyType(
+            self.testcase,
+            'claimed_at',
+            claimed_at,
+            validation.NoneOk(validation.DateTimeValidator()),
+        )
+        if not any(groups):
+            return [True] * len(groups)
+        claimed = await self.master.db.buildrequests.claim_buildrequest_groups(
+            groups, claimed_at=claimed_at
+        )
+        for brids, ok in zip(groups, claimed):
+            if ok:
+                self.claimedBuildRequests.update(set(brids))
+        return claimed
+
     @async_to_deferred
     async def unclaimBuildRequests(self, brids) -> None:
         validation.verifyType(
@@ -60,6 +60,7 @@ class CodebaseCommit(Row):
         when_timestamp: int = 1234567,
         revision: str | None = None,
         parent_commitid: int | None = None,
+        generation: int | None = None,
     ):
         if revision is None:
             revision = f'rev{id}'
@@ -72,6 +73,7 @@ class CodebaseCommit(Row):
             when_timestamp=when_timestamp,
             revision=revision,
             parent_commitid=parent_commitid,
+            generation=generation,
         )
 
 
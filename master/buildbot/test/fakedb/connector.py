@@ -556,6 +556,7 @@ class FakeDBConnector(DBConnector):
                         'when_timestamp': int(row.when_timestamp),
                         'revision': row.revision,
                         'parent_commitid': row.parent_commitid,
+                        'generation': row.generation,
                     }
                 ],
             )
@@ -162,6 +162,8 @@ class TestSetupPyEntryPoints(unittest.TestCase):
             'buildbot.util.subscription.Subscription',
             'buildbot.util.subscription.SubscriptionPoint',
             'buildbot.util.test_result_submitter.TestResultSubmitter',
+            'buildbot.util.timers.Timer',
+            'buildbot.util.timers.TimerQueue',
             "buildbot.util.watchdog.Watchdog",
             "buildbot.util.twisted.ThreadPool",
         }
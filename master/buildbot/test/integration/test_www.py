@@ -35,6 +35,7 @@ from buildbot.util import unicode2bytes
 from buildbot.util.twisted import async_to_deferred
 from buildbot.www import auth
 from buildbot.www import authz
+from buildbot.www import encoding as wwwencoding
 from buildbot.www import service as wwwservice
 
 if TYPE_CHECKING:
@@ -84,6 +85,8 @@ class Www(www.RequiresWwwMixin, unittest.TestCase):
             "authz": authz.Authz(),
             "avatar_methods": [],
             "logfileName": 'http.log',
+            # the responses of these tests are tiny
+            "response_encoding": wwwencoding.ResponseEncodingPolicy(min_size=0),
         }
         master.www = wwwservice.WWWService()
         yield master.www.setServiceParent(master)
@@ -229,6 +232,30 @@ class Www(www.RequiresWwwMixin, unittest.TestCase):
             },
         )
 
+    @async_to_deferred
+    async def test_no_compression_below_min_size(self):
+        assert self.master
+        self.master.config.www['response_encoding'] = wwwencoding.ResponseEncodingPolicy(
+            min_size=1024
+        )
+        await self.master.www.reconfigServiceWithBuildbotConfig(self.master.config)
+        await self.master.db.insert_test_data([
+            fakedb.Master(id=7, active=0, last_active=SOMETIME),
+        ])
+
+        pg = await self.agent.request(
+            b'GET',
+            self.link(b'masters/7'),
+            headers=Headers({b'accept-encoding': [b'gzip']}),
+        )
+        d: defer.Deferred[bytes] = defer.Deferred()
+        pg.deliverBody(BodyReader(d))
+        body = await d
+
+        self.assertIsNone(pg.headers.getRawHeaders(b'content-encoding'))
+        self.assertEqual(pg.length, len(body))
+        self.assertEqual(json.loads(bytes2unicode(body))['masters'][0]['masterid'], 7)
+
     @async_to_deferred
     async def test_gzip_compression(self):
         await self._test_compression(
@@ -19,6 +19,9 @@ from parameterized import parameterized
 from twisted.trial import unittest
 
 from buildbot.changes.filter import ChangeFilter
+from buildbot.changes.filter import ChangeFilterIndex
+from buildbot.changes.filter import ImportantFiles
+from buildbot.changes.filter import ImportantFilesIndex
 from buildbot.test.fake.change import Change
 
 
@@ -233,3 +236,143 @@ class TestChangeFilter(unittest.TestCase):
         self.assertTrue(f.filter_change(Change(properties={"event.type": "ref-updated"})))
         self.assertFalse(f.filter_change(Change(properties={"event.type": "patch-uploaded"})))
         self.assertFalse(f.filter_change(Change(properties={})))
+
+
+class TestChangeFilterIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = ChangeFilterIndex()
+
+    def test_exact(self):
+        self.index.add('b1', ChangeFilter(branch='b1', project='p'))
+        self.index.add('b12', ChangeFilter(branch=['b1', 'b2']))
+        self.index.add('p', ChangeFilter(project='p'))
+
+        self.assertEqual(self.index.match(Change(branch='b1')), {'b1', 'b12'})
+        self.assertEqual(self.index.match(Change(branch='b2', project='p')), {'b12', 'p'})
+        self.assertEqual(self.index.match(Change(branch='b3')), set())
+        self.assertEqual(self.index.match(Change(branch=['b1'])), set())
+
+    def test_regex(self):
+        self.index.add('rel', ChangeFilter(branch_re='release/.*'))
+        self.index.add('rel2', ChangeFilter(branch_re='release/.*', project_not_eq='p'))
+        self.index.add('feat', ChangeFilter(branch_re=re.compile('FEATURE/', re.I)))
+
+        self.assertEqual(self.index.match(Change(branch='release/1')), {'rel', 'rel2'})
+        self.assertEqual(self.index.match(Change(branch='feature/1')), {'feat'})
+        self.assertEqual(self.index.match(Change(branch='master')), set())
+        self.assertEqual(self.index.match(Change(branch=None)), set())
+
+    @parameterized.expand([
+        ('backreference', r'(a)\1'),
+        ('named_backreference', r'(?P<x>a)(?P=x)'),
+        ('global_flags', r'(?i)a'),
+    ])
+    def test_regex_not_combined(self, name, pattern):
+        self.index.add('a', ChangeFilter(branch_re=pattern))
+        self.index.add('b', ChangeFilter(branch_re='(b)\\1'))
+
+        self.assertEqual(self.index.match(Change(branch='bb')), {'b'})
+        self.assertEqual(self.index.match(Change(branch='aa')), {'a'})
+
+    def test_unindexed(self):
+        self.index.add('none', None)
+        self.index.add('fn', ChangeFilter(filter_fn=lambda change: False))
+        self.index.add('not', ChangeFilter(branch_not_eq='b1'))
+
+        self.assertEqual(self.index.match(Change(branch='b1')), {'none', 'fn', 'not'})
+
+    def test_subclass_unindexed(self):
+        class AnyChangeFilter(ChangeFilter):
+            def filter_change(self, change):
+                return True
+
+        self.index.add('any', AnyChangeFilter(branch='b1'))
+
+        self.assertEqual(self.index.match(Change(branch='b2')), {'any'})
+
+    def test_remove(self):
+        self.index.add('b1', ChangeFilter(branch='b1'))
+        self.index.add('b12', ChangeFilter(branch=['b1', 'b2']))
+        self.index.add('rel', ChangeFilter(branch_re='release/.*'))
+        self.index.add('none', None)
+        self.assertEqual(len(self.index), 4)
+
+        for key in ['b12', 'rel', 'none']:
+            self.index.remove(key)
+
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index.match(Change(branch='b1')), {'b1'})
+        self.assertEqual(self.index.match(Change(branch='b2')), set())
+        self.assertEqual(self.index.match(Change(branch='release/1')), set())
+
+
+class TestImportantFiles(unittest.TestCase):
+    @parameterized.expand([
+        ('literal', 'src/main.c', ['src/main.c'], ['src/main.h', 'main.c', 'src/main.c/x']),
+        ('directory', 'docs/', ['docs/index.rst', 'docs/a/b.png'], ['doc/index.rst', 'a/docs/x']),
+        ('wildcard', 'src/*.c', ['src/main.c'], ['src/a/main.c', 'main.c', 'src/main.h']),
+        ('name_anywhere', '*.md', ['README.md', 'a/b/c.md'], ['a/b/c.mdx', 'md/c']),
+        ('recursive', 'src/**/test_*.py', ['src/test_a.py', 'src/a/b/test_a.py'], ['test_a.py']),
+        ('recursive_end', 'src/**', ['src/a', 'src/a/b'], ['a/src/b']),
+        ('char_class', 'v[0-9]/x', ['v1/x'], ['va/x']),
+    ])
+    def test_patterns(self, name, pattern, matching, not_matching):
+        rules = ImportantFiles(include=pattern)
+        for path in matching:
+            self.assertTrue(rules(Change(files=[path])), path)
+        for path in not_matching:
+            self.assertFalse(rules(Change(files=[path])), path)
+
+    def test_exclude(self):
+        rules = ImportantFiles(include=['src/', 'docs/'], exclude=['*.md', 'src/generated/'])
+
+        self.assertTrue(rules(Change(files=['src/main.c'])))
+        self.assertTrue(rules(Change(files=['README.md', 'docs/index.rst'])))
+        self.assertFalse(rules(Change(files=['src/README.md', 'src/generated/a.c'])))
+        self.assertFalse(rules(Change(files=['setup.py'])))
+        self.assertFalse(rules(Change(files=[])))
+
+    def test_exclude_only(self):
+        rules = ImportantFiles(exclude='*.md')
+
+        self.assertTrue(rules(Change(files=['README.md', 'setup.py'])))
+        self.assertFalse(rules(Change(files=['README.md'])))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ImportantFiles(include=['src/', 1])
+        with self.assertRaises(ValueError):
+            ImportantFiles(exclude='/')
+
+    def test_compare(self):
+        self.assertEqual(ImportantFiles(include='a/'), ImportantFiles(include=['a/']))
+        self.assertNotEqual(ImportantFiles(include='a/'), ImportantFiles(exclude=['a/']))
+
+
+class TestImportantFilesIndex(unittest.TestCase):
+    def test_match(self):
+        index = ImportantFilesIndex()
+        index.add('src', ImportantFiles(include='src/'))
+        index.add('src_no_docs', ImportantFiles(include='src/', exclude='*.md'))
+        index.add('docs', ImportantFiles(include=['docs/', '*.md']))
+        index.add('all', ImportantFiles())
+
+        self.assertEqual(index.match(['src/a.c']), {'src', 'src_no_docs', 'all'})
+        self.assertEqual(index.match(['src/README.md']), {'src', 'docs', 'all'})
+        self.assertEqual(
+            index.match(['src/README.md', 'src/a.c']), {'src', 'src_no_docs', 'docs', 'all'}
+        )
+        self.assertEqual(index.match(['setup.py'], keys=['src', 'docs', 'all']), {'all'})
+        self.assertEqual(index.match([]), set())
+
+    def test_remove(self):
+        index = ImportantFilesIndex()
+        index.add('src', ImportantFiles(include='src/'))
+        index.add('src_no_docs', ImportantFiles(include='src/', exclude='*.md'))
+        self.assertEqual(index.match(['src/README.md']), {'src'})
+
+        index.remove('src')
+        index.remove('src_no_docs')
+
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.match(['src/README.md']), set())
@@ -63,6 +63,7 @@ global_defaults = {
     "collapseRequests": None,
     "prioritizeBuilders": None,
     "select_next_worker": None,
+    "build_distribution_concurrency": 1,
     "protocols": {},
     "multiMaster": False,
     "manhole": None,
@@ -520,6 +521,17 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
 
         self.assertConfigError(errors, "must be a callable")
 
+    def test_load_global_build_distribution_concurrency(self):
+        self.do_test_load_global(
+            {"build_distribution_concurrency": 8}, build_distribution_concurrency=8
+        )
+
+    def test_load_global_build_distribution_concurrency_invalid(self):
+        with capture_config_errors() as errors:
+            self.cfg.load_global(self.filename, {"build_distribution_concurrency": 0})
+
+        self.assertConfigError(errors, "must be a positive integer")
+
     def test_load_global_protocols_str(self):
         self.do_test_load_global(
             {"protocols": {'pb': {'port': 'udp:123'}}}, protocols={'pb': {'port': 'udp:123'}}
@@ -992,6 +1004,18 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
 
         self.assertConfigError(errors, 'Invalid www["cookie_expiration_time"]')
 
+    def test_load_www_response_encoding_invalid(self):
+        with capture_config_errors() as errors:
+            self.cfg.load_www(self.filename, {'www': {"response_encoding": {'min_size': 1}}})
+
+        self.assertConfigError(errors, 'Invalid www["response_encoding"]')
+
+    def test_load_www_avatar_cache_invalid(self):
+        with capture_config_errors() as errors:
+            self.cfg.load_www(self.filename, {'www': {"avatar_cache": {'ttl': 1}}})
+
+        self.assertConfigError(errors, 'Invalid www["avatar_cache"]')
+
     def test_load_www_unknown(self):
         with capture_config_errors() as errors:
             self.cfg.load_www(self.filename, {"www": {"foo": "bar"}})
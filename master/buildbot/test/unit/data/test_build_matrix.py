@@ -0,0 +1,165 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+from typing import cast
+
+from twisted.trial import unittest
+
+from buildbot.data import base
+from buildbot.data import build_matrix
+from buildbot.data import resultspec
+from buildbot.master import BuildMaster
+from buildbot.test import fakedb
+from buildbot.test.fake import fakemaster
+from buildbot.test.reactor import TestReactorMixin
+from buildbot.test.util import endpoint
+from buildbot.util.twisted import async_to_deferred
+
+
+class BuildMatrixEndpoint(endpoint.EndpointMixin, unittest.TestCase):
+    endpointClass = build_matrix.BuildMatrixEndpoint
+    resourceTypeClass = build_matrix.BuildMatrixRow
+
+    @async_to_deferred
+    async def setUp(self) -> None:  # type: ignore[override]
+        await self.setUpEndpoint()
+        await self.db.insert_test_data([
+            fakedb.Master(id=1),
+            fakedb.Worker(id=1, name='wrk'),
+            fakedb.Builder(id=1, name='builder1'),
+            fakedb.Builder(id=2, name='builder2'),
+            fakedb.SourceStamp(id=133),
+            fakedb.Change(changeid=13, branch='trunk', sourcestampid=133, when_timestamp=1000000),
+            fakedb.SourceStamp(id=144),
+            fakedb.Change(changeid=14, branch='devel', sourcestampid=144, when_timestamp=1000001),
+            fakedb.Buildset(id=20),
+            fakedb.BuildsetSourceStamp(buildsetid=20, sourcestampid=133),
+            fakedb.BuildRequest(id=30, builderid=1, buildsetid=20),
+            fakedb.BuildRequest(id=31, builderid=2, buildsetid=20),
+            fakedb.Build(
+                id=40,
+                number=5,
+                buildrequestid=30,
+                masterid=1,
+                workerid=1,
+                builderid=1,
+                results=0,
+                complete_at=1000010,
+            ),
+            fakedb.Build(id=41, number=7, buildrequestid=31, masterid=1, workerid=1, builderid=2),
+            fakedb.Buildset(id=21),
+            fakedb.BuildsetSourceStamp(buildsetid=21, sourcestampid=144),
+            fakedb.BuildRequest(id=32, builderid=1, buildsetid=21),
+        ])
+
+    @async_to_deferred
+    async def test_get(self) -> None:
+        rows = await self.callGet(('build_matrix',))
+
+        for row in rows:
+            self.validateData(row)
+        self.assertEqual([row['changeid'] for row in rows], [14, 13])
+        self.assertEqual(
+            rows[0]['builds'],
+            {
+                'buildrequestid': [32],
+                'builderid': [1],
+                'buildid': [None],
+                'number': [None],
+                'results': [None],
+                'complete': [False],
+            },
+        )
+        self.assertEqual(
+            rows[1]['builds'],
+            {
+                'buildrequestid': [30, 31],
+                'builderid': [1, 2],
+                'buildid': [40, 41],
+                'number': [5, 7],
+                'results': [0, None],
+                'complete': [True, False],
+            },
+        )
+
+    @async_to_deferred
+    async def test_get_limit(self) -> None:
+        rows = await self.callGet(
+            ('build_matrix',), resultSpec=resultspec.ResultSpec(order=('-changeid',), limit=1)
+        )
+
+        self.assertEqual([row['changeid'] for row in rows], [14])
+
+    @async_to_deferred
+    async def test_get_default_limit(self) -> None:
+        self.ep.default_limit = 1
+        rows = await self.callGet(('build_matrix',))
+
+        self.assertEqual([row['changeid'] for row in rows], [14])
+        assert isinstance(rows, base.ListResult)
+        self.assertEqual(rows.limit, 1)
+        self.assertEqual(rows.total, 2)
+
+    @async_to_deferred
+    async def test_get_filtered(self) -> None:
+        rows = await self.callGet(
+            ('build_matrix',),
+            resultSpec=resultspec.ResultSpec(
+                filters=[resultspec.Filter('branch', 'eq', ['trunk'])]
+            ),
+        )
+
+        self.assertEqual([row['changeid'] for row in rows], [13])
+        self.assertEqual(rows[0]['builds']['buildid'], [40, 41])
+
+
+class BuildMatrixRow(TestReactorMixin, unittest.TestCase):
+    @async_to_deferred
+    async def setUp(self) -> None:  # type: ignore[override]
+        self.setup_test_reactor()
+        self.master = await fakemaster.make_master(self, wantMq=True, wantDb=True, wantData=True)
+        self.rtype = build_matrix.BuildMatrixRow(cast(BuildMaster, self.master))
+
+    def test_produce_build_event(self) -> None:
+        self.rtype.produce_build_event(
+            {
+                'buildid': 40,
+                'number': 5,
+                'builderid': 1,
+                'buildrequestid': 30,
+                'workerid': 1,
+                'masterid': 1,
+                'results': 0,
+                'complete': True,
+                'state_string': 'finished',
+            },
+            'finished',
+        )
+
+        self.master.mq.assertProductions([
+            (
+                ('build_matrix', 'cells', '30', 'finished'),
+                {
+                    'buildrequestid': 30,
+                    'builderid': 1,
+                    'buildid': 40,
+                    'number': 5,
+                    'results': 0,
+                    'complete': True,
+                },
+            ),
+        ])
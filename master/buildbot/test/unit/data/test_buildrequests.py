@@ -416,6 +416,50 @@ class TestBuildRequest(interfaces.InterfaceTests, TestReactorMixin, unittest.Tes
         )
         self.assertEqual(self.master.mq.productions, [])
 
+    def testSignatureClaimBuildRequestGroups(self):
+        @self.assertArgSpecMatches(
+            self.master.data.updates.claimBuildRequestGroups,  # fake
+            self.rtype.claimBuildRequestGroups,
+        )  # real
+        def claimBuildRequestGroups(self, groups, claimed_at=None):
+            pass
+
+    @defer.inlineCallbacks
+    def testClaimBuildRequestGroups(self):
+        yield self.master.db.insert_test_data([
+            fakedb.Builder(id=123),
+            fakedb.Buildset(id=8822),
+            fakedb.BuildRequest(id=44, buildsetid=8822, builderid=123),
+            fakedb.BuildRequest(id=55, buildsetid=8822, builderid=123),
+        ])
+        claimMock = mock.Mock(return_value=defer.succeed([False, True]))
+        self.patch(self.master.db.buildrequests, 'claim_buildrequest_groups', claimMock)
+
+        res = yield self.rtype.claimBuildRequestGroups([[44], [55]], claimed_at=self.CLAIMED_AT)
+
+        self.assertEqual(res, [False, True])
+        claimMock.assert_called_with([[44], [55]], claimed_at=self.CLAIMED_AT)
+        # only the claimed request produces events
+        self.assertEqual(
+            sorted(routingKey for routingKey, _ in self.master.mq.productions),
+            sorted([
+                ('buildrequests', '55', 'claimed'),
+                ('builders', '123', 'buildrequests', '55', 'claimed'),
+                ('buildsets', '8822', 'builders', '123', 'buildrequests', '55', 'claimed'),
+            ]),
+        )
+
+    @defer.inlineCallbacks
+    def testClaimBuildRequestGroupsNoBrids(self):
+        claimMock = mock.Mock(return_value=defer.succeed([]))
+        self.patch(self.master.db.buildrequests, 'claim_buildrequest_groups', claimMock)
+
+        res = yield self.rtype.claimBuildRequestGroups([[], []])
+
+        self.assertEqual(res, [True, True])
+        claimMock.assert_not_called()
+        self.assertEqual(self.master.mq.productions, [])
+
     def testSignatureUnclaimBuildRequests(self):
         @self.assertArgSpecMatches(
             self.master.data.updates.unclaimBuildRequests,  # fake
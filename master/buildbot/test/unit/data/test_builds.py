@@ -418,6 +418,17 @@ class Build(interfaces.InterfaceTests, TestReactorMixin, unittest.TestCase):
                 (('builders', '10', 'builds', '43', 'new'), self.new_build_event),
                 (('builds', '100', 'new'), self.new_build_event),
                 (('workers', '20', 'builds', '100', 'new'), self.new_build_event),
+                (
+                    ('build_matrix', 'cells', '13', 'new'),
+                    {
+                        'buildrequestid': 13,
+                        'builderid': 10,
+                        'buildid': 100,
+                        'number': 43,
+                        'results': None,
+                        'complete': False,
+                    },
+                ),
             ],
         )
 
@@ -13,6 +13,8 @@
 #
 # Copyright Buildbot Team Members
 
+from unittest import mock
+
 from twisted.internet import defer
 from twisted.trial import unittest
 
@@ -325,6 +327,40 @@ class Buildset(TestReactorMixin, util_interfaces.InterfaceTests, unittest.TestCa
         }
         return self.do_test_addBuildset(kwargs, expectedReturn, expectedMessages, expectedBuildset)
 
+    @defer.inlineCallbacks
+    def test_addBuildset_many_builderNames(self):
+        builderids = list(range(1000, 1200))
+        yield self.master.db.insert_test_data([fakedb.Builder(id=i) for i in builderids])
+        data_get = mock.Mock(wraps=self.master.data.get)
+        self.patch(self.master.data, 'get', data_get)
+
+        bsid, brids = yield self.rtype.addBuildset(
+            scheduler='fakesched',
+            reason='because',
+            sourcestamps=[234],
+            builderids=builderids,
+            waited_for=True,
+        )
+
+        # the build requests are loaded at once, not one by one
+        self.assertEqual(
+            [c for c in data_get.call_args_list if c.args[0][0] == 'buildrequests'],
+            [mock.call(('buildrequests',), filters=mock.ANY)],
+        )
+        new_events = [
+            (routing_key, msg)
+            for routing_key, msg in self.master.mq.productions
+            if routing_key[:1] == ('buildrequests',)
+        ]
+        self.assertEqual(
+            new_events,
+            [
+                (('buildrequests', str(brids[builderid]), 'new'), mock.ANY)
+                for builderid in builderids
+            ],
+        )
+        self.assertEqual(new_events[0][1]['buildsetid'], bsid)
+
     def test_addBuildset_no_builderNames(self):
         kwargs = {
             "scheduler": 'fakesched',
@@ -0,0 +1,93 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+from unittest import mock
+
+from twisted.trial import unittest
+
+from buildbot.data import distributor_cycles
+from buildbot.process.buildrequestdistributor import DistributionCycle
+from buildbot.test.util import endpoint
+from buildbot.util.twisted import async_to_deferred
+
+
+def make_cycle(cycleid: int, started_at: int) -> DistributionCycle:
+    cycle = DistributionCycle(cycleid, started_at)
+    cycle.add_phase_time('fetch', 0.5)
+    cycle.set_queue_depth('bldr', 3)
+    cycle.add_decision('bldr', 'started', 2)
+    cycle.complete_at = started_at + 1
+    return cycle
+
+
+class DistributorCycleEndpoint(endpoint.EndpointMixin, unittest.TestCase):
+    endpointClass = distributor_cycles.DistributorCycleEndpoint
+    resourceTypeClass = distributor_cycles.DistributorCycle
+
+    @async_to_deferred
+    async def setUp(self) -> None:  # type: ignore[override]
+        await self.setUpEndpoint()
+        self.master.botmaster.brd = mock.Mock()
+        self.master.botmaster.brd.recent_cycles = [make_cycle(1, 1000), make_cycle(2, 2000)]
+
+    @async_to_deferred
+    async def test_get_existing(self) -> None:
+        cycle = await self.callGet(('distributor_cycles', 2))
+
+        self.validateData(cycle)
+        self.assertEqual(
+            cycle,
+            {
+                'cycleid': 2,
+                'started_at': 2000,
+                'complete_at': 2001,
+                'phases': {'sort': 0, 'fetch': 0.5, 'choose': 0, 'claim': 0, 'start': 0},
+                'builders': {'bldr': {'reason': 'started', 'builds': 2, 'queue_depth': 3}},
+            },
+        )
+
+    @async_to_deferred
+    async def test_get_missing(self) -> None:
+        cycle = await self.callGet(('distributor_cycles', 3))
+
+        self.assertIsNone(cycle)
+
+
+class DistributorCyclesEndpoint(endpoint.EndpointMixin, unittest.TestCase):
+    endpointClass = distributor_cycles.DistributorCyclesEndpoint
+    resourceTypeClass = distributor_cycles.DistributorCycle
+
+    @async_to_deferred
+    async def setUp(self) -> None:  # type: ignore[override]
+        await self.setUpEndpoint()
+
+    @async_to_deferred
+    async def test_get(self) -> None:
+        self.master.botmaster.brd = mock.Mock()
+        self.master.botmaster.brd.recent_cycles = [make_cycle(1, 1000), make_cycle(2, 2000)]
+
+        cycles = await self.callGet(('distributor_cycles',))
+
+        for cycle in cycles:
+            self.validateData(cycle)
+        self.assertEqual([c['cycleid'] for c in cycles], [1, 2])
+
+    @async_to_deferred
+    async def test_get_no_distributor(self) -> None:
+        cycles = await self.callGet(('distributor_cycles',))
+
+        self.assertEqual(cycles, [])
@@ -479,6 +479,50 @@ class Tests(TestReactorMixin, unittest.TestCase):
 
         self.assertEqual(results, [])
 
+    @defer.inlineCallbacks
+    def test_claim_buildrequest_groups(self):
+        self.reactor.advance(1300305712)
+        yield self.master.db.insert_test_data([
+            fakedb.BuildRequest(id=44, buildsetid=self.BSID, builderid=self.BLDRID1),
+            fakedb.BuildRequest(id=45, buildsetid=self.BSID, builderid=self.BLDRID1),
+            fakedb.BuildRequest(id=46, buildsetid=self.BSID, builderid=self.BLDRID2),
+        ])
+
+        claimed = yield self.db.buildrequests.claim_buildrequest_groups([[44, 45], [46]])
+
+        self.assertEqual(claimed, [True, True])
+        results = yield self.db.buildrequests.getBuildRequests()
+        self.assertEqual(
+            sorted((r.buildrequestid, r.claimed_at, r.claimed_by_masterid) for r in results),
+            [(brid, epoch2datetime(1300305712), self.MASTER_ID) for brid in (44, 45, 46)],
+        )
+
+    @defer.inlineCallbacks
+    def test_claim_buildrequest_groups_conflict(self):
+        self.reactor.advance(1300305712)
+        yield self.master.db.insert_test_data([
+            fakedb.BuildRequest(id=44, buildsetid=self.BSID, builderid=self.BLDRID1),
+            fakedb.BuildRequest(id=45, buildsetid=self.BSID, builderid=self.BLDRID1),
+            fakedb.BuildRequest(id=46, buildsetid=self.BSID, builderid=self.BLDRID2),
+            fakedb.BuildRequestClaim(brid=45, masterid=self.OTHER_MASTER_ID, claimed_at=1300103810),
+        ])
+
+        claimed = yield self.db.buildrequests.claim_buildrequest_groups(
+            [[44, 45], [46]], claimed_at=epoch2datetime(14000000)
+        )
+
+        # only the group with the conflict is not claimed
+        self.assertEqual(claimed, [False, True])
+        results = yield self.db.buildrequests.getBuildRequests()
+        self.assertEqual(
+            sorted((r.buildrequestid, r.claimed_at, r.claimed_by_masterid) for r in results),
+            [
+                (44, None, None),
+                (45, epoch2datetime(1300103810), self.OTHER_MASTER_ID),
+                (46, epoch2datetime(14000000), self.MASTER_ID),
+            ],
+        )
+
     @defer.inlineCallbacks
     def do_test_completeBuildRequests(
         self, rows, now, expected=None, expfailure=None, brids=None, complete_at=None
@@ -606,6 +650,20 @@ class Tests(TestReactorMixin, unittest.TestCase):
             expfailure=buildrequests.NotClaimedError,
         )
 
+    @defer.inlineCallbacks
+    def test_set_build_requests_priority(self):
+        yield self.master.db.insert_test_data([
+            fakedb.BuildRequest(id=44, buildsetid=self.BSID, builderid=self.BLDRID1),
+            fakedb.BuildRequest(id=45, buildsetid=self.BSID, builderid=self.BLDRID1, priority=3),
+        ])
+
+        yield self.master.db.buildrequests.set_build_requests_priority(brids=[44], priority=10)
+
+        results = yield self.master.db.buildrequests.getBuildRequests()
+        self.assertEqual(
+            sorted((r.buildrequestid, r.priority) for r in results), [(44, 10), (45, 3)]
+        )
+
     @defer.inlineCallbacks
     def do_test_unclaimMethod(self, method, expected):
         yield self.master.db.insert_test_data([
@@ -260,6 +260,71 @@ class Tests(TestReactorMixin, unittest.TestCase):
 
         return self.do_test_getBuildsForChange(rows, 14, expected)
 
+    @defer.inlineCallbacks
+    def test_get_builds_for_changes(self):
+        yield self.db.insert_test_data([
+            fakedb.Master(id=88, name="bar"),
+            fakedb.Worker(id=13, name='one'),
+            fakedb.Builder(id=77, name='A'),
+            fakedb.Builder(id=78, name='B'),
+            fakedb.SourceStamp(id=234, revision="aaa"),
+            fakedb.Change(changeid=14, sourcestampid=234),
+            fakedb.SourceStamp(id=235, revision="bbb"),
+            fakedb.Change(changeid=15, sourcestampid=235),
+            fakedb.Buildset(id=30),
+            fakedb.BuildsetSourceStamp(sourcestampid=234, buildsetid=30),
+            fakedb.BuildRequest(id=19, buildsetid=30, builderid=77),
+            fakedb.BuildRequest(id=20, buildsetid=30, builderid=78),
+            fakedb.Build(
+                id=50,
+                buildrequestid=19,
+                number=5,
+                masterid=88,
+                builderid=77,
+                workerid=13,
+                results=2,
+                complete_at=1304262223,
+            ),
+            fakedb.Build(
+                id=51, buildrequestid=19, number=6, masterid=88, builderid=77, workerid=13
+            ),
+        ])
+
+        rows = yield self.db.builds.get_builds_for_changes([14, 15])
+
+        self.assertEqual(
+            rows,
+            [
+                builds.ChangeBuildModel(
+                    changeid=14,
+                    buildrequestid=19,
+                    builderid=77,
+                    buildid=50,
+                    number=5,
+                    results=2,
+                    complete=True,
+                ),
+                builds.ChangeBuildModel(
+                    changeid=14,
+                    buildrequestid=19,
+                    builderid=77,
+                    buildid=51,
+                    number=6,
+                    results=None,
+                    complete=False,
+                ),
+                builds.ChangeBuildModel(
+                    changeid=14,
+                    buildrequestid=20,
+                    builderid=78,
+                    buildid=None,
+                    number=None,
+                    results=None,
+                    complete=False,
+                ),
+            ],
+        )
+
     @defer.inlineCallbacks
     def test_getBuilds_complete(self):
         yield self.db.insert_test_data(self.backgroundData + self.threeBuilds)
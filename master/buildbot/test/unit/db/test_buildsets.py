@@ -592,6 +592,25 @@ class Tests(TestReactorMixin, unittest.TestCase):
 
         yield self.db.pool.do(thd)
 
+    @defer.inlineCallbacks
+    def test_addBuildset_many_builders(self):
+        builderids = list(range(1, 201))
+        bsid, brids = yield self.db.buildsets.addBuildset(
+            sourcestamps=[234],
+            reason='because',
+            waited_for=False,
+            properties={},
+            builderids=builderids,
+        )
+
+        def thd(conn):
+            r = conn.execute(self.db.model.buildrequests.select())
+            return {row.builderid: (row.buildsetid, row.id) for row in r.fetchall()}
+
+        rows = yield self.db.pool.do(thd)
+        self.assertEqual(len(set(brids.values())), 200)
+        self.assertEqual(rows, {builderid: (bsid, brids[builderid]) for builderid in builderids})
+
     @defer.inlineCallbacks
     def test_addBuildset_properties_cache(self):
         """
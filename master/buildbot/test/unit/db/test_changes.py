@@ -282,6 +282,19 @@ class Tests(TestReactorMixin, unittest.TestCase):
         changeids = [c.changeid for c in changes]
         self.assertEqual(changeids, [10, 11, 12, 13, 14])
 
+    @defer.inlineCallbacks
+    def test_get_changes_without_details(self):
+        yield self.insert7Changes()
+        rs = resultspec.ResultSpec(order=['-changeid'], limit=3)
+        rs.fieldMapping = FixerMixin.fieldMapping
+        models = yield self.db.changes.get_changes_without_details(resultSpec=rs)
+
+        self.assertEqual([c.changeid for c in models], [14, 13, 12])
+        for change in models:
+            self.assertIsInstance(change, changes.ChangeModel)
+            self.assertEqual(change.files, [])
+            self.assertEqual(change.properties, {})
+
     @defer.inlineCallbacks
     def test_getChangesCount(self):
         yield self.insert7Changes()
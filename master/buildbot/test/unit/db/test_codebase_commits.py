@@ -15,6 +15,9 @@
 
 from __future__ import annotations
 
+from unittest import mock
+
+import sqlalchemy as sa
 from parameterized import parameterized
 from twisted.trial import unittest
 
@@ -33,13 +36,13 @@ class Tests(TestReactorMixin, unittest.TestCase):
         await self.master.db.insert_test_data([
             fakedb.Project(id=7, name='fake_project7'),
             fakedb.Codebase(id=13, projectid=7, name='codebase1'),
-            fakedb.CodebaseCommit(id=106, codebaseid=13),
-            fakedb.CodebaseCommit(id=107, codebaseid=13, parent_commitid=106),
-            fakedb.CodebaseCommit(id=108, codebaseid=13, parent_commitid=107),
-            fakedb.CodebaseCommit(id=109, codebaseid=13, parent_commitid=108),
-            fakedb.CodebaseCommit(id=110, codebaseid=13, parent_commitid=109),
-            fakedb.CodebaseCommit(id=119, codebaseid=13, parent_commitid=108),
-            fakedb.CodebaseCommit(id=120, codebaseid=13, parent_commitid=119),
+            fakedb.CodebaseCommit(id=106, codebaseid=13, generation=0),
+            fakedb.CodebaseCommit(id=107, codebaseid=13, parent_commitid=106, generation=1),
+            fakedb.CodebaseCommit(id=108, codebaseid=13, parent_commitid=107, generation=2),
+            fakedb.CodebaseCommit(id=109, codebaseid=13, parent_commitid=108, generation=3),
+            fakedb.CodebaseCommit(id=110, codebaseid=13, parent_commitid=109, generation=4),
+            fakedb.CodebaseCommit(id=119, codebaseid=13, parent_commitid=108, generation=3),
+            fakedb.CodebaseCommit(id=120, codebaseid=13, parent_commitid=119, generation=4),
         ])
 
     @async_to_deferred
@@ -82,6 +85,7 @@ class Tests(TestReactorMixin, unittest.TestCase):
         ('same_branch1', 106, 110, (106, [106], [106, 107, 108, 109, 110])),
         ('same_branch2', 110, 106, (106, [106, 107, 108, 109, 110], [106])),
         ('different_branches', 110, 120, (108, [108, 109, 110], [108, 119, 120])),
+        ('same_branch_not_root', 110, 108, (108, [108, 109, 110], [108])),
     ])
     @async_to_deferred
     async def test_get_first_common_commit_with_ranges_does_same_c(
@@ -90,6 +94,60 @@ class Tests(TestReactorMixin, unittest.TestCase):
         r = await self.master.db.codebase_commits.get_first_common_commit_with_ranges(id1, id2)
         self.assertEqual(r, expected)
 
+    @async_to_deferred
+    async def test_get_first_common_commit_with_ranges_depth(self) -> None:
+        r = await self.master.db.codebase_commits.get_first_common_commit_with_ranges(
+            110, 120, depth=2
+        )
+        self.assertEqual(r, (108, [108, 109, 110], [108, 119, 120]))
+
+        r = await self.master.db.codebase_commits.get_first_common_commit_with_ranges(
+            110, 120, depth=1
+        )
+        self.assertIsNone(r)
+
+    @async_to_deferred
+    async def test_get_first_common_commit_with_ranges_single_query(self) -> None:
+        db = self.master.db.codebase_commits
+        self.patch(db, '_get_commit_ancestors', mock.Mock(wraps=db._get_commit_ancestors))
+
+        r = await db.get_first_common_commit_with_ranges(110, 120)
+        self.assertEqual(r, (108, [108, 109, 110], [108, 119, 120]))
+        db._get_commit_ancestors.assert_called_once_with([110, 120], 100)
+
+        # the ancestors are now cached
+        r = await db.get_first_common_commit_with_ranges(120, 110)
+        self.assertEqual(r, (108, [108, 119, 120], [108, 109, 110]))
+        self.assertEqual(db._get_commit_ancestors.call_count, 1)
+
+    @async_to_deferred
+    async def test_get_commit_ancestors(self) -> None:
+        r = await self.master.db.codebase_commits._get_commit_ancestors([110, 120, 200], 2)
+        self.assertEqual(
+            sorted(r),
+            [(108, 107, 2), (109, 108, 3), (110, 109, 4), (119, 108, 3), (120, 119, 4)],
+        )
+
+    @async_to_deferred
+    async def test_get_commit_ancestors_pruned_by_generation(self) -> None:
+        # a common parent of 110 and 107 is at most 1 generation older than 110
+        r = await self.master.db.codebase_commits._get_commit_ancestors([110, 107], 1)
+        self.assertEqual(sorted(r), [(107, 106, 1), (109, 108, 3), (110, 109, 4)])
+
+    @async_to_deferred
+    async def test_get_first_common_commit_with_ranges_generation_too_far(self) -> None:
+        db = self.master.db.codebase_commits
+        self.patch(db, '_get_commit_ancestors', mock.Mock(wraps=db._get_commit_ancestors))
+        await db.get_commit_by_revision(codebaseid=13, revision='rev106')
+        await db.get_commit_by_revision(codebaseid=13, revision='rev110')
+
+        r = await db.get_first_common_commit_with_ranges(110, 106, depth=3)
+        self.assertIsNone(r)
+        db._get_commit_ancestors.assert_not_called()
+
+        r = await db.get_first_common_commit_with_ranges(110, 106, depth=4)
+        self.assertEqual(r, (106, [106, 107, 108, 109, 110], [106]))
+
     @async_to_deferred
     async def test_get_commits(self) -> None:
         commits = await self.master.db.codebase_commits.get_commits(codebaseid=13)
@@ -152,3 +210,140 @@ class Tests(TestReactorMixin, unittest.TestCase):
                 )
             ],
         )
+
+    @async_to_deferred
+    async def test_add_commit_generation(self) -> None:
+        db = self.master.db.codebase_commits
+        root_id = await db.add_commit(
+            codebaseid=13, author='a', comments='c', when_timestamp=1, revision='root'
+        )
+        child_id = await db.add_commit(
+            codebaseid=13,
+            author='a',
+            comments='c',
+            when_timestamp=2,
+            revision='child',
+            parent_commitid=120,
+        )
+
+        def thd(conn: sa.engine.Connection) -> list[tuple[int, int]]:
+            tbl = self.master.db.model.codebase_commits
+            q = sa.select(tbl.c.id, tbl.c.generation).where(tbl.c.id.in_([root_id, child_id]))
+            return sorted(tuple(row) for row in conn.execute(q))
+
+        self.assertEqual(await self.master.db.pool.do(thd), [(root_id, 0), (child_id, 5)])
+        # the new commits are cached
+        self.assertEqual(db._cache.get_generation(child_id), 5)
+        self.assertEqual(db._cache.get_parent(child_id), 120)
+        self.assertIsNone(db._cache.get_parent(root_id))
+
+    @async_to_deferred
+    async def test_add_commit_backfills_generation(self) -> None:
+        if self.master.db.pool.engine.dialect.name != 'sqlite':
+            raise unittest.SkipTest('the foreign keys are only unenforced with SQLite')
+        db = self.master.db.codebase_commits
+        # added before their parent, which will get the next id
+        await self.master.db.insert_test_data([
+            fakedb.CodebaseCommit(id=111, codebaseid=13, parent_commitid=121, generation=None),
+            fakedb.CodebaseCommit(id=112, codebaseid=13, parent_commitid=111, generation=None),
+            fakedb.CodebaseCommit(id=113, codebaseid=13, parent_commitid=111, generation=None),
+            fakedb.CodebaseCommit(id=114, codebaseid=13, parent_commitid=113, generation=None),
+        ])
+        db._cache.add_parent(114, 113)
+
+        parent_id = await db.add_commit(
+            codebaseid=13,
+            author='a',
+            comments='c',
+            when_timestamp=2,
+            revision='parent',
+            parent_commitid=120,
+        )
+        self.assertEqual(parent_id, 121)
+
+        def thd(conn: sa.engine.Connection) -> list[tuple[int, int]]:
+            tbl = self.master.db.model.codebase_commits
+            q = sa.select(tbl.c.id, tbl.c.generation).where(tbl.c.id.in_([111, 112, 113, 114]))
+            return sorted(tuple(row) for row in conn.execute(q))
+
+        self.assertEqual(
+            await self.master.db.pool.do(thd), [(111, 6), (112, 7), (113, 7), (114, 8)]
+        )
+        self.assertEqual(db._cache.get_generation(114), 8)
+
+
+class TestCodebaseCommitCache(unittest.TestCase):
+    def test_window_slides_to_newest(self) -> None:
+        cache = codebase_commits.CodebaseCommitCache(max_size=4)
+        cache.add_parents([(1, None, 0), (2, 1, 1), (3, 2, 2)])
+        self.assertIsNone(cache.get_parent(1))
+        self.assertEqual(cache.get_generation(3), 2)
+
+        cache.add_parents([(4, 3, 3), (5, 4, None)])
+
+        self.assertEqual(cache.get_parent(1), codebase_commits.UNKNOWN_COMMIT_ID)
+        self.assertIsNone(cache.get_generation(1))
+        self.assertEqual(cache.get_parent(5), 4)
+        self.assertIsNone(cache.get_generation(5))
+        self.assertEqual(cache.get_generation(4), 3)
+
+    def test_older_commits_cached_within_window(self) -> None:
+        cache = codebase_commits.CodebaseCommitCache(max_size=4)
+        cache.add_parent(10, 9)
+        cache.add_parent(8, 7)
+        self.assertEqual(cache.get_parent(8), 7)
+        self.assertEqual(cache.get_parent(9), codebase_commits.UNKNOWN_COMMIT_ID)
+
+        # would not fit in the window, cached apart
+        cache.add_parent(6, 5, 3)
+        self.assertEqual(cache.get_parent(6), 5)
+        self.assertEqual(cache.get_generation(6), 3)
+        self.assertEqual(cache.get_parent(10), 9)
+
+    def test_old_commits_evicted_least_recently_used(self) -> None:
+        cache = codebase_commits.CodebaseCommitCache(max_size=4, old_max_size=2)
+        cache.add_parent(100, 99)
+        cache.add_parents([(1, None, 0), (2, 1, 1)])
+        self.assertIsNone(cache.get_parent(1))
+
+        cache.add_parent(3, 2, 2)
+
+        self.assertEqual(cache.get_parent(2), codebase_commits.UNKNOWN_COMMIT_ID)
+        self.assertIsNone(cache.get_parent(1))
+        self.assertEqual(cache.get_generation(3), 2)
+        self.assertEqual(cache.get_parent(100), 99)
+
+    def test_far_newer_commit_resets_window(self) -> None:
+        cache = codebase_commits.CodebaseCommitCache(max_size=4)
+        cache.add_parent(1, None)
+        cache.add_parent(100, 99)
+        self.assertEqual(cache.get_parent(1), codebase_commits.UNKNOWN_COMMIT_ID)
+        self.assertEqual(cache.get_parent(100), 99)
+
+    @async_to_deferred
+    async def test_first_common_parent_fetches_missing_part(self) -> None:
+        cache = codebase_commits.CodebaseCommitCache()
+        cache.add_parents([(5, 4, None), (4, 3, None)])
+
+        graph = {5: 4, 4: 3, 3: 2, 2: 1, 1: None, 12: 2}
+        calls = []
+
+        async def get_ancestors(
+            ids: list[int], depth: int
+        ) -> list[tuple[int, int | None, int | None]]:
+            calls.append((ids, depth))
+            rv: list[tuple[int, int | None, int | None]] = []
+            for id in ids:
+                commit: int | None = id
+                for _ in range(depth + 1):
+                    if commit is None:
+                        break
+                    rv.append((commit, graph[commit], None))
+                    commit = graph[commit]
+            return rv
+
+        r = await cache.first_common_parent_with_ranges(5, 12, get_ancestors, depth=10)
+
+        self.assertEqual(r, (2, [2, 3, 4, 5], [2, 12]))
+        # the chain of 5 is only fetched from where the cache ends
+        self.assertEqual(calls, [([3, 12], 10)])
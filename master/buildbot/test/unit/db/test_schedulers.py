@@ -124,6 +124,20 @@ class Tests(TestReactorMixin, unittest.TestCase):
         res = yield self.db.schedulers.getChangeClassifications(24)
         self.assertEqual(res, {5: True})
 
+    @defer.inlineCallbacks
+    def test_flushChangeClassifications_changeids(self):
+        yield self.db.insert_test_data([
+            self.ss92,
+            self.change3,
+            self.change4,
+            self.change5,
+            self.scheduler24,
+        ])
+        yield self.addClassifications(24, (3, 1), (4, 0), (5, 1))
+        yield self.db.schedulers.flushChangeClassifications(24, changeids=[3, 5])
+        res = yield self.db.schedulers.getChangeClassifications(24)
+        self.assertEqual(res, {4: False})
+
     @defer.inlineCallbacks
     def test_getChangeClassifications(self):
         yield self.db.insert_test_data([
@@ -138,6 +152,21 @@ class Tests(TestReactorMixin, unittest.TestCase):
         res = yield self.db.schedulers.getChangeClassifications(24)
         self.assertEqual(res, {3: True, 4: False, 5: True, 6: True})
 
+    @defer.inlineCallbacks
+    def test_getChangeClassificationsForSchedulers(self):
+        yield self.db.insert_test_data([
+            self.ss92,
+            self.change3,
+            self.change4,
+            self.change5,
+            self.scheduler24,
+            self.scheduler25,
+        ])
+        yield self.addClassifications(24, (3, 1), (4, 0))
+        yield self.addClassifications(25, (5, 0))
+        res = yield self.db.schedulers.getChangeClassificationsForSchedulers([24, 25, 26])
+        self.assertEqual(res, {24: {3: True, 4: False}, 25: {5: False}, 26: {}})
+
     @defer.inlineCallbacks
     def test_getChangeClassifications_branch(self):
         yield self.db.insert_test_data([
@@ -124,6 +124,20 @@ class TestStateConnectorComponent(TestReactorMixin, unittest.TestCase):
             yield self.db.state.getState(10, 'x')
         self.flushLoggedErrors(TypeError)
 
+    @defer.inlineCallbacks
+    def test_getStates(self):
+        yield self.db.insert_test_data([
+            fakedb.Object(id=10, name='x', class_name='y'),
+            fakedb.Object(id=11, name='x', class_name='z'),
+            fakedb.Object(id=12, name='x', class_name='w'),
+            fakedb.ObjectState(objectid=10, name='x', value_json='[1,2]'),
+            fakedb.ObjectState(objectid=11, name='x', value_json='true'),
+            fakedb.ObjectState(objectid=12, name='other', value_json='1'),
+        ])
+        val = yield self.db.state.getStates([10, 11, 12, 13], 'x')
+
+        self.assertEqual(val, {10: [1, 2], 11: True})
+
     @defer.inlineCallbacks
     def test_setState(self):
         yield self.db.insert_test_data([
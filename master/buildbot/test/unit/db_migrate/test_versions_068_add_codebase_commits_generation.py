@@ -0,0 +1,87 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.test.util import migration
+from buildbot.util import sautils
+
+
+class Migration(migration.MigrateTestMixin, unittest.TestCase):
+    def setUp(self) -> defer.Deferred[None]:  # type: ignore[override]
+        return self.setUpMigrateTest()
+
+    def create_tables_thd(self, conn: sa.future.engine.Connection) -> None:
+        metadata = sa.MetaData()
+        metadata.bind = conn  # type: ignore[attr-defined]
+
+        # codebaseid foreign key is removed for the purposes of the test
+        codebase_commits = sautils.Table(
+            'codebase_commits',
+            metadata,
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('codebaseid', sa.Integer, nullable=False),
+            sa.Column('author', sa.String(255), nullable=False),
+            sa.Column('committer', sa.String(255), nullable=True),
+            sa.Column('comments', sa.Text, nullable=False),
+            sa.Column('when_timestamp', sa.Integer, nullable=False),
+            sa.Column('revision', sa.String(70), nullable=False),
+            sa.Column('parent_commitid', sa.Integer, nullable=True),
+        )
+        codebase_commits.create(bind=conn)
+
+        # 5 has a parent which does not exist anymore
+        parents = [(1, None), (3, 2), (2, 1), (4, 2), (5, 99), (6, 5)]
+        conn.execute(
+            codebase_commits.insert(),
+            [
+                {
+                    "id": id,
+                    "codebaseid": 13,
+                    "author": "author",
+                    "comments": "comments",
+                    "when_timestamp": 1234567,
+                    "revision": f"rev{id}",
+                    "parent_commitid": parent_commitid,
+                }
+                for id, parent_commitid in parents
+            ],
+        )
+        conn.commit()
+
+    def test_update(self) -> defer.Deferred[None]:
+        def setup_thd(conn: sa.future.engine.Connection) -> None:
+            self.create_tables_thd(conn)
+
+        def verify_thd(conn: sa.future.engine.Connection) -> None:
+            metadata = sa.MetaData()
+            metadata.bind = conn  # type: ignore[attr-defined]
+
+            codebase_commits = sautils.Table('codebase_commits', metadata, autoload_with=conn)
+            self.assertIsInstance(codebase_commits.c.generation.type, sa.Integer)
+
+            q = sa.select(codebase_commits.c.id, codebase_commits.c.generation).order_by(
+                codebase_commits.c.id
+            )
+            self.assertEqual(
+                [tuple(row) for row in conn.execute(q)],
+                [(1, 0), (2, 1), (3, 2), (4, 2), (5, None), (6, None)],
+            )
+
+        return self.do_test_migration('067', '068', setup_thd, verify_thd)
@@ -235,4 +235,12 @@ class TestBotMaster(TestReactorMixin, unittest.TestCase):
 
         self.botmaster.maybeStartBuildsForAllBuilders()
 
-        brd.maybeStartBuildsOn.assert_called_once_with(['frank', 'larry'])
+        brd.maybeStartBuildsOn.assert_called_once_with(['frank', 'larry'], skip_parked=False)
+
+    def test_maybeStartBuildsForAll_skip_blocked(self):
+        brd = self.botmaster.brd = mock.Mock()
+        self.botmaster.builderNames = ['frank', 'larry']
+
+        self.botmaster.maybeStartBuildsForAllBuilders(skip_blocked=True)
+
+        brd.maybeStartBuildsOn.assert_called_once_with(['frank', 'larry'], skip_parked=True)
@@ -21,6 +21,7 @@ from twisted.internet import defer
 from twisted.trial import unittest
 
 from buildbot import config
+from buildbot import locks
 from buildbot.config.master import MasterConfig
 from buildbot.process import builder
 from buildbot.process import factory
@@ -312,6 +313,52 @@ class TestBuilder(TestReactorMixin, BuilderMixin, unittest.TestCase):
         startable = yield self.bldr.canStartBuild(wfb, 100)
         self.assertEqual(startable, True)
 
+    @defer.inlineCallbacks
+    def test_can_acquire_locks_records_blocking_locks(self):
+        yield self.makeBuilder()
+        lockid = locks.MasterLock('lock')
+        access = lockid.access('exclusive')
+        blocking_lock = locks.BaseLock('blocking')
+        blocking_lock.claim(object(), access)
+        free_lock = locks.BaseLock('free')
+
+        self.assertFalse(
+            self.bldr._can_acquire_locks([(blocking_lock, access), (free_lock, access)])
+        )
+        self.assertEqual(self.bldr.blocking_locks, {blocking_lock: access})
+
+    @defer.inlineCallbacks
+    def test_can_acquire_locks_with_reservations(self):
+        yield self.makeBuilder()
+        exclusive = locks.MasterLock('exclusive').access('exclusive')
+        counting = locks.MasterLock('counting', maxCount=2).access('counting')
+        exclusive_lock = locks.BaseLock('exclusive')
+        counting_lock = locks.BaseLock('counting', maxCount=2)
+
+        self.bldr.lock_reservations = [(exclusive_lock, exclusive), (counting_lock, counting)]
+        self.assertFalse(self.bldr._can_acquire_locks([(exclusive_lock, exclusive)]))
+        self.assertTrue(self.bldr._can_acquire_locks([(counting_lock, counting)]))
+
+        self.bldr.lock_reservations.append((counting_lock, counting))
+        self.assertFalse(self.bldr._can_acquire_locks([(counting_lock, counting)]))
+        # the locks are free, so the builder is not blocked on them
+        self.assertEqual(self.bldr.blocking_locks, {})
+
+    @defer.inlineCallbacks
+    def test_canStartBuild_reserves_locks(self):
+        yield self.makeBuilder()
+        lock = locks.RealMasterLock('lock')
+        access = locks.MasterLock('lock').access('exclusive')
+        self.bldr.config.locks = [mock.Mock]
+        self.bldr.botmaster.getLockFromLockAccesses = mock.Mock(return_value=[(lock, access)])
+
+        wfb = mock.Mock()
+        wfb.worker = FakeWorker('worker')
+
+        self.assertTrue((yield self.bldr.canStartBuild(wfb, 100)))
+        self.assertEqual(self.bldr.lock_reservations, [(lock, access)])
+        self.assertFalse((yield self.bldr.canStartBuild(wfb, 101)))
+
     @defer.inlineCallbacks
     def test_canStartBuild_with_locks(self):
         yield self.makeBuilder()
@@ -629,6 +676,48 @@ class TestGetHighestPriority(TestReactorMixin, BuilderMixin, unittest.TestCase):
         self.assertEqual(priority, None)
 
 
+class TestRequestStats(TestReactorMixin, BuilderMixin, unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.setup_test_reactor()
+        yield self.setUpBuilderMixin()
+        self.master.botmaster.pending_requests.startService()
+        self.addCleanup(self.master.botmaster.pending_requests.stopService)
+
+        master_id = fakedb.FakeDBConnector.MASTER_ID
+        yield self.db.insert_test_data([
+            fakedb.Master(id=master_id),
+            fakedb.SourceStamp(id=21),
+            fakedb.Buildset(id=11, reason='because'),
+            fakedb.BuildsetSourceStamp(buildsetid=11, sourcestampid=21),
+            fakedb.Builder(id=77, name='bldr1'),
+            fakedb.BuildRequest(id=111, submitted_at=1000, builderid=77, buildsetid=11, priority=0),
+            fakedb.BuildRequest(id=222, submitted_at=2000, builderid=77, buildsetid=11, priority=5),
+            fakedb.BuildRequest(
+                id=333, submitted_at=500, complete=1, complete_at=1500, builderid=77, buildsetid=11
+            ),
+        ])
+
+    @defer.inlineCallbacks
+    def test_not_loaded(self):
+        yield self.makeBuilder(name='bldr1')
+        yield self.bldr.getBuilderId()
+        self.assertIsNone(self.bldr.oldest_request_time)
+        self.assertIsNone(self.bldr.newest_complete_time)
+        self.assertIsNone(self.bldr.highest_priority)
+
+    @defer.inlineCallbacks
+    def test_load_request_stats(self):
+        yield self.makeBuilder(name='bldr1')
+        yield self.bldr.load_request_stats()
+        self.assertEqual(self.bldr.oldest_request_time, epoch2datetime(1000))
+        self.assertEqual(self.bldr.newest_complete_time, epoch2datetime(1500))
+        self.assertEqual(self.bldr.highest_priority, 5)
+
+        newest = yield self.bldr.getNewestCompleteTime()
+        self.assertEqual(newest, epoch2datetime(1500))
+
+
 class TestReconfig(TestReactorMixin, BuilderMixin, unittest.TestCase):
     """Tests that a reconfig properly updates all attributes"""
 
@@ -21,6 +21,7 @@ from twisted.internet import defer
 from twisted.trial import unittest
 
 from buildbot.process import buildrequest
+from buildbot.process import buildrequestindex
 from buildbot.process.builder import Builder
 from buildbot.test import fakedb
 from buildbot.test.fake import fakemaster
@@ -33,7 +34,11 @@ class TestBuildRequestCollapser(TestReactorMixin, unittest.TestCase):
         self.setup_test_reactor()
         self.master = yield fakemaster.make_master(self, wantData=True, wantDb=True)
         self.master.botmaster = mock.Mock(name='botmaster')
+        self.master.botmaster.master = self.master
         self.master.botmaster.builders = {}
+        # not started, so that the requests are always loaded from the data API
+        self.master.botmaster.pending_requests = buildrequestindex.PendingBuildRequestIndex()
+        self.master.botmaster.pending_requests.parent = self.master.botmaster
         self.builders = {}
         self.bldr = yield self.createBuilder('A', builderid=77)
 
@@ -369,6 +374,38 @@ class TestBuildRequestCollapser(TestReactorMixin, unittest.TestCase):
         yield self.do_request_collapse([22], [])
         yield self.do_request_collapse([21], [20])
 
+    @defer.inlineCallbacks
+    def test_collapseRequests_collapse_default_with_a_patch_same_buildset(self):
+        rows = [
+            fakedb.Master(id=fakedb.FakeDBConnector.MASTER_ID),
+            fakedb.Patch(
+                id=123,
+                patch_base64='aGVsbG8sIHdvcmxk',
+                patch_author='bar',
+                patch_comment='foo',
+                subdir='/foo',
+                patchlevel=3,
+            ),
+            fakedb.SourceStamp(id=224, codebase='C', patchid=123),
+            fakedb.Builder(id=77, name='A'),
+        ]
+        rows += self.makeBuildRequestRows(19, 119, None, 224)
+        rows += self.makeBuildRequestRows(20, 120, None, 224)
+        rows.append(
+            fakedb.BuildRequest(
+                id=21,
+                buildsetid=119,
+                builderid=77,
+                priority=13,
+                submitted_at=1300305712,
+                results=-1,
+            )
+        )
+        self.bldr.getCollapseRequestsFn = lambda: Builder._defaultCollapseRequestFn
+        yield self.master.db.insert_test_data(rows)
+        # only the request of the same buildset, even though 20 has the same patch
+        yield self.do_request_collapse([21], [19])
+
     # * Either both source stamps are associated with changes..
     @defer.inlineCallbacks
     def test_collapseRequests_collapse_default_with_changes(self):
@@ -13,21 +13,29 @@
 #
 # Copyright Buildbot Team Members
 
+import os
 import random
+import time
 from unittest import mock
 
 from parameterized import parameterized
 from twisted.internet import defer
 from twisted.python import failure
+from twisted.python import log
 from twisted.trial import unittest
 
 from buildbot import config
-from buildbot.db import buildrequests
+from buildbot import locks
 from buildbot.process import buildrequestdistributor
+from buildbot.process import buildrequestindex
 from buildbot.process import factory
+from buildbot.process import metrics
+from buildbot.process.results import EXCEPTION
+from buildbot.process.results import SUCCESS
 from buildbot.test import fakedb
 from buildbot.test.fake import fakemaster
 from buildbot.test.reactor import TestReactorMixin
+from buildbot.test.util.config import ConfigErrorsMixin
 from buildbot.util import epoch2datetime
 from buildbot.util.eventual import fireEventually
 from buildbot.util.twisted import async_to_deferred
@@ -61,6 +69,8 @@ class TestBRDBase(TestReactorMixin, unittest.TestCase):
         )
         self.master.caches = fakemaster.FakeCaches()
         self.master.config.prioritizeBuilders = prioritizeBuilders
+        self.botmaster.pending_requests = buildrequestindex.PendingBuildRequestIndex()
+        yield self.botmaster.pending_requests.setServiceParent(self.master)
         self.brd = buildrequestdistributor.BuildRequestDistributor(self.botmaster)
         self.brd.parent = self.botmaster
         self.brd.startService()
@@ -120,10 +130,13 @@ class TestBRDBase(TestReactorMixin, unittest.TestCase):
 
         bldr.maybeStartBuild = maybeStartBuild
         bldr.getCollapseRequestsFn = lambda: False
+        bldr.blocking_locks = {}
+        bldr.lock_reservations = []
 
         bldr.workers = []
         bldr.getAvailableWorkers = lambda: [w for w in bldr.workers if w.isAvailable()]
-        bldr.getBuilderId = lambda: (builderid)
+        bldr.getBuilderId = lambda: defer.succeed(builderid)
+        bldr.load_request_stats = mock.Mock(side_effect=lambda: defer.succeed(None))
         if builder_config is None:
             bldr.config.nextWorker = None
             bldr.config.nextBuild = None
@@ -187,6 +200,18 @@ class Test(TestBRDBase):
         self.assertEqual(self.maybeStartBuildsOnBuilder_calls, ['bldr1'])
         self.checkAllCleanedUp()
 
+    @defer.inlineCallbacks
+    def test_maybeStartBuildsOn_held_builders(self):
+        self.useMock_maybeStartBuildsOnBuilder()
+        self.addBuilders(['bldr1', 'bldr2'])
+        self.brd._held_builders.add('bldr2')
+        yield self.brd.maybeStartBuildsOn(['bldr1'])
+
+        yield self.brd._waitForFinish()
+        self.assertEqual(self.maybeStartBuildsOnBuilder_calls, ['bldr1', 'bldr2'])
+        self.assertEqual(self.brd._held_builders, set())
+        self.checkAllCleanedUp()
+
     @defer.inlineCallbacks
     def test_maybeStartBuildsOn_parallel(self):
         # test 15 "parallel" invocations of maybeStartBuildsOn, with a
@@ -271,31 +296,27 @@ class Test(TestBRDBase):
         oldestRequestTimes,
         highestPriorities,
         expected,
-        returnDeferred=False,
     ):
         self.useMock_maybeStartBuildsOnBuilder()
         self.addBuilders(list(oldestRequestTimes))
         self.master.config.prioritizeBuilders = prioritizeBuilders
 
-        def mklambda(t):  # work around variable-binding issues
-            if returnDeferred:
-                return lambda: defer.succeed(t)
-            return lambda: t
-
         for n, t in oldestRequestTimes.items():
             if t is not None:
                 t = epoch2datetime(t)
-            self.builders[n].getOldestRequestTime = mklambda(t)
+            self.builders[n].oldest_request_time = t
 
         for n, t in highestPriorities.items():
-            self.builders[n].get_highest_priority = mklambda(t)
+            self.builders[n].highest_priority = t
 
         result = yield self.brd._sortBuilders(list(oldestRequestTimes))
 
         self.assertEqual(result, expected)
+        for n in oldestRequestTimes:
+            self.builders[n].load_request_stats.assert_called_once_with()
         self.checkAllCleanedUp()
 
-    def test_sortBuilders_default_sync(self):
+    def test_sortBuilders_default(self):
         return self.do_test_sortBuilders(
             None,  # use the default sort
             {"bldr1": 777, "bldr2": 999, "bldr3": 888},
@@ -303,15 +324,6 @@ class Test(TestBRDBase):
             ['bldr2', 'bldr1', 'bldr3'],
         )
 
-    def test_sortBuilders_default_asyn(self):
-        return self.do_test_sortBuilders(
-            None,  # use the default sort
-            {"bldr1": 777, "bldr2": 999, "bldr3": 888},
-            {"bldr1": 10, "bldr2": 15, "bldr3": 5},
-            ['bldr2', 'bldr1', 'bldr3'],
-            returnDeferred=True,
-        )
-
     def test_sortBuilders_default_None(self):
         return self.do_test_sortBuilders(
             None,  # use the default sort
@@ -328,6 +340,28 @@ class Test(TestBRDBase):
             ['bldr1', 'bldr3', 'bldr2'],
         )
 
+    @defer.inlineCallbacks
+    def test_sortBuilders_loads_request_stats_concurrently(self):
+        self.useMock_maybeStartBuildsOnBuilder()
+        self.addBuilders(['bldr1', 'bldr2', 'bldr3'])
+        loads = {}
+        for name, bldr in self.builders.items():
+            bldr.oldest_request_time = None
+            bldr.highest_priority = None
+            loads[name] = defer.Deferred()
+            bldr.load_request_stats = mock.Mock(return_value=loads[name])
+
+        d = self.brd._sortBuilders(['bldr1', 'bldr2', 'bldr3'])
+
+        # all the loads are started before any of them completes
+        for bldr in self.builders.values():
+            bldr.load_request_stats.assert_called_once_with()
+        for load in loads.values():
+            load.callback(None)
+        result = yield d
+        self.assertEqual(result, ['bldr1', 'bldr2', 'bldr3'])
+        self.checkAllCleanedUp()
+
     def test_sortBuilders_custom(self):
         def prioritizeBuilders(master, builders):
             self.assertIdentical(master, self.master)
@@ -400,6 +434,111 @@ class Test(TestBRDBase):
         self.assertEqual(self.maybeStartBuildsOnBuilder_calls, ['A', 'finished', '(stopped)'])
 
 
+class TestParallelDistribution(TestBRDBase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        yield super().setUp()
+        self.master.config.build_distribution_concurrency = 3
+        self.runs = {}
+
+        def maybeStartBuildsOnBuilder(bldr):
+            d = defer.Deferred()
+            self.runs[bldr.name] = d
+            return d
+
+        self.brd._maybeStartBuildsOnBuilder = maybeStartBuildsOnBuilder
+
+    @defer.inlineCallbacks
+    def addBuildersWithWorkers(self, builder_workers):
+        """C{builder_workers} maps builder name : list of worker names"""
+        self.startedBuilds = []
+        workers = {}
+        for name, workernames in builder_workers.items():
+            bldr = yield self.createBuilder(name)
+            for workername in workernames:
+                wfb = mock.Mock(spec=['isAvailable', 'worker'], name=workername)
+                wfb.worker = workers.setdefault(workername, mock.Mock(name=workername))
+                bldr.workers.append(wfb)
+
+    def finish(self, name):
+        self.runs.pop(name).callback(None)
+
+    @defer.inlineCallbacks
+    def test_independent_builders(self):
+        yield self.addBuildersWithWorkers({'A': ['w1'], 'B': ['w2'], 'C': ['w3']})
+        yield self.brd.maybeStartBuildsOn(['A', 'B', 'C'])
+
+        self.assertEqual(sorted(self.runs), ['A', 'B', 'C'])
+
+        for name in ['A', 'B', 'C']:
+            self.finish(name)
+        yield self.brd._waitForFinish()
+        self.assertFalse(self.brd.active)
+
+    @defer.inlineCallbacks
+    def test_concurrency_limit(self):
+        self.master.config.build_distribution_concurrency = 2
+        yield self.addBuildersWithWorkers({'A': ['w1'], 'B': ['w2'], 'C': ['w3']})
+        yield self.brd.maybeStartBuildsOn(['A', 'B', 'C'])
+
+        self.assertEqual(sorted(self.runs), ['A', 'B'])
+        self.finish('B')
+        self.assertEqual(sorted(self.runs), ['A', 'C'])
+
+        self.finish('A')
+        self.finish('C')
+        yield self.brd._waitForFinish()
+
+    @defer.inlineCallbacks
+    def test_shared_workers_serialized(self):
+        yield self.addBuildersWithWorkers({'A': ['w1', 'w2'], 'B': ['w2'], 'C': ['w2', 'w3']})
+        yield self.brd.maybeStartBuildsOn(['A', 'B', 'C'])
+
+        # B and C share a worker with A, and C may not overtake B
+        self.assertEqual(sorted(self.runs), ['A'])
+        self.finish('A')
+        self.assertEqual(sorted(self.runs), ['B'])
+        self.finish('B')
+        self.assertEqual(sorted(self.runs), ['C'])
+
+        self.finish('C')
+        yield self.brd._waitForFinish()
+
+    @defer.inlineCallbacks
+    def test_new_builder_while_running(self):
+        yield self.addBuildersWithWorkers({'A': ['w1'], 'B': ['w2']})
+        yield self.brd.maybeStartBuildsOn(['A'])
+        yield self.brd.maybeStartBuildsOn(['B', 'A'])
+
+        # B starts without waiting for A, which runs again once done
+        self.assertEqual(sorted(self.runs), ['A', 'B'])
+        self.finish('A')
+        self.assertEqual(sorted(self.runs), ['A', 'B'])
+
+        self.finish('A')
+        self.finish('B')
+        yield self.brd._waitForFinish()
+        self.assertEqual(self.runs, {})
+
+    @defer.inlineCallbacks
+    def test_stopService(self):
+        self.master.config.build_distribution_concurrency = 2
+        yield self.addBuildersWithWorkers({'A': ['w1'], 'B': ['w2'], 'C': ['w3']})
+        yield self.brd.maybeStartBuildsOn(['A', 'B', 'C'])
+
+        stop_d = self.brd.stopService()
+        self.assertNoResult(stop_d)
+
+        self.finish('A')
+        # C is not started, as the distributor is stopping
+        self.assertEqual(sorted(self.runs), ['B'])
+        self.assertNoResult(stop_d)
+
+        self.finish('B')
+        yield stop_d
+        yield self.brd._waitForFinish()
+
+
 class TestMaybeStartBuilds(TestBRDBase):
     @defer.inlineCallbacks
     def setUp(self):
@@ -509,6 +648,32 @@ class TestMaybeStartBuilds(TestBRDBase):
             rows=rows, exp_claims=[10], exp_builds=[('test-worker1', [10])]
         )
 
+    @defer.inlineCallbacks
+    def test_limited_by_lock_reservations(self):
+        # a lock with a single slot, reserved by the first chosen build until it is started
+        self.bldr.config.nextWorker = nth_worker(0)
+
+        def _canStartBuild(worker, breq):
+            if self.bldr.lock_reservations:
+                return False
+            self.bldr.lock_reservations.append(('lock', 'exclusive'))
+            return True
+
+        self.bldr.config.canStartBuild = _canStartBuild
+
+        self.addWorkers({'test-worker1': 1, 'test-worker2': 1})
+        rows = [
+            *self.base_rows,
+            fakedb.BuildRequest(id=10, buildsetid=11, builderid=77, submitted_at=130000),
+            fakedb.BuildRequest(id=11, buildsetid=11, builderid=77, submitted_at=135000),
+        ]
+        yield self.do_test_maybeStartBuildsOnBuilder(
+            rows=rows,
+            exp_claims=[10],
+            exp_builds=[('test-worker1', [10])],
+        )
+        self.assertEqual(self.bldr.lock_reservations, [])
+
     @defer.inlineCallbacks
     def test_limited_by_canStartBuild(self):
         """Set the 'canStartBuild' value in the config to something
@@ -731,20 +896,22 @@ class TestMaybeStartBuilds(TestBRDBase):
     def test_claim_race(self):
         self.bldr.config.nextWorker = nth_worker(0)
         # fake a race condition on the buildrequests table
-        old_claimBuildRequests = self.master.db.buildrequests.claimBuildRequests
+        old_claim_buildrequest_groups = self.master.db.buildrequests.claim_buildrequest_groups
 
-        def claimBuildRequests(brids, claimed_at=None):
+        @defer.inlineCallbacks
+        def claim_buildrequest_groups(groups, claimed_at=None):
             # first, ensure this only happens the first time
-            self.master.db.buildrequests.claimBuildRequests = old_claimBuildRequests
+            self.master.db.buildrequests.claim_buildrequest_groups = old_claim_buildrequest_groups
             # claim brid 10 for some other master
-            assert 10 in brids
-            self.master.db.buildrequests._claim_buildrequests_for_master(
+            assert [10] in groups
+            yield self.master.db.buildrequests._claim_buildrequests_for_master(
                 [10], 136000, 9999
             )  # some other masterid
-            # ..and fail
-            return defer.fail(buildrequests.AlreadyClaimedError())
+            # ..and only the other groups get claimed
+            res = yield old_claim_buildrequest_groups(groups, claimed_at=claimed_at)
+            return res
 
-        self.master.db.buildrequests.claimBuildRequests = claimBuildRequests
+        self.master.db.buildrequests.claim_buildrequest_groups = claim_buildrequest_groups
 
         self.addWorkers({'test-worker1': 1, 'test-worker2': 1})
         rows = [
@@ -755,8 +922,9 @@ class TestMaybeStartBuilds(TestBRDBase):
             ),  # will turn out to be claimed!
             fakedb.BuildRequest(id=11, buildsetid=11, builderid=77, submitted_at=135000),
         ]
+        # the claim of #11 is not affected by the conflict on #10
         yield self.do_test_maybeStartBuildsOnBuilder(
-            rows=rows, exp_claims=[11], exp_builds=[('test-worker1', [11])]
+            rows=rows, exp_claims=[11], exp_builds=[('test-worker2', [11])]
         )
 
     # nextWorker
@@ -887,6 +1055,218 @@ class TestMaybeStartBuilds(TestBRDBase):
         "default chooses the first in the list, which should be the earliest"
         return self.do_test_nextBuild(None, exp_choice=[10, 11, 12, 13])
 
+    @defer.inlineCallbacks
+    def test_parked_on_blocking_lock(self):
+        self.addWorkers({'test-worker1': 1})
+        access = locks.MasterLock('lock').access('exclusive')
+        lock = locks.BaseLock('lock')
+        owner = object()
+        lock.claim(owner, access)
+
+        def canStartBuild(worker, breq):
+            if not lock.isAvailable(None, access):
+                self.bldr.blocking_locks[lock] = access
+                return False
+            return True
+
+        self.bldr.canStartBuild = canStartBuild
+        time_events = []
+        self.patch(
+            metrics.MetricTimeEvent,
+            'log',
+            lambda timer, elapsed: time_events.append((timer, elapsed)),
+        )
+        rows = [
+            *self.base_rows,
+            fakedb.BuildRequest(id=10, buildsetid=11, builderid=77),
+        ]
+
+        yield self.do_test_maybeStartBuildsOnBuilder(rows=rows, exp_claims=[], exp_builds=[])
+        self.assertEqual(self.brd._parked_builders, {'A': {lock: self.reactor.seconds()}})
+
+        # parked builders are skipped unless they are targeted
+        self.brd._maybeStartBuildsOnBuilder = mock.Mock(
+            side_effect=self.brd._maybeStartBuildsOnBuilder
+        )
+        yield self.brd.maybeStartBuildsOn(['A'], skip_parked=True)
+        yield self.brd._waitForFinish()
+        self.assertFalse(self.brd._maybeStartBuildsOnBuilder.called)
+
+        self.reactor.advance(10)
+        lock.release(owner, access)
+        yield self.brd._waitForFinish()
+
+        self.assertEqual(
+            [(timer, elapsed) for timer, elapsed in time_events if 'blocked_on_lock' in timer],
+            [('BuildRequestDistributor.blocked_on_lock.lock', 10)],
+        )
+        self.assertMyClaims([10])
+        self.assertBuildsStarted([('test-worker1', [10])])
+        self.assertEqual(self.brd._parked_builders, {})
+        self.assertEqual(self.brd._lock_waiters, {})
+        self.assertEqual(lock.release_subs.subscriptions, set())
+
+    @defer.inlineCallbacks
+    def test_not_parked_if_lock_released_meanwhile(self):
+        self.addWorkers({'test-worker1': 1})
+        access = locks.MasterLock('lock').access('exclusive')
+        lock = locks.BaseLock('lock')
+
+        def canStartBuild(worker, breq):
+            # the lock was busy while checking, and then released
+            self.bldr.blocking_locks[lock] = access
+            return False
+
+        self.bldr.canStartBuild = canStartBuild
+        rows = [
+            *self.base_rows,
+            fakedb.BuildRequest(id=10, buildsetid=11, builderid=77),
+        ]
+
+        yield self.do_test_maybeStartBuildsOnBuilder(rows=rows, exp_claims=[], exp_builds=[])
+        self.assertEqual(self.brd._parked_builders, {})
+        self.assertEqual(self.brd._lock_waiters, {})
+
+    @defer.inlineCallbacks
+    def test_distribution_cycle_profile(self):
+        self.addWorkers({'test-worker1': 1})
+        self.master.config.metrics = {'distributor_cycles': 5}
+        self.botmaster.pending_requests.startService()
+        self.addCleanup(self.botmaster.pending_requests.stopService)
+        time_events = []
+        count_events = []
+        self.patch(
+            metrics.MetricTimeEvent,
+            'log',
+            lambda timer, elapsed: time_events.append(timer),
+        )
+        self.patch(
+            metrics.MetricCountEvent,
+            'log',
+            lambda counter, count, absolute=False: count_events.append((counter, count)),
+        )
+        yield self.master.db.insert_test_data([
+            *self.base_rows,
+            fakedb.BuildRequest(id=10, buildsetid=11, builderid=77),
+            fakedb.BuildRequest(id=11, buildsetid=11, builderid=77),
+        ])
+
+        yield self.brd.maybeStartBuildsOn(['A'])
+        yield self.brd._waitForFinish()
+
+        self.assertBuildsStarted([('test-worker1', [10])])
+        self.assertEqual(len(self.brd.recent_cycles), 1)
+        cycle = self.brd.recent_cycles[0]
+        # the worker was offered again, but was not available anymore
+        self.assertEqual(
+            cycle.builders, {'A': {'reason': 'no_available_worker', 'builds': 1, 'queue_depth': 2}}
+        )
+        self.assertEqual(
+            sorted(cycle.phases), sorted(buildrequestdistributor.DistributionCycle.PHASES)
+        )
+        for phase in cycle.phases:
+            self.assertIn(f'BuildRequestDistributor.cycle.{phase}', time_events)
+        self.assertIn(('BuildRequestDistributor.decisions.no_available_worker', 1), count_events)
+        self.assertIn(('BuildRequestDistributor.queue_depth', 2), count_events)
+
+        # a new cycle, with no requests left that could be started
+        self.bldr.workers[0].isAvailable.return_value = True
+        yield self.brd.maybeStartBuildsOn(['A'])
+        yield self.brd._waitForFinish()
+
+        self.assertEqual([c.cycleid for c in self.brd.recent_cycles], [1, 2])
+
+    @defer.inlineCallbacks
+    def test_distribution_cycle_idle_reasons(self):
+        self.botmaster.pending_requests.startService()
+        self.addCleanup(self.botmaster.pending_requests.stopService)
+        self.master.config.metrics = {'distributor_cycles': 1}
+
+        yield self.do_test_maybeStartBuildsOnBuilder(rows=self.base_rows)
+        self.brd._finishCycle()
+        self.assertEqual(self.brd.recent_cycles[0].builders['A']['reason'], 'no_requests')
+
+        # inserted without the new event
+        self.botmaster.pending_requests.invalidate(77)
+        yield self.do_test_maybeStartBuildsOnBuilder(
+            rows=[fakedb.BuildRequest(id=10, buildsetid=11, builderid=77)]
+        )
+        self.brd._finishCycle()
+        self.assertEqual(len(self.brd.recent_cycles), 1)
+        self.assertEqual(
+            self.brd.recent_cycles[0].builders['A'],
+            {'reason': 'no_available_worker', 'builds': 0, 'queue_depth': 1},
+        )
+
+    @async_to_deferred
+    async def test_priority_change_applied_on_next_cycle(self) -> None:
+        self.botmaster.pending_requests.startService()
+        self.addCleanup(self.botmaster.pending_requests.stopService)
+        self.master.mq.verifyMessages = False
+        self.addWorkers({'test-worker1': 0})
+        await self.do_test_maybeStartBuildsOnBuilder(
+            rows=[
+                *self.base_rows,
+                fakedb.BuildRequest(id=10, buildsetid=11, builderid=77, submitted_at=130000),
+                fakedb.BuildRequest(id=11, buildsetid=11, builderid=77, submitted_at=135000),
+            ]
+        )
+
+        await self.master.data.control('set_priority', {'priority': 10}, ('buildrequests', 11))
+        for routing_key, msg in self.master.mq.productions:
+            if routing_key[0] == 'buildrequests' and routing_key[-1] == 'priority_changed':
+                self.master.mq.callConsumer(routing_key, msg)
+
+        self.bldr.workers[0].isAvailable.return_value = True
+        await self.brd._maybeStartBuildsOnBuilder(self.bldr)
+        self.assertBuildsStarted([('test-worker1', [11])])
+
+    @defer.inlineCallbacks
+    def test_limited_by_prioritizer_quota(self):
+        self.master.config.prioritizeBuilders = buildrequestdistributor.FairShareBuilderPrioritizer(
+            quotas={'proj': 2}
+        )
+        self.bldr.config.project = 'proj'
+        self.bldr.building = []
+        # the running builds are counted on the builders of the botmaster
+        self.master.botmaster = self.botmaster
+        maybeStartBuild = self.bldr.maybeStartBuild
+
+        def maybeStartBuildAndRun(worker, builds):
+            self.bldr.building.append(mock.Mock(finished=False))
+            return maybeStartBuild(worker, builds)
+
+        self.bldr.maybeStartBuild = maybeStartBuildAndRun
+        self.bldr.config.nextWorker = nth_worker(-1)
+        rows = self.make_workers(4)
+
+        yield self.do_test_maybeStartBuildsOnBuilder(
+            rows=rows,
+            exp_claims=[10, 11],
+            exp_builds=[('test-worker3', [10]), ('test-worker2', [11])],
+        )
+        self.assertEqual(self.brd._held_builders, {'A'})
+
+    @defer.inlineCallbacks
+    def test_nextBuild_default_priority(self):
+        "default chooses the highest priority, then the earliest"
+        self.bldr.config.nextWorker = nth_worker(-1)
+        rows = self.make_workers(4)
+        for row in rows:
+            if isinstance(row, fakedb.BuildRequest):
+                row.priority = {10: 0, 11: 5, 12: 0, 13: 5}[row.id]
+
+        yield self.do_test_maybeStartBuildsOnBuilder(
+            rows=rows,
+            exp_claims=[10, 11, 12, 13],
+            exp_builds=[
+                ('test-worker3', [11]),
+                ('test-worker2', [13]),
+                ('test-worker1', [10]),
+                ('test-worker0', [12]),
+            ],
+        )
+
     def test_nextBuild_simple(self):
         def nextBuild(bldr, lst):
             self.assertIdentical(bldr, self.bldr)
@@ -916,3 +1296,317 @@ class TestMaybeStartBuilds(TestBRDBase):
         result = self.do_test_nextBuild(nextBuild)
         self.assertEqual(1, len(self.flushLoggedErrors(RuntimeError)))
         return result
+
+
+class TestBuildRequestClaimer(TestReactorMixin, unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.setup_test_reactor()
+        self.master = yield fakemaster.make_master(self, wantData=True, wantDb=True)
+        self.claimer = buildrequestdistributor.BuildRequestClaimer(self.master)
+
+        self.calls = []
+
+        def claimBuildRequestGroups(groups, claimed_at=None):
+            d = defer.Deferred()
+            self.calls.append((groups, d))
+            return d
+
+        self.master.data.updates.claimBuildRequestGroups = claimBuildRequestGroups
+
+    def test_claims_merged_while_running(self):
+        d1 = self.claimer.claim([[1], [2]])
+        d2 = self.claimer.claim([[3]])
+        d3 = self.claimer.claim([[4, 5]])
+
+        # the first claim is sent immediately, the others wait for it
+        self.assertEqual([groups for groups, _ in self.calls], [[[1], [2]]])
+        self.calls[0][1].callback([True, False])
+        self.assertEqual(self.successResultOf(d1), [True, False])
+
+        # ..and are then sent together
+        self.assertEqual([groups for groups, _ in self.calls[1:]], [[[3], [4, 5]]])
+        self.calls[1][1].callback([False, True])
+        self.assertEqual(self.successResultOf(d2), [False])
+        self.assertEqual(self.successResultOf(d3), [True])
+
+    def test_claim_failure(self):
+        d1 = self.claimer.claim([[1]])
+        d2 = self.claimer.claim([[2]])
+        self.calls[0][1].errback(RuntimeError('oh noes'))
+        self.failureResultOf(d1, RuntimeError)
+
+        # the claimer is still usable
+        self.calls[1][1].callback([True])
+        self.assertEqual(self.successResultOf(d2), [True])
+
+
+class TestFairShareBuilderPrioritizer(ConfigErrorsMixin, TestReactorMixin, unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.setup_test_reactor()
+        self.master = yield fakemaster.make_master(self)
+        self.master.botmaster = mock.Mock(name='botmaster')
+        self.master.botmaster.builders = {}
+
+    def make_builder(self, name, project, priority=0, submitted_at=0, running=0):
+        bldr = mock.Mock(name=name)
+        bldr.name = name
+        bldr.config.project = project
+        bldr.building = [mock.Mock(finished=False) for _ in range(running)]
+        bldr.highest_priority = priority
+        bldr.oldest_request_time = None if priority is None else epoch2datetime(submitted_at)
+        self.master.botmaster.builders[name] = bldr
+        return bldr
+
+    @defer.inlineCallbacks
+    def assert_order(self, prioritizer, exp):
+        builders = list(self.master.botmaster.builders.values())
+        sorted_builders = yield prioritizer(self.master, builders)
+        self.assertEqual([b.name for b in sorted_builders], exp)
+
+    @defer.inlineCallbacks
+    def test_fair_share(self):
+        self.make_builder('a1', 'a', running=2)
+        self.make_builder('a2', 'a', priority=10)
+        self.make_builder('b1', 'b')
+        self.make_builder('b2', 'b', submitted_at=10)
+        self.make_builder('idle', 'b', priority=None)
+
+        # a has 2 running builds: b gets the next two workers, even if a has higher priorities
+        yield self.assert_order(
+            buildrequestdistributor.FairShareBuilderPrioritizer(),
+            ['b1', 'b2', 'a2', 'a1', 'idle'],
+        )
+
+    @defer.inlineCallbacks
+    def test_weights(self):
+        self.make_builder('a1', 'a', running=2, priority=10)
+        self.make_builder('a2', 'a', priority=10)
+        self.make_builder('b1', 'b', running=1)
+
+        yield self.assert_order(
+            buildrequestdistributor.FairShareBuilderPrioritizer(), ['b1', 'a1', 'a2']
+        )
+        yield self.assert_order(
+            buildrequestdistributor.FairShareBuilderPrioritizer(weights={'a': 4}),
+            ['a1', 'a2', 'b1'],
+        )
+
+    @defer.inlineCallbacks
+    def test_aging(self):
+        self.reactor.advance(1000)
+        self.make_builder('new', 'a', priority=5, submitted_at=900)
+        self.make_builder('old', 'a', priority=0, submitted_at=0)
+
+        yield self.assert_order(
+            buildrequestdistributor.FairShareBuilderPrioritizer(), ['new', 'old']
+        )
+        yield self.assert_order(
+            buildrequestdistributor.FairShareBuilderPrioritizer(aging=100), ['old', 'new']
+        )
+
+    @defer.inlineCallbacks
+    def test_quotas(self):
+        self.make_builder('a1', 'a', running=1)
+        a2 = self.make_builder('a2', 'a')
+        a2.building[:0] = [mock.Mock(finished=True)]
+        b1 = self.make_builder('b1', 'b', running=2, submitted_at=10)
+        prioritizer = buildrequestdistributor.FairShareBuilderPrioritizer(quotas={'a': 1, 'b': 3})
+
+        yield self.assert_order(prioritizer, ['b1', 'a1', 'a2'])
+        self.assertEqual(prioritizer.get_build_limit(self.master, a2), 0)
+        self.assertEqual(prioritizer.get_build_limit(self.master, b1), 1)
+        self.assertIsNone(
+            buildrequestdistributor.FairShareBuilderPrioritizer().get_build_limit(self.master, b1)
+        )
+
+    @defer.inlineCallbacks
+    def test_running_builds_counted_once_per_cycle(self):
+        builders = [self.make_builder(f'a{i}', 'a', running=1) for i in range(10)]
+        prioritizer = buildrequestdistributor.FairShareBuilderPrioritizer(quotas={'a': 12})
+        self.patch(
+            prioritizer,
+            '_get_running_builds',
+            mock.Mock(wraps=prioritizer._get_running_builds),
+        )
+
+        prioritizer.start_cycle(self.master)
+        yield prioritizer(self.master, builders)
+        for bldr in builders:
+            self.assertEqual(prioritizer.get_build_limit(self.master, bldr), 2)
+        self.assertEqual(prioritizer._get_running_builds.call_count, 1)
+
+        prioritizer.builds_started(builders[0], 2)
+        self.assertEqual(prioritizer.get_build_limit(self.master, builders[1]), 0)
+
+        # counted again at the next cycle
+        prioritizer.start_cycle(self.master)
+        self.assertEqual(prioritizer.get_build_limit(self.master, builders[1]), 2)
+        self.assertEqual(prioritizer._get_running_builds.call_count, 2)
+
+    def test_invalid_weight(self):
+        with self.assertRaisesConfigError("weight of project 'a' must be a positive number"):
+            buildrequestdistributor.FairShareBuilderPrioritizer(weights={'a': 0})
+
+    def test_invalid_quota(self):
+        with self.assertRaisesConfigError("quota of project 'a' must be a non-negative integer"):
+            buildrequestdistributor.FairShareBuilderPrioritizer(quotas={'a': 1.5})
+
+    def test_invalid_aging(self):
+        with self.assertRaisesConfigError("aging must be a positive number of seconds"):
+            buildrequestdistributor.FairShareBuilderPrioritizer(aging=-1)
+
+
+class TestPredictiveWorkerSelector(ConfigErrorsMixin, TestReactorMixin, unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.setup_test_reactor()
+        self.reactor.advance(100000)
+        self.master = yield fakemaster.make_master(self, wantData=True, wantDb=True)
+        self.bldr = mock.Mock(name='bldr')
+        self.bldr.master = self.master
+        self.bldr.getBuilderId = lambda: defer.succeed(77)
+        self.workers = {}
+        rows = [
+            fakedb.Master(id=fakedb.FakeDBConnector.MASTER_ID),
+            fakedb.Builder(id=77, name='A'),
+            fakedb.Buildset(id=11),
+            fakedb.BuildRequest(id=111, buildsetid=11, builderid=77),
+        ]
+        for workerid in (1, 2, 3):
+            rows.append(fakedb.Worker(id=workerid, name=f'worker{workerid}'))
+            wfb = mock.Mock(name=f'worker{workerid}')
+            wfb.worker.workerid = workerid
+            self.workers[workerid] = wfb
+        yield self.master.db.insert_test_data(rows)
+        self.buildid = 1000
+
+    @defer.inlineCallbacks
+    def add_build(self, workerid, started_at, duration, results=SUCCESS):
+        self.buildid += 1
+        yield self.master.db.insert_test_data([
+            fakedb.Build(
+                id=self.buildid,
+                buildrequestid=111,
+                builderid=77,
+                workerid=workerid,
+                masterid=fakedb.FakeDBConnector.MASTER_ID,
+                started_at=started_at,
+                complete_at=started_at + duration,
+                results=results,
+            ),
+        ])
+
+    @defer.inlineCallbacks
+    def select(self, selector, workerids=(1, 2, 3)):
+        wfb = yield selector(self.bldr, [self.workers[w] for w in workerids], None)
+        return wfb.worker.workerid
+
+    @defer.inlineCallbacks
+    def test_no_history_random(self):
+        self.patch(random, 'choice', nth_worker(1))
+        self.workers[2].name = 'b'
+        self.workers[1].name = 'a'
+        self.workers[3].name = 'c'
+        workerid = yield self.select(buildrequestdistributor.PredictiveWorkerSelector())
+        self.assertEqual(workerid, 2)
+
+    @defer.inlineCallbacks
+    def test_prefers_fastest_warm_worker(self):
+        yield self.add_build(1, 90000, 600)
+        yield self.add_build(2, 91000, 300)
+        yield self.add_build(2, 92000, 500, results=EXCEPTION)
+
+        workerid = yield self.select(buildrequestdistributor.PredictiveWorkerSelector())
+        self.assertEqual(workerid, 2)
+
+    @defer.inlineCallbacks
+    def test_warm_worker_before_cold_one(self):
+        yield self.add_build(1, 90000, 600)
+        yield self.add_build(2, 91000, 300)
+
+        # worker 1 is slower than the mean, but faster than a full build on a cold worker
+        workerid = yield self.select(
+            buildrequestdistributor.PredictiveWorkerSelector(cold_penalty=2), workerids=(1, 3)
+        )
+        self.assertEqual(workerid, 1)
+
+    @defer.inlineCallbacks
+    def test_warm_period(self):
+        yield self.add_build(1, 1000, 300)
+        yield self.add_build(2, 91000, 600)
+
+        # worker 1 built long ago, so it is cold like worker 3
+        workerid = yield self.select(
+            buildrequestdistributor.PredictiveWorkerSelector(warm_period=10000)
+        )
+        self.assertEqual(workerid, 2)
+
+    @defer.inlineCallbacks
+    def test_history_cached(self):
+        selector = buildrequestdistributor.PredictiveWorkerSelector(cache_ttl=60)
+        yield self.add_build(1, 90000, 600)
+        workerid = yield self.select(selector, workerids=(1, 2))
+        self.assertEqual(workerid, 1)
+
+        yield self.add_build(2, 91000, 60)
+        workerid = yield self.select(selector, workerids=(1, 2))
+        self.assertEqual(workerid, 1)
+
+        self.reactor.advance(60)
+        workerid = yield self.select(selector, workerids=(1, 2))
+        self.assertEqual(workerid, 2)
+
+    def test_invalid_history(self):
+        with self.assertRaisesConfigError("history must be a positive integer"):
+            buildrequestdistributor.PredictiveWorkerSelector(history=0)
+
+    def test_invalid_cold_penalty(self):
+        with self.assertRaisesConfigError("cold_penalty must be at least 1"):
+            buildrequestdistributor.PredictiveWorkerSelector(cold_penalty=0.5)
+
+
+class BasicBuildChooserBenchmark(TestBRDBase):
+    # number of queued build requests, and of builds to pick from them
+    QUEUED_REQUESTS = 10000
+    BUILDS = 100
+
+    # this takes a few seconds; run it only when benchmarking
+    if 'BUILDBOT_BENCHMARK' not in os.environ:
+        skip = 'set BUILDBOT_BENCHMARK to run the benchmarks'
+
+    @defer.inlineCallbacks
+    def setUp(self):
+        yield super().setUp()
+        self.bldr = yield self.createBuilder('A', builderid=77)
+        self.addWorkers({f'test-worker{i}': 1 for i in range(self.BUILDS)})
+        yield self.master.db.insert_test_data([
+            *self.base_rows,
+            *[
+                fakedb.BuildRequest(
+                    id=1000 + i, buildsetid=11, builderid=77, priority=i % 10, submitted_at=i
+                )
+                for i in range(self.QUEUED_REQUESTS)
+            ],
+        ])
+
+    @defer.inlineCallbacks
+    def test_popNextBuild(self):
+        bc = buildrequestdistributor.BasicBuildChooser(self.bldr, self.master)
+        bc.pending_requests = self.botmaster.pending_requests
+        yield bc._fetchUnclaimedBrdicts()
+
+        start = time.perf_counter()
+        brids = []
+        for _ in range(self.BUILDS):
+            worker, breq = yield bc.popNextBuild()
+            worker.isAvailable.return_value = False
+            brids.append(breq.id)
+        elapsed = time.perf_counter() - start
+
+        log.msg(
+            f"popNextBuild: {self.BUILDS} builds from {self.QUEUED_REQUESTS} requests "
+            f"in {elapsed:.3f}s"
+        )
+        self.assertEqual(brids, [1009 + 10 * i for i in range(self.BUILDS)])
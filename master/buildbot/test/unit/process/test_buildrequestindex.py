@@ -0,0 +1,284 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+from typing import Any
+from unittest import mock
+
+from twisted.trial import unittest
+
+from buildbot.process import buildrequestindex
+from buildbot.test import fakedb
+from buildbot.test.fake import fakemaster
+from buildbot.test.reactor import TestReactorMixin
+from buildbot.util import epoch2datetime
+from buildbot.util.twisted import async_to_deferred
+
+
+def brdict(brid: int, priority: int = 0, submitted_at: int = 1000) -> dict[str, Any]:
+    return {
+        'buildrequestid': brid,
+        'priority': priority,
+        'submitted_at': epoch2datetime(submitted_at),
+    }
+
+
+class TestBuilderRequestQueue(unittest.TestCase):
+    def test_empty(self) -> None:
+        queue = buildrequestindex.BuilderRequestQueue()
+        self.assertEqual(len(queue), 0)
+        self.assertIsNone(queue.get_highest_priority())
+        self.assertIsNone(queue.get_oldest_request_time())
+        self.assertEqual(queue.get_ordered(), [])
+
+    def test_ordering(self) -> None:
+        queue = buildrequestindex.BuilderRequestQueue()
+        queue.add(brdict(1, priority=0, submitted_at=1000))
+        queue.add(brdict(2, priority=5, submitted_at=3000))
+        queue.add(brdict(3, priority=5, submitted_at=2000))
+
+        self.assertEqual(len(queue), 3)
+        self.assertEqual(queue.get_highest_priority(), 5)
+        self.assertEqual(queue.get_oldest_request_time(), epoch2datetime(1000))
+        self.assertEqual([br['buildrequestid'] for br in queue.get_ordered()], [3, 2, 1])
+
+    def test_remove(self) -> None:
+        queue = buildrequestindex.BuilderRequestQueue()
+        queue.add(brdict(1, priority=0, submitted_at=1000))
+        queue.add(brdict(2, priority=5, submitted_at=3000))
+
+        queue.remove(2)
+        queue.remove(42)
+
+        self.assertEqual(queue.get_highest_priority(), 0)
+        self.assertEqual([br['buildrequestid'] for br in queue.get_ordered()], [1])
+
+    def test_add_twice_replaces(self) -> None:
+        queue = buildrequestindex.BuilderRequestQueue()
+        queue.add(brdict(1, priority=0))
+        queue.add(brdict(1, priority=3))
+
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue.get_highest_priority(), 3)
+
+    def test_collapse_keys(self) -> None:
+        queue = buildrequestindex.BuilderRequestQueue()
+        queue.add(brdict(1))
+        queue.add(brdict(2))
+        queue.add(brdict(3))
+        self.assertEqual(sorted(br['buildrequestid'] for br in queue.get_unkeyed()), [1, 2, 3])
+
+        queue.set_collapse_key(1, 'a')
+        queue.set_collapse_key(2, 'a')
+        queue.set_collapse_key(3, None)
+        # removed in the meantime
+        queue.set_collapse_key(4, 'a')
+
+        self.assertEqual(queue.get_unkeyed(), [])
+        self.assertEqual(queue.get_collapsible('a'), {1, 2})
+        self.assertEqual(queue.get_collapsible('b'), set())
+
+        queue.remove(1)
+        queue.remove(2)
+        self.assertEqual(queue.get_collapsible('a'), set())
+
+
+class TestPendingBuildRequestIndex(TestReactorMixin, unittest.TestCase):
+    @async_to_deferred
+    async def setUp(self) -> None:  # type: ignore[override]
+        self.setup_test_reactor()
+        self.master = await fakemaster.make_master(self, wantMq=True, wantData=True, wantDb=True)
+        self.master.mq.verifyMessages = False
+        self.index = buildrequestindex.PendingBuildRequestIndex()
+        await self.index.setServiceParent(self.master)
+        await self.master.startService()
+        self.addCleanup(self.master.stopService)
+        await self.master.db.insert_test_data([
+            fakedb.Master(id=fakedb.FakeDBConnector.MASTER_ID),
+            fakedb.Builder(id=77, name='bldr1'),
+            fakedb.SourceStamp(id=21),
+            fakedb.Buildset(id=11, reason='because'),
+            fakedb.BuildsetSourceStamp(buildsetid=11, sourcestampid=21),
+            fakedb.BuildRequest(id=111, submitted_at=1000, builderid=77, buildsetid=11),
+            fakedb.BuildRequest(
+                id=222, submitted_at=2000, priority=10, builderid=77, buildsetid=11
+            ),
+            fakedb.BuildRequest(id=333, submitted_at=3000, builderid=77, buildsetid=11),
+            fakedb.BuildRequestClaim(
+                brid=333, masterid=fakedb.FakeDBConnector.MASTER_ID, claimed_at=3001
+            ),
+        ])
+
+    @async_to_deferred
+    async def send_event(self, brid: int, event: str, **changes: Any) -> None:
+        msg = await self.master.data.get(('buildrequests', brid))
+        msg.update(changes)
+        self.master.mq.callConsumer(('buildrequests', str(brid), event), msg)
+
+    @async_to_deferred
+    async def test_get_queue_loads_unclaimed(self) -> None:
+        queue = await self.index.get_queue(77)
+
+        self.assertEqual(sorted(queue.requests), [111, 222])
+        self.assertEqual(queue.get_highest_priority(), 10)
+        self.assertEqual(queue.get_oldest_request_time(), epoch2datetime(1000))
+
+    @async_to_deferred
+    async def test_get_queue_cached(self) -> None:
+        queue = await self.index.get_queue(77)
+        await self.master.db.insert_test_data([
+            fakedb.BuildRequest(id=444, submitted_at=4000, builderid=77, buildsetid=11),
+        ])
+
+        queue2 = await self.index.get_queue(77)
+
+        self.assertIdentical(queue, queue2)
+        self.assertNotIn(444, queue2.requests)
+
+    @async_to_deferred
+    async def test_get_queue_coalesced(self) -> None:
+        d1 = self.index.get_queue(77)
+        d2 = self.index.get_queue(77)
+        queue1 = await d1
+        queue2 = await d2
+        self.assertIdentical(queue1, queue2)
+
+    @async_to_deferred
+    async def test_events(self) -> None:
+        queue = await self.index.get_queue(77)
+
+        await self.send_event(111, 'claimed', claimed=True)
+        self.assertEqual(sorted(queue.requests), [222])
+
+        await self.send_event(
+            333, 'unclaimed', claimed=False, claimed_at=None, claimed_by_masterid=None
+        )
+        self.assertEqual(sorted(queue.requests), [222, 333])
+
+        await self.send_event(222, 'complete', complete=True)
+        self.assertEqual(sorted(queue.requests), [333])
+
+    @async_to_deferred
+    async def test_priority_changed_event(self) -> None:
+        queue = await self.index.get_queue(77)
+        self.assertEqual([br['buildrequestid'] for br in queue.get_ordered()], [222, 111])
+
+        await self.send_event(111, 'priority_changed', priority=20)
+        self.assertEqual([br['buildrequestid'] for br in queue.get_ordered()], [111, 222])
+        self.assertEqual(queue.get_highest_priority(), 20)
+
+        # claimed in the meantime
+        await self.send_event(222, 'priority_changed', priority=30, claimed=True)
+        self.assertEqual(sorted(queue.requests), [111])
+
+    @async_to_deferred
+    async def test_events_for_unknown_builder_ignored(self) -> None:
+        await self.send_event(111, 'claimed', claimed=True)
+        queue = await self.index.get_queue(77)
+        # loaded from the database, where 111 is not claimed
+        self.assertEqual(sorted(queue.requests), [111, 222])
+
+    @async_to_deferred
+    async def test_invalidate(self) -> None:
+        queue = await self.index.get_queue(77)
+        self.index.invalidate(77)
+        await self.master.db.insert_test_data([
+            fakedb.BuildRequest(id=444, submitted_at=4000, builderid=77, buildsetid=11),
+        ])
+
+        queue2 = await self.index.get_queue(77)
+
+        self.assertNotIdentical(queue, queue2)
+        self.assertEqual(sorted(queue2.requests), [111, 222, 444])
+
+    @async_to_deferred
+    async def test_reconcile_periodically(self) -> None:
+        queue = await self.index.get_queue(77)
+        assert self.index.reconcile_interval is not None
+        self.reactor.advance(self.index.reconcile_interval)
+
+        queue2 = self.index.peek_queue(77)
+        self.assertIsNotNone(queue2)
+        self.assertNotIdentical(queue, queue2)
+
+    @async_to_deferred
+    async def test_reconcile_unknown_builder_not_loaded(self) -> None:
+        await self.index.reconcile()
+        self.assertIsNone(self.index.peek_queue(77))
+
+    @mock.patch('buildbot.process.metrics.MetricCountEvent.log')
+    @async_to_deferred
+    async def test_reconcile_counts_divergences(self, count_log: mock.Mock) -> None:
+        queue = await self.index.get_queue(77)
+        # changed without an event
+        await self.master.db.insert_test_data([
+            fakedb.BuildRequest(id=444, submitted_at=4000, builderid=77, buildsetid=11),
+            fakedb.BuildRequestClaim(
+                brid=111, masterid=fakedb.FakeDBConnector.MASTER_ID, claimed_at=3001
+            ),
+        ])
+
+        await self.index.reconcile()
+
+        queue2 = await self.index.get_queue(77)
+        self.assertNotIdentical(queue, queue2)
+        self.assertEqual(sorted(queue2.requests), [222, 444])
+        count_log.assert_any_call('PendingBuildRequestIndex.reconciliations')
+        count_log.assert_any_call('PendingBuildRequestIndex.divergences', 2)
+
+    @async_to_deferred
+    async def test_get_collapse_key_cached(self) -> None:
+        key = await self.index.get_collapse_key(11)
+        self.assertIsNotNone(key)
+
+        self.index.collapse_key_cache_size = 1
+        await self.master.db.insert_test_data([
+            fakedb.Buildset(id=12, reason='because'),
+            fakedb.BuildsetSourceStamp(buildsetid=12, sourcestampid=21),
+        ])
+        key2 = await self.index.get_collapse_key(12)
+
+        # same sourcestamps and properties
+        self.assertEqual(key, key2)
+        self.assertEqual(list(self.index._collapse_keys), [12])
+
+    @async_to_deferred
+    async def test_newest_complete_time(self) -> None:
+        self.assertIsNone(self.index.peek_newest_complete_time(77))
+        await self.master.db.insert_test_data([
+            fakedb.BuildRequest(
+                id=444, submitted_at=4000, complete=1, complete_at=4500, builderid=77, buildsetid=11
+            ),
+        ])
+
+        newest = await self.index.get_newest_complete_time(77)
+        self.assertEqual(newest, epoch2datetime(4500))
+        self.assertEqual(self.index.peek_newest_complete_time(77), epoch2datetime(4500))
+
+        # updated from the complete events, without going back to the database
+        await self.send_event(222, 'complete', complete=True, complete_at=epoch2datetime(5000))
+        self.assertEqual(self.index.peek_newest_complete_time(77), epoch2datetime(5000))
+        await self.send_event(111, 'complete', complete=True, complete_at=epoch2datetime(4800))
+        newest = await self.index.get_newest_complete_time(77)
+        self.assertEqual(newest, epoch2datetime(5000))
+
+    @async_to_deferred
+    async def test_newest_complete_time_none(self) -> None:
+        newest = await self.index.get_newest_complete_time(77)
+        self.assertIsNone(newest)
+
+        await self.send_event(111, 'complete', complete=True, complete_at=epoch2datetime(4800))
+        self.assertEqual(self.index.peek_newest_complete_time(77), epoch2datetime(4800))
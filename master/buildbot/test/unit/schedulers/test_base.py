@@ -24,6 +24,7 @@ from buildbot.changes import filter
 from buildbot.process import properties
 from buildbot.process.properties import Interpolate
 from buildbot.schedulers import base
+from buildbot.schedulers import manager
 from buildbot.test import fakedb
 from buildbot.test.reactor import TestReactorMixin
 from buildbot.test.util import scheduler
@@ -310,6 +311,70 @@ class TestReconfigurableBaseScheduler(
             {"fileIsImportant": lambda c: True, "onlyImportant": True}, True
         )
 
+    @defer.inlineCallbacks
+    def test_change_consumption_through_scheduler_manager(self):
+        sched = yield self.makeScheduler()
+        sm = manager.SchedulerManager()
+        sm.parent = self.master
+        sched.parent = sm
+        sched.startService()
+        self.addCleanup(sched.stopService)
+
+        got_changes = []
+
+        def gotChange(change, important):
+            got_changes.append((change, important))
+            return defer.succeed(None)
+
+        sched.gotChange = gotChange
+
+        yield sched.startConsumingChanges(fileIsImportant=lambda c: False)
+
+        # only the enable events are consumed from the message queue
+        self.assertEqual(len(self.mq.qrefs), 1)
+        self.assertEqual(len(sm._change_subscriptions), 1)
+
+        change = self.makeFakeChange()
+        subscription = next(iter(sm._change_subscriptions))
+        yield subscription.callback(change)
+        self.assertEqual(got_changes, [(change, False)])
+
+        yield sched._stopConsumingChanges()
+        self.assertEqual(sm._change_subscriptions, {})
+
+    @defer.inlineCallbacks
+    def test_change_consumption_important_files_through_scheduler_manager(self):
+        sched = yield self.makeScheduler()
+        sm = manager.SchedulerManager()
+        sm.parent = self.master
+        sched.parent = sm
+        sched.startService()
+        self.addCleanup(sched.stopService)
+
+        got_changes = []
+
+        def gotChange(change, important):
+            got_changes.append((change, important))
+            return defer.succeed(None)
+
+        sched.gotChange = gotChange
+
+        important_files = filter.ImportantFiles(include='src/')
+        yield sched.startConsumingChanges(fileIsImportant=important_files, onlyImportant=True)
+
+        subscription = next(iter(sm._change_subscriptions))
+        self.assertIdentical(subscription.important_files, important_files)
+        self.assertEqual(len(sm._important_files_index), 1)
+
+        # the importance is given by the scheduler manager
+        change = self.makeFakeChange()
+        yield subscription.callback(change, False)
+        yield subscription.callback(change, True)
+        self.assertEqual(got_changes, [(change, True)])
+
+        yield sched._stopConsumingChanges()
+        self.assertEqual(len(sm._important_files_index), 0)
+
     @defer.inlineCallbacks
     def test_activation(self):
         sched = yield self.makeScheduler(name='n', builderNames=['a'])
@@ -24,6 +24,8 @@ from buildbot.test import fakedb
 from buildbot.test.reactor import TestReactorMixin
 from buildbot.test.util import scheduler
 from buildbot.test.util.state import StateTestMixin
+from buildbot.test.util.warnings import assertProducesWarnings
+from buildbot.warnings import DeprecatedApiWarning
 
 
 class CommonStuffMixin:
@@ -91,11 +93,6 @@ class BaseBasicScheduler(
             self.timer_started = True
             return "xxx"
 
-        def getChangeClassificationsForTimer(self, sched_id, timer_name):
-            assert timer_name == "xxx"
-            assert sched_id == BaseBasicScheduler.SCHEDULERID
-            return self.master.db.schedulers.getChangeClassifications(sched_id)
-
     @defer.inlineCallbacks
     def setUp(self):
         self.setup_test_reactor()
@@ -167,6 +164,23 @@ class BaseBasicScheduler(
         self.assertTrue(sched.timer_started)
         self.reactor.advance(10)
 
+    @defer.inlineCallbacks
+    def test_activate_treeStableTimer_missing_change(self):
+        yield self.makeScheduler(self.Subclass, treeStableTimer=10)
+
+        yield self.master.db.insert_test_data([
+            fakedb.SourceStamp(id=92),
+            fakedb.Change(changeid=20),
+        ])
+        yield self.db.schedulers.classifyChanges(self.SCHEDULERID, {20: True, 21: True})
+
+        yield self.master.startService()
+
+        # the classification of the missing change would never be flushed
+        yield self.assert_classifications(self.SCHEDULERID, {20: True})
+        self.reactor.advance(10)
+        self.assertEqual(self.events, ['B[20]@10'])
+
     @defer.inlineCallbacks
     def test_gotChange_no_treeStableTimer_unimportant(self):
         sched = yield self.makeScheduler(self.Subclass, treeStableTimer=None, branch='master')
@@ -230,6 +244,7 @@ class BaseBasicScheduler(
         # until 2229
         yield sched.gotChange(self.makeFakeChange(branch='master', number=1, when=2220), True)
         self.assertEqual(self.events, [])
+        yield sched.writeChangeClassifications()
         yield self.assert_classifications(self.SCHEDULERID, {1: True})
 
         # but another (unimportant) change arrives before then
@@ -238,6 +253,7 @@ class BaseBasicScheduler(
 
         yield sched.gotChange(self.makeFakeChange(branch='master', number=2, when=2226), False)
         self.assertEqual(self.events, [])
+        yield sched.writeChangeClassifications()
         yield self.assert_classifications(self.SCHEDULERID, {1: True, 2: False})
 
         self.reactor.advance(3)  # to 2229
@@ -249,6 +265,7 @@ class BaseBasicScheduler(
         # another important change arrives at 2232
         yield sched.gotChange(self.makeFakeChange(branch='master', number=3, when=2232), True)
         self.assertEqual(self.events, [])
+        yield sched.writeChangeClassifications()
         yield self.assert_classifications(self.SCHEDULERID, {1: True, 2: False, 3: True})
 
         self.reactor.advance(3)  # to 2235
@@ -259,6 +276,99 @@ class BaseBasicScheduler(
         self.assertEqual(self.events, ['B[1,2,3]@2241'])
         yield self.assert_classifications(self.SCHEDULERID, {})
 
+    @defer.inlineCallbacks
+    def test_gotChange_treeStableTimer_batched_classifications(self):
+        sched = yield self.makeScheduler(self.Subclass, treeStableTimer=60, branch='master')
+        yield self.master.startService()
+        classify_calls = []
+        classify_changes = self.db.schedulers.classifyChanges
+
+        def classifyChanges(schedulerid, classifications):
+            classify_calls.append(dict(classifications))
+            return classify_changes(schedulerid, classifications)
+
+        self.patch(self.db.schedulers, 'classifyChanges', classifyChanges)
+
+        for number in range(1, 101):
+            yield sched.gotChange(self.makeFakeChange(branch='master', number=number), True)
+        self.assertEqual(classify_calls, [])
+        yield self.assert_classifications(self.SCHEDULERID, {})
+
+        # all the classifications are written at once, after a bounded delay
+        self.reactor.advance(sched.classificationsWriteDelay)
+        self.assertEqual(classify_calls, [{number: True for number in range(1, 101)}])
+        yield self.assert_classifications(
+            self.SCHEDULERID, {number: True for number in range(1, 101)}
+        )
+
+        # the build uses the classifications in memory, and flushes them from the database
+        get_classifications = mock.Mock(wraps=self.db.schedulers.getChangeClassifications)
+        self.patch(self.db.schedulers, 'getChangeClassifications', get_classifications)
+        self.reactor.advance(60)
+        self.assertEqual(self.events, [f'B[{",".join(str(n) for n in range(1, 101))}]@65'])
+        self.assertFalse(get_classifications.called)
+        yield self.assert_classifications(self.SCHEDULERID, {})
+
+    @defer.inlineCallbacks
+    def test_gotChange_treeStableTimer_no_write_delay(self):
+        sched = yield self.makeScheduler(
+            self.Subclass, treeStableTimer=60, branch='master', classificationsWriteDelay=0
+        )
+        yield self.master.startService()
+
+        yield sched.gotChange(self.makeFakeChange(branch='master', number=1), True)
+
+        yield self.assert_classifications(self.SCHEDULERID, {1: True})
+        self.assertEqual(len(self.reactor.getDelayedCalls()), 1)  # the tree stable timer
+
+    def test_constructor_invalid_classificationsWriteDelay(self):
+        with self.assertRaises(config.ConfigErrors):
+            self.Subclass(name='tsched', builderNames=['tbuild'], classificationsWriteDelay=-1)
+
+    @defer.inlineCallbacks
+    def test_getChangeClassificationsForTimer_overridden(self):
+        class Subclass(self.Subclass):
+            def getChangeClassificationsForTimer(self, sched_id, timer_name):
+                return self.master.db.schedulers.getChangeClassifications(sched_id)
+
+        with assertProducesWarnings(
+            DeprecatedApiWarning, message_pattern='.*getChangeClassificationsForTimer.*'
+        ):
+            sched = yield self.makeScheduler(Subclass, treeStableTimer=60, branch='master')
+        yield self.master.startService()
+        yield self.db.schedulers.classifyChanges(self.SCHEDULERID, {1: True})
+
+        # the classifications only in memory are written for the overridden method to see them
+        yield sched.gotChange(self.makeFakeChange(branch='master', number=2), True)
+        self.reactor.advance(60)
+
+        self.assertEqual(self.events, ['B[1,2]@60'])
+        yield self.assert_classifications(self.SCHEDULERID, {})
+
+    @defer.inlineCallbacks
+    def test_gotChange_treeStableTimer_fired_before_write(self):
+        sched = yield self.makeScheduler(self.Subclass, treeStableTimer=2, branch='master')
+        yield self.master.startService()
+
+        yield sched.gotChange(self.makeFakeChange(branch='master', number=1), True)
+        self.reactor.advance(2)
+        self.assertEqual(self.events, ['B[1]@2'])
+
+        # the classification of a change that was built is never written
+        self.reactor.advance(sched.classificationsWriteDelay)
+        yield self.assert_classifications(self.SCHEDULERID, {})
+
+    @defer.inlineCallbacks
+    def test_deactivate_writes_classifications(self):
+        sched = yield self.makeScheduler(self.Subclass, treeStableTimer=60, branch='master')
+        yield self.master.startService()
+
+        yield sched.gotChange(self.makeFakeChange(branch='master', number=1), True)
+        yield sched.deactivate()
+
+        yield self.assert_classifications(self.SCHEDULERID, {1: True})
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
+
     @defer.inlineCallbacks
     def test_enabled_callback(self):
         sched = yield self.makeScheduler(self.Subclass)
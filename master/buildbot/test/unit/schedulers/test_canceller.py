@@ -13,6 +13,8 @@
 #
 # Copyright Buildbot Team Members
 
+from unittest import mock
+
 from parameterized import parameterized
 from twisted.internet import defer
 from twisted.trial import unittest
@@ -46,6 +48,29 @@ class TestFilterSet(unittest.TestCase):
 
         self.assertEqual(filter.is_matched(builder, props), expected)
 
+    def test_shared_filters_evaluated_once(self):
+        ss_filter = SourceStampFilter(branch_eq='br1')
+        self.patch(ss_filter, 'is_matched', mock.Mock(wraps=ss_filter.is_matched))
+        filter = _OldBuildFilterSet()
+        filter.add_filter([f'builder{i}' for i in range(100)], ss_filter)
+        filter.add_filter(['builder0'], SourceStampFilter(branch_eq='br1'))
+
+        props = {'project': 'p', 'codebase': '', 'repository': 'r', 'branch': 'br1'}
+        for i in range(100):
+            self.assertTrue(filter.is_matched(f'builder{i}', dict(props)))
+        self.assertFalse(filter.is_matched('builder1', dict(props, branch='br2')))
+
+        self.assertEqual(ss_filter.is_matched.call_count, 2)
+
+    def test_filter_fn_not_cached(self):
+        filter_fn = mock.Mock(side_effect=lambda ss: ss['revision'] == 'abc')
+        filter = _OldBuildFilterSet()
+        filter.add_filter(['builder1'], SourceStampFilter(filter_fn=filter_fn))
+
+        props = {'project': 'p', 'codebase': '', 'repository': 'r', 'branch': 'br1'}
+        self.assertTrue(filter.is_matched('builder1', dict(props, revision='abc')))
+        self.assertFalse(filter.is_matched('builder1', dict(props, revision='def')))
+
 
 class TestOldBuildrequestTracker(TestReactorMixin, unittest.TestCase):
     def setUp(self):
@@ -337,6 +362,74 @@ class TestOldBuildrequestTracker(TestReactorMixin, unittest.TestCase):
         self.tracker.on_complete_buildrequest(4)
 
 
+class TestOldBuildrequestTrackerStress(TestReactorMixin, unittest.TestCase):
+    BUILDERS = 300
+    BRANCHES = 50
+
+    def setUp(self):
+        self.setup_test_reactor()
+        self.builders = [f'bldr{i}' for i in range(self.BUILDERS)]
+        self.ss_filter = SourceStampFilter(branch_re='refs/pull/')
+        filter = _OldBuildFilterSet()
+        filter.add_filter(self.builders, self.ss_filter)
+        self.cancellations = []
+        self.tracker = _OldBuildrequestTracker(
+            self.reactor, filter, lambda ss: ss['branch'], self.cancellations.append
+        )
+        self.next_brid = 1
+
+    def ss_dict(self, branch):
+        return {
+            'project': 'pr',
+            'codebase': 'cb',
+            'repository': 'rp',
+            'branch': f'refs/pull/{branch}',
+        }
+
+    def add_buildset(self, branch, builders=None):
+        brids = []
+        for builder in builders or self.builders:
+            self.tracker.on_new_buildrequest(self.next_brid, builder, [self.ss_dict(branch)])
+            brids.append(self.next_brid)
+            self.next_brid += 1
+        return brids
+
+    def test_busy_pull_requests(self):
+        self.patch(self.ss_filter, 'is_matched', mock.Mock(wraps=self.ss_filter.is_matched))
+
+        first_brids = {branch: self.add_buildset(branch) for branch in range(self.BRANCHES)}
+        self.assertEqual(len(self.tracker.br_by_id), self.BUILDERS * self.BRANCHES)
+        # the filter is evaluated once per source stamp, not once per build request
+        self.assertEqual(self.ss_filter.is_matched.call_count, self.BRANCHES)
+
+        self.reactor.advance(1)
+
+        # a new commit built on a single builder only cancels the request of that builder
+        self.tracker.on_change(self.ss_dict(7))
+        self.add_buildset(7, builders=['bldr42'])
+        self.assertEqual(self.cancellations, [first_brids[7][42]])
+        del self.cancellations[:]
+
+        self.reactor.advance(1)
+
+        # a new commit built on all builders cancels all the requests of that branch only
+        self.tracker.on_change(self.ss_dict(3))
+        self.add_buildset(3)
+        self.assertEqual(self.cancellations, first_brids[3])
+        del self.cancellations[:]
+
+        self.reactor.advance(1)
+
+        # the requests started after the last commit are not cancelled
+        self.add_buildset(3, builders=['bldr0'])
+        self.assertEqual(self.cancellations, [])
+
+        for brid in range(1, self.next_brid):
+            self.tracker.on_complete_buildrequest(brid)
+        self.assertEqual(self.tracker.br_by_id, {})
+        self.assertEqual(self.tracker.br_by_builder_ss, {})
+
+
 class TestOldBuildCancellerUtils(ConfigErrorsMixin, unittest.TestCase):
     @parameterized.expand([
         ('only_builder', [(['bldr'], SourceStampFilter())]),
@@ -20,9 +20,15 @@ from unittest import mock
 from twisted.internet import defer
 from twisted.trial import unittest
 
+from buildbot.changes.filter import ChangeFilter
+from buildbot.changes.filter import ImportantFiles
 from buildbot.db.schedulers import SchedulerModel
+from buildbot.process import metrics
 from buildbot.schedulers import base
 from buildbot.schedulers import manager
+from buildbot.test import fakedb
+from buildbot.test.fake import fakemaster
+from buildbot.test.reactor import TestReactorMixin
 from buildbot.test.util.warnings import assertProducesWarnings
 from buildbot.warnings import DeprecatedApiWarning
 
@@ -214,3 +220,229 @@ class SchedulerManager(unittest.TestCase):
         self.assertEqual(sch1_new.running, False)
         self.assertIdentical(sch1_new.master, None)
         self.assertEqual(sch1.running, True)
+
+
+class ChangeDispatch(TestReactorMixin, unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.setup_test_reactor()
+        self.master = yield fakemaster.make_master(self, wantMq=True, wantDb=True, wantData=True)
+        self.master.mq.verifyMessages = False
+        self.sm = manager.SchedulerManager()
+        yield self.sm.setServiceParent(self.master)
+        yield self.sm.startService()
+        self.addCleanup(self.sm.stopService)
+
+        yield self.master.db.insert_test_data([
+            fakedb.SourceStamp(id=92),
+            fakedb.Change(changeid=500, sourcestampid=92),
+        ])
+        self.get_change_calls = []
+        get_change = self.master.db.changes.getChange
+
+        def getChange(changeid):
+            self.get_change_calls.append(changeid)
+            return get_change(changeid)
+
+        self.patch(self.master.db.changes, 'getChange', getChange)
+        self.time_events = []
+        self.patch(
+            metrics.MetricTimeEvent,
+            'log',
+            lambda timer, elapsed: self.time_events.append((timer, elapsed)),
+        )
+
+    def send_change(self):
+        self.master.mq.callConsumer(('changes', '500', 'new'), {'changeid': 500})
+
+    def test_change_loaded_once(self):
+        received = []
+        self.sm.subscribe_to_changes(received.append)
+        self.sm.subscribe_to_changes(received.append)
+
+        self.send_change()
+
+        self.assertEqual(len(received), 2)
+        self.assertIdentical(received[0], received[1])
+        self.assertEqual(received[0].number, 500)
+        self.assertEqual(self.get_change_calls, [500])
+        self.assertEqual(self.time_events, [('SchedulerManager.change_fanout', 0)])
+
+    def test_stop_consuming(self):
+        received = []
+        subscription = self.sm.subscribe_to_changes(received.append)
+        subscription.stopConsuming()
+
+        self.send_change()
+
+        self.assertEqual(received, [])
+        self.assertEqual(self.get_change_calls, [])
+
+    def test_fanout_waits_for_subscribers(self):
+        d = defer.Deferred()
+        self.sm.subscribe_to_changes(lambda change: d)
+
+        self.send_change()
+        self.reactor.advance(3)
+        self.assertEqual(self.time_events, [])
+
+        d.callback(None)
+        self.assertEqual(self.time_events, [('SchedulerManager.change_fanout', 3)])
+
+    def test_subscriber_failure(self):
+        received = []
+        self.sm.subscribe_to_changes(lambda change: 1 / 0)
+        self.sm.subscribe_to_changes(received.append)
+
+        self.send_change()
+
+        self.assertEqual(len(received), 1)
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
+
+    def test_routing(self):
+        received = []
+        self.sm.subscribe_to_changes(lambda change: received.append(1))
+        self.sm.subscribe_to_changes(lambda change: received.append(2), ChangeFilter(branch='dev'))
+        self.sm.subscribe_to_changes(
+            lambda change: received.append(3), ChangeFilter(branch='master')
+        )
+        self.sm.subscribe_to_changes(
+            lambda change: received.append(4), ChangeFilter(repository_re='re.*')
+        )
+        count_events = []
+        self.patch(
+            metrics.MetricCountEvent,
+            'log',
+            lambda counter, count, absolute: count_events.append((counter, count)),
+        )
+
+        self.send_change()
+
+        self.assertEqual(received, [1, 3, 4])
+        self.assertEqual(count_events, [('SchedulerManager.change_routed', 3)])
+
+    def test_routing_stop_consuming(self):
+        received = []
+        subscription = self.sm.subscribe_to_changes(received.append, ChangeFilter(branch='master'))
+        subscription.stopConsuming()
+        subscription.stopConsuming()
+
+        self.sm.subscribe_to_changes(received.append, ChangeFilter(branch='dev'))
+        self.send_change()
+
+        self.assertEqual(received, [])
+
+    @defer.inlineCallbacks
+    def test_important_files(self):
+        received = []
+        self.sm.subscribe_to_changes(
+            lambda change, important: received.append((1, important)),
+            important_files=ImportantFiles(include='src/'),
+        )
+        self.sm.subscribe_to_changes(
+            lambda change, important: received.append((2, important)),
+            important_files=ImportantFiles(exclude='*.md'),
+        )
+        self.sm.subscribe_to_changes(
+            lambda change, important: received.append((3, important)),
+            ChangeFilter(branch='dev'),
+            important_files=ImportantFiles(),
+        )
+        self.sm.subscribe_to_changes(lambda change: received.append((4, None)))
+        yield self.master.db.insert_test_data([
+            fakedb.ChangeFile(changeid=500, filename='setup.py'),
+        ])
+        self.patch(
+            self.sm._important_files_index,
+            'match',
+            mock.Mock(wraps=self.sm._important_files_index.match),
+        )
+
+        self.send_change()
+
+        self.assertEqual(received, [(1, False), (2, True), (4, None)])
+        # the files were matched once, for the subscriptions with rules that the change may match
+        self.assertEqual(self.sm._important_files_index.match.call_count, 1)
+
+
+class TimedActuation(TestReactorMixin, unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.setup_test_reactor()
+        self.master = yield fakemaster.make_master(self, wantMq=True, wantDb=True, wantData=True)
+        self.sm = manager.SchedulerManager()
+        yield self.sm.setServiceParent(self.master)
+        yield self.sm.startService()
+        self.addCleanup(self.sm.stopService)
+
+        yield self.master.db.insert_test_data([
+            fakedb.SourceStamp(id=92),
+            fakedb.Change(changeid=500, sourcestampid=92),
+            fakedb.Change(changeid=501, sourcestampid=92),
+            fakedb.Scheduler(id=24, name='a'),
+            fakedb.Scheduler(id=25, name='b'),
+            fakedb.SchedulerChange(schedulerid=24, changeid=500, important=1),
+            fakedb.SchedulerChange(schedulerid=24, changeid=501, important=0),
+            fakedb.Object(id=10, name='a', class_name='Nightly'),
+            fakedb.Object(id=11, name='b', class_name='Nightly'),
+            fakedb.ObjectState(objectid=11, name='last_only_if_changed', value_json='false'),
+        ])
+        self.count_events = []
+        self.patch(
+            metrics.MetricCountEvent,
+            'log',
+            lambda counter, count, absolute=False: self.count_events.append((counter, count)),
+        )
+
+    def test_batched(self):
+        actuated = []
+        self.patch(
+            self.master.db.schedulers,
+            'getChangeClassificationsForSchedulers',
+            mock.Mock(wraps=self.master.db.schedulers.getChangeClassificationsForSchedulers),
+        )
+        self.sm.schedule_actuation(10, 24, 10, lambda *args: actuated.append(('a', *args)))
+        self.sm.schedule_actuation(10, 25, 11, lambda *args: actuated.append(('b', *args)))
+        self.sm.schedule_actuation(20, 24, 10, lambda *args: actuated.append(('c', *args)))
+
+        self.reactor.advance(10)
+
+        self.assertEqual(
+            actuated,
+            [
+                ('a', ({500: True, 501: False}, True)),
+                ('b', ({}, False)),
+            ],
+        )
+        self.master.db.schedulers.getChangeClassificationsForSchedulers.assert_called_once_with([
+            24,
+            25,
+        ])
+        self.assertEqual(self.count_events, [('SchedulerManager.actuation_batch', 2)])
+
+        self.reactor.advance(10)
+        self.assertEqual(actuated[2:], [('c', ({500: True, 501: False}, True))])
+
+    def test_cancelled(self):
+        actuated = []
+        timer = self.sm.schedule_actuation(10, 24, 10, actuated.append)
+        timer.cancel()
+
+        self.reactor.advance(10)
+
+        self.assertEqual(actuated, [])
+
+    def test_load_failure(self):
+        actuated = []
+        self.patch(
+            self.master.db.schedulers,
+            'getChangeClassificationsForSchedulers',
+            mock.Mock(return_value=defer.fail(RuntimeError('oh noes'))),
+        )
+        self.sm.schedule_actuation(10, 24, 10, lambda *args: actuated.append(args))
+
+        self.reactor.advance(10)
+
+        # the scheduler loads its own state
+        self.assertEqual(actuated, [()])
+        self.assertEqual(len(self.flushLoggedErrors(RuntimeError)), 1)
@@ -21,6 +21,7 @@ from twisted.python import log
 from twisted.trial import unittest
 
 from buildbot.changes import filter
+from buildbot.schedulers import manager
 from buildbot.schedulers import timed
 from buildbot.test import fakedb
 from buildbot.test.reactor import TestReactorMixin
@@ -45,11 +46,18 @@ class Nightly(scheduler.SchedulerMixin, TestReactorMixin, StateTestMixin, unitte
     long_ago_time = 86400
 
     @defer.inlineCallbacks
-    def makeScheduler(self, **kwargs):
+    def makeScheduler(self, use_manager=False, **kwargs):
         sched = yield self.attachScheduler(
             timed.Nightly(**kwargs), self.OBJECTID, self.SCHEDULERID, overrideBuildsetMethods=True
         )
 
+        if use_manager:
+            # actuate the scheduler through the timers of a scheduler manager
+            self.sm = manager.SchedulerManager()
+            yield self.sm.setServiceParent(self.master)
+            yield sched.disownServiceParent()
+            yield sched.setServiceParent(self.sm)
+
         yield self.master.db.insert_test_data([
             fakedb.Builder(name=bname) for bname in kwargs.get("builderNames", [])
         ])
@@ -320,10 +328,11 @@ class Nightly(scheduler.SchedulerMixin, TestReactorMixin, StateTestMixin, unitte
 
     @defer.inlineCallbacks
     def do_test_iterations_onlyIfChanged(
-        self, changes_at, last_only_if_changed, is_new_scheduler=False, **kwargs
+        self, changes_at, last_only_if_changed, is_new_scheduler=False, use_manager=False, **kwargs
     ):
         fII = mock.Mock(name='fII')
         yield self.makeScheduler(
+            use_manager=use_manager,
             name='test',
             builderNames=['test'],
             branch=None,
@@ -391,6 +400,18 @@ class Nightly(scheduler.SchedulerMixin, TestReactorMixin, StateTestMixin, unitte
         yield self.assert_state_by_class('test', 'Nightly', last_build=1500 + self.time_offset)
         yield self.sched.deactivate()
 
+    @defer.inlineCallbacks
+    def test_iterations_onlyIfChanged_no_changes_existing_scheduler_manager(self):
+        self.patch(
+            self.master.db.schedulers,
+            'getChangeClassifications',
+            mock.Mock(side_effect=AssertionError('not batched')),
+        )
+        yield self.do_test_iterations_onlyIfChanged([], last_only_if_changed=True, use_manager=True)
+        self.assertEqual(self.addBuildsetCalls, [])
+        yield self.assert_state_by_class('test', 'Nightly', last_build=1500 + self.time_offset)
+        yield self.sched.deactivate()
+
     @defer.inlineCallbacks
     def test_iterations_onlyIfChanged_no_changes_existing_scheduler_setting_changed(self):
         # When onlyIfChanged==False, builds are run every time on the time set
@@ -651,6 +672,65 @@ class Nightly(scheduler.SchedulerMixin, TestReactorMixin, StateTestMixin, unitte
         yield self.assert_state_by_class('test', 'Nightly', last_build=1500 + self.time_offset)
         yield self.sched.deactivate()
 
+    @defer.inlineCallbacks
+    def test_iterations_onlyIfChanged_mixed_changes_manager_jitter(self):
+        self.patch(timed.random, 'uniform', lambda a, b: 30)
+        yield self.do_test_iterations_onlyIfChanged(
+            [
+                (120, self.makeFakeChange(number=500, branch=None), False),
+                (130, self.makeFakeChange(number=501, branch='offbranch'), True),
+                (1200, self.makeFakeChange(number=502, branch=None), True),
+                (1201, self.makeFakeChange(number=503, branch=None), False),
+                (1202, self.makeFakeChange(number=504, branch='offbranch'), True),
+            ],
+            last_only_if_changed=True,
+            use_manager=True,
+            jitter=60,
+        )
+
+        # the actuation is delayed by the jitter, to the next minute the clock is advanced to
+        self.assertEqual(self.addBuildsetCallTimes, [1560])
+        self.assertEqual(
+            self.addBuildsetCalls,
+            [
+                (
+                    'addBuildsetForChanges',
+                    {
+                        'builderNames': None,
+                        'changeids': [500, 502, 503],
+                        'external_idstring': None,
+                        'priority': None,
+                        'properties': None,
+                        'reason': "The Nightly scheduler named 'test' triggered this build",
+                        'waited_for': False,
+                    },
+                )
+            ],
+        )
+        yield self.assert_state_by_class('test', 'Nightly', last_build=1500 + self.time_offset)
+        yield self.sched.deactivate()
+
+    @defer.inlineCallbacks
+    def test_iterations_onlyIfChanged_change_during_manager_jitter(self):
+        self.patch(timed.random, 'uniform', lambda a, b: 30)
+        yield self.do_test_iterations_onlyIfChanged(
+            [
+                (120, self.makeFakeChange(number=500, branch=None), True),
+                # classified after the nominal actuation time, but before the delayed actuation
+                (1500, self.makeFakeChange(number=501, branch=None), True),
+            ],
+            last_only_if_changed=True,
+            use_manager=True,
+            jitter=60,
+        )
+
+        self.assertEqual(self.addBuildsetCallTimes, [360, 1560])
+        self.assertEqual(
+            [kw['changeids'] for _, kw in self.addBuildsetCalls],
+            [[500], [501]],
+        )
+        yield self.sched.deactivate()
+
     @defer.inlineCallbacks
     def test_iterations_onlyIfChanged_createAbsoluteSourceStamps_oneChanged(self):
         # Test createAbsoluteSourceStamps=True when only one codebase has
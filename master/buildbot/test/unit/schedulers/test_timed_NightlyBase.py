@@ -278,3 +278,18 @@ class NightlyBase(scheduler.SchedulerMixin, TestReactorMixin, unittest.TestCase)
             # Thurs
             ((2011, 1, 5, 22, 19), (2011, 1, 7, 1, 0)),
         )
+
+    @defer.inlineCallbacks
+    def test_getNextBuildTime_cached_within_minute(self):
+        sched = yield self.makeScheduler(name='test', builderNames=['test'], minute=[4, 34])
+        yield self.master.startService()
+        timed._cron_next_time.cache_clear()
+        yield self.do_getNextBuildTime_test(
+            sched,
+            ((2011, 1, 1, 3, 10, 0), (2011, 1, 1, 3, 34, 0)),
+            ((2011, 1, 1, 3, 10, 1), (2011, 1, 1, 3, 34, 0)),
+            ((2011, 1, 1, 3, 10, 59), (2011, 1, 1, 3, 34, 0)),
+            ((2011, 1, 1, 3, 34, 0), (2011, 1, 1, 4, 4, 0)),
+        )
+        info = timed._cron_next_time.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 2))
@@ -18,6 +18,7 @@ from twisted.internet import defer
 from twisted.trial import unittest
 
 from buildbot import config
+from buildbot.schedulers import manager
 from buildbot.schedulers import timed
 from buildbot.test.reactor import TestReactorMixin
 from buildbot.test.util import scheduler
@@ -84,6 +85,27 @@ class Periodic(scheduler.SchedulerMixin, TestReactorMixin, unittest.TestCase):
         with self.assertRaises(config.ConfigErrors):
             timed.Periodic(name='test', builderNames=['test'], periodicBuildTimer=-2)
 
+    def test_constructor_invalid_jitter(self):
+        with self.assertRaises(config.ConfigErrors):
+            timed.Periodic(name='test', builderNames=['test'], periodicBuildTimer=10, jitter=-1)
+
+    @defer.inlineCallbacks
+    def test_iterations_jitter(self):
+        self.patch(timed.random, 'uniform', lambda a, b: 3)
+        sched = yield self.makeScheduler(
+            name='test', builderNames=['test'], periodicBuildTimer=13, jitter=5
+        )
+        yield self.master.startService()
+
+        self.reactor.advance(0)  # let it trigger the first build
+        while self.reactor.seconds() < 30:
+            self.reactor.advance(1)
+        # the builds are delayed, but not the next actuations
+        self.assertEqual(self.events, ['B@3', 'B@16', 'B@29'])
+        self.assertEqual(self.state.get('last_build'), 26)
+
+        yield sched.deactivate()
+
     @defer.inlineCallbacks
     def test_constructor_no_reason(self):
         sched = yield self.makeScheduler(name='test', builderNames=['test'], periodicBuildTimer=10)
@@ -112,6 +134,26 @@ class Periodic(scheduler.SchedulerMixin, TestReactorMixin, unittest.TestCase):
 
         yield sched.deactivate()
 
+    @defer.inlineCallbacks
+    def test_iterations_shared_timers(self):
+        sm = manager.SchedulerManager()
+        yield sm.setServiceParent(self.master)
+        sched = yield self.makeScheduler(name='test', builderNames=['test'], periodicBuildTimer=13)
+        yield sched.disownServiceParent()
+        yield sched.setServiceParent(sm)
+        yield self.master.startService()
+
+        self.reactor.advance(0)  # let it trigger the first build
+        # the next build is scheduled in the timers of the manager
+        self.assertEqual(len(sm.timers), 1)
+        while self.reactor.seconds() < 30:
+            self.reactor.advance(1)
+        self.assertEqual(self.events, ['B@0', 'B@13', 'B@26'])
+
+        yield self.master.stopService()
+        self.assertIsNone(sm.timers)
+        self.assertIsNone(sched.actuateAtTimer)
+
     @defer.inlineCallbacks
     def test_iterations_simple_branch(self):
         yield self.makeScheduler(
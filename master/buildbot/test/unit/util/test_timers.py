@@ -0,0 +1,143 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+from typing import Any
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.test.reactor import TestReactorMixin
+from buildbot.util.timers import Timer
+from buildbot.util.timers import TimerQueue
+
+
+class TestTimerQueue(TestReactorMixin, unittest.TestCase):
+    def setUp(self) -> None:
+        self.setup_test_reactor()
+        self.queue = TimerQueue(self.reactor)
+        self.addCleanup(self.queue.stop)
+        self.calls: list[Any] = []
+
+    def call_at(self, time: float, name: Any) -> Timer:
+        return self.queue.call_at(time, self.calls.append, name)
+
+    def test_calls_in_time_order(self) -> None:
+        self.call_at(30, 'c')
+        self.call_at(10, 'a')
+        self.call_at(20, 'b')
+
+        self.reactor.advance(9)
+        self.assertEqual(self.calls, [])
+        self.reactor.advance(1)
+        self.assertEqual(self.calls, ['a'])
+        self.reactor.advance(20)
+        self.assertEqual(self.calls, ['a', 'b', 'c'])
+        self.assertEqual(len(self.queue), 0)
+
+    def test_single_delayed_call(self) -> None:
+        for i in range(100):
+            self.call_at(10 + i, i)
+
+        self.assertEqual(len(self.reactor.getDelayedCalls()), 1)
+        self.assertEqual(len(self.queue), 100)
+
+        self.reactor.advance(50)
+        self.assertEqual(self.calls, list(range(41)))
+        self.assertEqual(len(self.reactor.getDelayedCalls()), 1)
+
+    def test_same_time_called_together_in_order(self) -> None:
+        for name in ['a', 'b', 'c']:
+            self.call_at(10, name)
+
+        self.reactor.advance(10)
+        self.assertEqual(self.calls, ['a', 'b', 'c'])
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
+
+    def test_past_time_called_asap(self) -> None:
+        self.reactor.advance(100)
+        self.call_at(10, 'a')
+
+        self.reactor.advance(0)
+        self.assertEqual(self.calls, ['a'])
+
+    def test_earlier_timer_reschedules(self) -> None:
+        self.call_at(100, 'b')
+        self.call_at(10, 'a')
+
+        self.reactor.advance(10)
+        self.assertEqual(self.calls, ['a'])
+
+    def test_cancel(self) -> None:
+        timer = self.call_at(10, 'a')
+        self.call_at(20, 'b')
+        self.assertTrue(timer.active())
+
+        timer.cancel()
+        self.assertFalse(timer.active())
+        self.assertEqual(len(self.queue), 1)
+
+        self.reactor.advance(20)
+        self.assertEqual(self.calls, ['b'])
+
+    def test_cancel_all(self) -> None:
+        timers = [self.call_at(10 + i, i) for i in range(10)]
+        for timer in timers:
+            timer.cancel()
+
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
+
+    def test_cancel_after_call(self) -> None:
+        timer = self.call_at(10, 'a')
+        self.reactor.advance(10)
+
+        timer.cancel()
+        self.assertFalse(timer.active())
+        self.assertEqual(len(self.queue), 0)
+
+    def test_stop(self) -> None:
+        timer = self.call_at(10, 'a')
+        self.queue.stop()
+
+        self.assertFalse(timer.active())
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
+        self.reactor.advance(10)
+        self.assertEqual(self.calls, [])
+
+    def test_timer_added_from_callback(self) -> None:
+        def fn() -> None:
+            self.calls.append('a')
+            self.call_at(self.reactor.seconds() + 10, 'b')
+
+        self.queue.call_at(10, fn)
+
+        self.reactor.advance(10)
+        self.assertEqual(self.calls, ['a'])
+        self.reactor.advance(10)
+        self.assertEqual(self.calls, ['a', 'b'])
+
+    def test_failure_logged(self) -> None:
+        def fn() -> None:
+            raise RuntimeError('oh noes')
+
+        self.queue.call_at(10, fn)
+        self.queue.call_at(10, lambda: defer.fail(ValueError('oh noes')))
+        self.call_at(10, 'a')
+
+        self.reactor.advance(10)
+        self.assertEqual(self.calls, ['a'])
+        self.assertEqual(len(self.flushLoggedErrors(RuntimeError, ValueError)), 2)
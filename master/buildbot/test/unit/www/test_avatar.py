@@ -118,6 +118,165 @@ class AvatarResource(TestReactorMixin, www.WwwTestMixin, unittest.TestCase):
         )
 
 
+class CountingAvatar(avatar.AvatarBase):
+    def __init__(self, result=None):
+        self.result = result
+        self.calls = []
+
+    def getUserAvatar(self, email, username, size, defaultAvatarUrl):
+        d = defer.Deferred()
+        self.calls.append(d)
+        return d
+
+    def fire(self):
+        for d in self.calls:
+            if not d.called:
+                if isinstance(self.result, Exception):
+                    d.errback(self.result)
+                else:
+                    d.callback(self.result)
+
+
+class AvatarCache(TestReactorMixin, www.WwwTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.setup_test_reactor()
+
+    @defer.inlineCallbacks
+    def make_resource(self, method, **cache_kwargs):
+        master = yield self.make_master(
+            url='http://a/b/',
+            auth=auth.NoAuth(),
+            avatar_methods=[method],
+            avatar_cache=avatar.AvatarCache(**cache_kwargs),
+        )
+        rsrc = avatar.AvatarResource(master)
+        rsrc.reconfigResource(master.config)
+        return rsrc
+
+    def test_invalid_ttl(self):
+        with self.assertRaises(config.ConfigErrors):
+            avatar.AvatarCache(ttl=-1)
+
+    @defer.inlineCallbacks
+    def test_default_cache_kept_on_reconfig(self):
+        method = CountingAvatar(avatar.resource.Redirect('http://avatar/'))
+        master = yield self.make_master(url='http://a/b/', auth=auth.NoAuth(), avatar_methods=[])
+        rsrc = avatar.AvatarResource(master)
+        master.config.www['avatar_methods'] = [method]
+        rsrc.reconfigResource(master.config)
+
+        d = self.render_resource(rsrc, b'/?email=foo')
+        method.fire()
+        yield d
+        cache = rsrc.cache
+
+        rsrc.reconfigResource(master.config)
+        self.assertIs(rsrc.cache, cache)
+        res = yield self.render_resource(rsrc, b'/?email=foo')
+        self.assertEqual(res, {"redirected": b'http://avatar/'})
+        self.assertEqual(len(method.calls), 1)
+
+    @defer.inlineCallbacks
+    def test_configured_cache_replaced_on_reconfig(self):
+        rsrc = yield self.make_resource(CountingAvatar(None))
+        cache = avatar.AvatarCache()
+        rsrc.master.config.www['avatar_cache'] = cache
+
+        rsrc.reconfigResource(rsrc.master.config)
+        self.assertIs(rsrc.cache, cache)
+        self.assertIs(cache.master, rsrc.master)
+
+    @defer.inlineCallbacks
+    def test_positive_ttl(self):
+        method = CountingAvatar(avatar.resource.Redirect('http://avatar/'))
+        rsrc = yield self.make_resource(method, ttl=100)
+
+        for _ in range(2):
+            d = self.render_resource(rsrc, b'/?email=foo')
+            method.fire()
+            res = yield d
+            self.assertEqual(res, {"redirected": b'http://avatar/'})
+        self.assertEqual(len(method.calls), 1)
+
+        self.reactor.advance(101)
+        d = self.render_resource(rsrc, b'/?email=foo')
+        method.fire()
+        yield d
+        self.assertEqual(len(method.calls), 2)
+
+    @defer.inlineCallbacks
+    def test_negative_ttl(self):
+        method = CountingAvatar(None)
+        rsrc = yield self.make_resource(method, negative_ttl=10)
+
+        for _ in range(2):
+            d = self.render_resource(rsrc, b'/?email=foo')
+            method.fire()
+            res = yield d
+            self.assertEqual(res, {"redirected": b'img/nobody.png'})
+        self.assertEqual(len(method.calls), 1)
+
+        self.reactor.advance(11)
+        d = self.render_resource(rsrc, b'/?email=foo')
+        method.fire()
+        yield d
+        self.assertEqual(len(method.calls), 2)
+
+    @defer.inlineCallbacks
+    def test_concurrent_lookups_coalesced(self):
+        method = CountingAvatar((b"image/png", b"data"))
+        rsrc = yield self.make_resource(method)
+
+        d1 = self.render_resource(rsrc, b'/?email=foo')
+        d2 = self.render_resource(rsrc, b'/?email=foo')
+        self.assertEqual(len(method.calls), 1)
+        method.fire()
+
+        self.assertEqual((yield d1), b"data")
+        self.assertEqual((yield d2), b"data")
+        self.assertEqual((rsrc.cache.hits, rsrc.cache.misses), (1, 1))
+
+    @defer.inlineCallbacks
+    def test_errors_not_cached(self):
+        method = CountingAvatar(RuntimeError('oops'))
+        rsrc = yield self.make_resource(method)
+
+        d1 = rsrc.cache.get('key', lambda: method.getUserAvatar(None, None, 32, None))
+        d2 = rsrc.cache.get('key', lambda: method.getUserAvatar(None, None, 32, None))
+        method.fire()
+        for d in (d1, d2):
+            with self.assertRaises(RuntimeError):
+                yield d
+        self.assertEqual(rsrc.cache._entries, {})
+
+    @defer.inlineCallbacks
+    def test_max_size(self):
+        method = CountingAvatar(None)
+        rsrc = yield self.make_resource(method, max_size=2)
+
+        for email in (b'a', b'b', b'c'):
+            d = self.render_resource(rsrc, b'/?email=' + email)
+            method.fire()
+            yield d
+        self.assertEqual(list(rsrc.cache._entries), [(b'b', None, 32), (b'c', None, 32)])
+
+    @defer.inlineCallbacks
+    def test_persist(self):
+        method = CountingAvatar(avatar.resource.Redirect('http://avatar/'))
+        rsrc = yield self.make_resource(method, persist=True)
+
+        d = self.render_resource(rsrc, b'/?email=foo')
+        method.fire()
+        yield d
+
+        # a new cache, e.g. after a restart, reads the result from the database
+        rsrc.cache = avatar.AvatarCache(persist=True)
+        rsrc.cache.master = self.master
+        res = yield self.render_resource(rsrc, b'/?email=foo')
+        self.assertEqual(res, {"redirected": b'http://avatar/'})
+        self.assertEqual(len(method.calls), 1)
+
+
 github_username_search_reply = {
     "login": "defunkt",
     "id": 42424242,
@@ -750,6 +909,10 @@ class GitHubAvatarBasicAuth(TestReactorMixin, www.WwwTestMixin, unittest.TestCas
         with self.assertRaises(config.ConfigErrors):
             avatar.AvatarGitHub(client_secret="oauth_secret")
 
+    def test_invalid_max_concurrent_requests(self):
+        with self.assertRaises(config.ConfigErrors):
+            avatar.AvatarGitHub(max_concurrent_requests=0)
+
     def test_token_and_client_credentials(self):
         with self.assertRaises(config.ConfigErrors):
             avatar.AvatarGitHub(client_id="oauth_id", client_secret="oauth_secret", token="token")
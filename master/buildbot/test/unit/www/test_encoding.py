@@ -0,0 +1,170 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+import zlib
+from unittest import mock
+
+from twisted.internet import defer
+from twisted.trial import unittest
+from twisted.web.test.requesthelper import DummyRequest
+
+from buildbot.test.util.config import ConfigErrorsMixin
+from buildbot.www import encoding
+
+
+class ResponseEncodingPolicy(ConfigErrorsMixin, unittest.TestCase):
+    def test_default_levels(self) -> None:
+        policy = encoding.ResponseEncodingPolicy()
+        self.assertEqual(policy.get_level('gzip', b'application/json'), 9)
+        self.assertEqual(policy.get_level('br', None), 11)
+
+    def test_levels_by_content_type(self) -> None:
+        policy = encoding.ResponseEncodingPolicy(
+            levels={
+                'application/json': {'br': 4},
+                'text/*': {'gzip': 3},
+                '*': {'gzip': 5},
+            }
+        )
+        self.assertEqual(policy.get_level('br', b'application/json; charset=utf-8'), 4)
+        self.assertEqual(policy.get_level('gzip', b'application/json'), 5)
+        self.assertEqual(policy.get_level('gzip', b'text/plain; charset=utf-8'), 3)
+        self.assertEqual(policy.get_level('gzip', None), 5)
+        self.assertEqual(policy.get_level('zstd', b'text/plain'), 3)
+
+    def test_unknown_encoding(self) -> None:
+        with self.assertRaisesConfigError("unknown response encoding 'deflate'"):
+            encoding.ResponseEncodingPolicy(encodings=['deflate'])
+
+    def test_invalid_min_size(self) -> None:
+        with self.assertRaisesConfigError("min_size must be a non-negative integer"):
+            encoding.ResponseEncodingPolicy(min_size=-1)
+
+
+class ResponseEncoderFactory(unittest.TestCase):
+    def make_request(
+        self, accept_encoding: bytes, content_length: bytes | None = None
+    ) -> DummyRequest:
+        request = DummyRequest([b''])
+        request.startedWriting = False  # type: ignore[attr-defined]
+        request.requestHeaders.setRawHeaders(b'accept-encoding', [accept_encoding])
+        request.responseHeaders.setRawHeaders(b'content-type', [b'application/json'])
+        if content_length is not None:
+            request.responseHeaders.setRawHeaders(b'content-length', [content_length])
+        return request
+
+    def test_policy_order(self) -> None:
+        factory = encoding.ResponseEncoderFactory(
+            encoding.ResponseEncodingPolicy(encodings=['gzip', 'br'])
+        )
+        encoder = factory.encoderForRequest(self.make_request(b'br, gzip'))
+        self.assertIsInstance(encoder, encoding._GzipEncoder)
+
+    def test_not_accepted(self) -> None:
+        factory = encoding.ResponseEncoderFactory(
+            encoding.ResponseEncodingPolicy(encodings=['gzip'])
+        )
+        self.assertIsNone(factory.encoderForRequest(self.make_request(b'br')))
+
+    @mock.patch('buildbot.process.metrics.MetricCountEvent.log')
+    @mock.patch('buildbot.process.metrics.MetricTimeEvent.log')
+    def test_encode(self, time_log: mock.Mock, count_log: mock.Mock) -> None:
+        factory = encoding.ResponseEncoderFactory(
+            encoding.ResponseEncodingPolicy(encodings=['gzip'], min_size=10)
+        )
+        request = self.make_request(b'gzip', content_length=b'1000')
+        encoder = factory.encoderForRequest(request)
+        assert encoder is not None
+
+        data = encoder.encode(b'x' * 1000) + encoder.finish()
+
+        self.assertEqual(zlib.decompress(data, wbits=47), b'x' * 1000)
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'content-encoding'), [b'gzip'])
+        self.assertIsNone(request.responseHeaders.getRawHeaders(b'content-length'))
+        time_log.assert_called_once_with('www.encoding.gzip', mock.ANY)
+        count_log.assert_any_call('www.encoding.gzip.bytes_in', 1000)
+        count_log.assert_any_call('www.encoding.gzip.bytes_out', len(data))
+
+    @mock.patch('buildbot.process.metrics.MetricCountEvent.log')
+    def test_skip_small_response(self, count_log: mock.Mock) -> None:
+        factory = encoding.ResponseEncoderFactory(
+            encoding.ResponseEncodingPolicy(encodings=['gzip'], min_size=1024)
+        )
+        request = self.make_request(b'gzip', content_length=b'100')
+        encoder = factory.encoderForRequest(request)
+        assert encoder is not None
+
+        self.assertEqual(encoder.encode(b'x' * 100), b'x' * 100)
+        self.assertEqual(encoder.finish(), b'')
+        self.assertIsNone(request.responseHeaders.getRawHeaders(b'content-encoding'))
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'content-length'), [b'100'])
+        count_log.assert_called_once_with('www.encoding.gzip.skipped')
+
+    def test_encode_unknown_length(self) -> None:
+        factory = encoding.ResponseEncoderFactory(
+            encoding.ResponseEncodingPolicy(encodings=['gzip'], min_size=1024)
+        )
+        request = self.make_request(b'gzip')
+        encoder = factory.encoderForRequest(request)
+        assert encoder is not None
+
+        data = encoder.encode(b'x' * 10) + encoder.encode(b'y' * 10) + encoder.finish()
+        self.assertEqual(zlib.decompress(data, wbits=47), b'x' * 10 + b'y' * 10)
+
+    def test_compress_in_thread(self) -> None:
+        factory = encoding.ResponseEncoderFactory(
+            encoding.ResponseEncodingPolicy(encodings=['gzip'], min_size=10)
+        )
+        request = self.make_request(b'gzip', content_length=b'1000')
+        encoder = factory.encoderForRequest(request)
+        assert encoder is not None
+        request._encoder = encoder  # type: ignore[attr-defined]
+        data = b'x' * 1000
+
+        to_thread = mock.Mock(side_effect=lambda fn, *args: defer.succeed(fn(*args)))
+        with mock.patch('twisted.internet.threads.deferToThread', to_thread):
+            self.successResultOf(encoding.compress_in_thread(request, data))
+        to_thread.assert_called_once()
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'content-encoding'), [b'gzip'])
+
+        # the write only returns the data compressed in the thread
+        with mock.patch.object(encoder, '_compress', side_effect=AssertionError):
+            compressed = encoder.encode(data)
+        self.assertEqual(zlib.decompress(compressed + encoder.finish(), wbits=47), data)
+
+    def test_compress_in_thread_not_encoded(self) -> None:
+        request = self.make_request(b'gzip')
+        self.successResultOf(encoding.compress_in_thread(request, b'x' * 1000))
+
+    def test_zstd(self) -> None:
+        try:
+            import zstandard
+        except ImportError as e:
+            raise unittest.SkipTest("zstandard not installed, skip the test") from e
+
+        factory = encoding.ResponseEncoderFactory(
+            encoding.ResponseEncodingPolicy(
+                encodings=['zstd'], min_size=0, levels={'*': {'zstd': 1}}
+            )
+        )
+        request = self.make_request(b'zstd')
+        encoder = factory.encoderForRequest(request)
+        assert encoder is not None
+        data = encoder.encode(b'x' * 100) + encoder.finish()
+
+        decompressobj = zstandard.ZstdDecompressor().decompressobj()
+        self.assertEqual(decompressobj.decompress(data) + decompressobj.flush(), b'x' * 100)
@@ -0,0 +1,120 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+import os
+
+from twisted.trial import unittest
+from twisted.web.test.requesthelper import DummyRequest
+
+from buildbot.test.util import dirs
+from buildbot.www import plugin
+
+
+class StaticFile(dirs.DirsMixin, unittest.TestCase):
+    def setUp(self) -> None:
+        self.static_dir = os.path.abspath('static')
+        self.setUpDirs(self.static_dir, os.path.join(self.static_dir, 'assets'))
+        self.write_file('scripts.js', b'js' * 1000)
+        self.write_file('scripts.js.br', b'brotli data')
+        self.write_file('scripts.js.gz', b'gzip data')
+        self.write_file('styles.css', b'css data')
+        self.write_file(os.path.join('assets', 'index-C8e-pEak.js'), b'hashed js')
+
+    def write_file(self, name: str, content: bytes) -> None:
+        with open(os.path.join(self.static_dir, name), 'wb') as f:
+            f.write(content)
+
+    def render(
+        self, path: bytes, accept_encoding: bytes | None = None, method: bytes = b'GET'
+    ) -> DummyRequest:
+        request = DummyRequest(path.split(b'/'))
+        request.method = method
+        if accept_encoding is not None:
+            request.requestHeaders.setRawHeaders(b'accept-encoding', [accept_encoding])
+
+        rsrc = plugin.StaticFile(self.static_dir)
+        for segment in path.split(b'/'):
+            rsrc = rsrc.getChild(segment, request)
+        body = rsrc.render(request)
+        if isinstance(body, bytes):
+            request.write(body)
+        return request
+
+    def header(self, request: DummyRequest, name: bytes) -> bytes | None:
+        values = request.responseHeaders.getRawHeaders(name)
+        return values[0] if values else None
+
+    def test_serves_brotli_variant(self) -> None:
+        request = self.render(b'scripts.js', b'gzip, deflate, br')
+        self.assertEqual(b''.join(request.written), b'brotli data')
+        self.assertEqual(self.header(request, b'content-encoding'), b'br')
+        self.assertEqual(self.header(request, b'content-type'), b'text/javascript')
+        self.assertEqual(self.header(request, b'vary'), b'Accept-Encoding')
+
+    def test_serves_gzip_variant(self) -> None:
+        request = self.render(b'scripts.js', b'gzip, br;q=0')
+        self.assertEqual(b''.join(request.written), b'gzip data')
+        self.assertEqual(self.header(request, b'content-encoding'), b'gzip')
+
+    def test_serves_identity_without_accept_encoding(self) -> None:
+        request = self.render(b'scripts.js')
+        self.assertEqual(b''.join(request.written), b'js' * 1000)
+        self.assertIsNone(self.header(request, b'content-encoding'))
+        self.assertEqual(self.header(request, b'vary'), b'Accept-Encoding')
+
+    def test_no_vary_without_variants(self) -> None:
+        request = self.render(b'styles.css', b'br')
+        self.assertEqual(b''.join(request.written), b'css data')
+        self.assertIsNone(self.header(request, b'vary'))
+        self.assertEqual(self.header(request, b'cache-control'), b'no-cache')
+
+    def test_hashed_asset_is_immutable(self) -> None:
+        request = self.render(b'assets/index-C8e-pEak.js')
+        self.assertEqual(b''.join(request.written), b'hashed js')
+        self.assertEqual(
+            self.header(request, b'cache-control'), b'public, max-age=31536000, immutable'
+        )
+
+    def test_head(self) -> None:
+        request = self.render(b'styles.css', method=b'HEAD')
+        self.assertEqual(b''.join(request.written), b'')
+        self.assertEqual(self.header(request, b'content-length'), b'8')
+
+    def test_memory_cache_is_invalidated_on_change(self) -> None:
+        cache = plugin.StaticFileCache()
+        rsrc = plugin.StaticFile(os.path.join(self.static_dir, 'styles.css'), file_cache=cache)
+        self.assertEqual(cache.get(rsrc), b'css data')
+        self.assertEqual(cache.total_size, 8)
+
+        self.write_file('styles.css', b'new css data')
+        os.utime(os.path.join(self.static_dir, 'styles.css'), (0, 0))
+        rsrc.restat()
+        self.assertEqual(cache.get(rsrc), b'new css data')
+        self.assertEqual(cache.total_size, 12)
+
+    def test_memory_cache_limits(self) -> None:
+        cache = plugin.StaticFileCache(max_file_size=1000, max_total_size=15)
+        big = plugin.StaticFile(os.path.join(self.static_dir, 'scripts.js'), file_cache=cache)
+        self.assertIsNone(cache.get(big))
+
+        css = plugin.StaticFile(os.path.join(self.static_dir, 'styles.css'), file_cache=cache)
+        br = plugin.StaticFile(os.path.join(self.static_dir, 'scripts.js.br'), file_cache=cache)
+        cache.get(css)
+        cache.get(br)
+        # the least recently used file has been evicted
+        self.assertEqual(list(cache._entries), [br.path])
+        self.assertEqual(cache.total_size, 11)
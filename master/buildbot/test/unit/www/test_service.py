@@ -33,6 +33,8 @@ from buildbot.www import change_hook
 from buildbot.www import resource
 from buildbot.www import rest
 from buildbot.www import service
+from buildbot.www.authz import Authz
+from buildbot.www.authz import Forbidden
 
 
 class FakeChannel:
@@ -136,6 +138,61 @@ class Test(TestReactorMixin, www.WwwTestMixin, unittest.TestCase):
         self.assertEqual(self.svc.port_service, None)
         self.assertEqual(self.svc.port, None)
 
+    def make_authz_request(self, user_info):
+        request = mock.Mock()
+        request.getSession.return_value.user_info = user_info
+        return request
+
+    @defer.inlineCallbacks
+    def test_assertUserAllowed_cached(self):
+        self.svc.authz = mock.Mock(spec=Authz)
+        self.svc.authz.assertUserAllowed.return_value = defer.succeed(None)
+        request = self.make_authz_request({'username': 'me'})
+
+        yield self.svc.assertUserAllowed(request, ('builds',), 'GET', {})
+        yield self.svc.assertUserAllowed(request, ('builds',), 'GET', {})
+        self.assertEqual(self.svc.authz.assertUserAllowed.call_count, 1)
+
+        # other users, endpoints or options are evaluated separately
+        yield self.svc.assertUserAllowed(
+            self.make_authz_request({'username': 'other'}), ('builds',), 'GET', {}
+        )
+        yield self.svc.assertUserAllowed(request, ('workers',), 'GET', {})
+        yield self.svc.assertUserAllowed(request, ('builds',), 'stop', {'reason': 'x'})
+        self.assertEqual(self.svc.authz.assertUserAllowed.call_count, 4)
+
+        self.reactor.advance(self.svc.authzCacheTtl)
+        yield self.svc.assertUserAllowed(request, ('builds',), 'GET', {})
+        self.assertEqual(self.svc.authz.assertUserAllowed.call_count, 5)
+
+    @defer.inlineCallbacks
+    def test_assertUserAllowed_control_not_cached(self):
+        self.svc.authz = mock.Mock(spec=Authz)
+        self.svc.authz.assertUserAllowed.return_value = defer.succeed(None)
+        request = self.make_authz_request({'username': 'me'})
+
+        for _ in range(2):
+            yield self.svc.assertUserAllowed(request, ('builds', '1'), 'rebuild', {})
+        self.assertEqual(self.svc.authz.assertUserAllowed.call_count, 2)
+
+    @defer.inlineCallbacks
+    def test_assertUserAllowed_forbidden_cached(self):
+        self.svc.authz = mock.Mock(spec=Authz)
+        self.svc.authz.assertUserAllowed.side_effect = lambda *args: defer.fail(
+            Forbidden(b"you need to have role 'admins'")
+        )
+        request = self.make_authz_request({'anonymous': True})
+
+        errors = []
+        for _ in range(2):
+            with self.assertRaises(Forbidden) as cm:
+                yield self.svc.assertUserAllowed(request, ('builds', '1'), 'GET', {})
+            errors.append(cm.exception)
+        self.assertEqual(self.svc.authz.assertUserAllowed.call_count, 1)
+        # a new error is raised each time
+        self.assertIsNot(errors[0], errors[1])
+        self.assertEqual(errors[1].message, b"you need to have role 'admins'")
+
     def test_setupSite(self):
         self.svc.setupSite(self.makeConfig())
         site = self.svc.site
@@ -246,6 +303,45 @@ class TestBuildbotSite(unittest.SynchronousTestCase):
         with self.assertRaises(KeyError):
             self.site.getSession(uid)
 
+    def test_getSession_cached(self):
+        payload = {'user_info': {'some': 'payload'}}
+        uid = jwt.encode(payload, self.SECRET, algorithm=service.SESSION_SECRET_ALGORITHM)
+        self.site.getSession(uid).user_info['some'] = 'modified'
+
+        with mock.patch('jwt.decode') as decode:
+            session = self.site.getSession(uid)
+        decode.assert_not_called()
+        self.assertEqual(session.user_info, {'some': 'payload'})
+
+    def test_getSession_cached_until_expiration(self):
+        exp = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=1)
+        exp = calendar.timegm(datetime.datetime.timetuple(exp))
+        payload = {'user_info': {'some': 'payload'}, 'exp': exp}
+        uid = jwt.encode(payload, self.SECRET, algorithm=service.SESSION_SECRET_ALGORITHM)
+        self.site.getSession(uid)
+
+        with mock.patch('time.time', return_value=exp + 1):
+            self.assertIsNone(self.site.getVerifiedToken(uid))
+        self.assertEqual(self.site._verified_tokens, {})
+
+    def test_getSession_cache_cleared_on_new_secret(self):
+        payload = {'user_info': {'some': 'payload'}}
+        uid = jwt.encode(payload, self.SECRET, algorithm=service.SESSION_SECRET_ALGORITHM)
+        self.site.getSession(uid)
+
+        self.site.setSessionSecret('other secret')
+        with self.assertRaises(KeyError):
+            self.site.getSession(uid)
+
+    def test_getSession_cache_size(self):
+        self.site.verifiedTokensCacheSize = 2
+        uids = [
+            jwt.encode({'user_info': {'n': i}}, self.SECRET, algorithm="HS256") for i in range(3)
+        ]
+        for uid in uids:
+            self.site.getSession(uid)
+        self.assertEqual(list(self.site._verified_tokens), uids[1:])
+
     def test_getSession_with_no_user_info(self):
         payload = {'foo': 'bar'}
         uid = jwt.encode(payload, self.SECRET, algorithm=service.SESSION_SECRET_ALGORITHM)
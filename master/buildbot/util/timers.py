@@ -0,0 +1,141 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from __future__ import annotations
+
+import heapq
+import itertools
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Callable
+
+from twisted.internet import defer
+from twisted.python import log
+
+if TYPE_CHECKING:
+    from twisted.internet.interfaces import IDelayedCall
+    from twisted.internet.interfaces import IReactorTime
+
+
+class Timer:
+    """A function to call at a given time, as returned by L{TimerQueue.call_at}"""
+
+    __slots__ = ('_queue', 'time', 'fn', 'args', 'kwargs', 'cancelled')
+
+    def __init__(
+        self,
+        queue: TimerQueue,
+        time: float,
+        fn: Callable[..., Any],
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+    ) -> None:
+        self._queue = queue
+        self.time = time
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+    def active(self) -> bool:
+        return not self.cancelled
+
+    def cancel(self) -> None:
+        if not self.cancelled:
+            self.cancelled = True
+            self._queue._timer_cancelled()
+
+
+class TimerQueue:
+    """
+    Calls functions at given times, with a single reactor delayed call whatever the number of
+    pending timers. The functions due at the same time are called one after the other, in the
+    order of their timers.
+    """
+
+    def __init__(self, reactor: IReactorTime) -> None:
+        self._reactor = reactor
+        # (time, sequence number, timer); the cancelled timers are only removed when due, or
+        # when they are the majority of the queue
+        self._heap: list[tuple[float, int, Timer]] = []
+        self._sequence = itertools.count()
+        self._cancelled = 0
+        self._delayed_call: IDelayedCall | None = None
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    def call_at(self, time: float, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Timer:
+        """
+        Calls C{fn} at C{time}, or as soon as possible if it is in the past. If C{fn} returns a
+        Deferred, its failures are logged.
+        """
+        timer = Timer(self, time, fn, args, kwargs)
+        heapq.heappush(self._heap, (time, next(self._sequence), timer))
+        if self._heap[0][2] is timer:
+            self._reschedule()
+        return timer
+
+    def stop(self) -> None:
+        """Cancels all the pending timers"""
+        for _, _, timer in self._heap:
+            timer.cancelled = True
+        self._heap = []
+        self._cancelled = 0
+        self._reschedule()
+
+    def _timer_cancelled(self) -> None:
+        self._cancelled += 1
+        if self._cancelled > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+            self._reschedule()
+
+    def _reschedule(self) -> None:
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+
+        if not self._heap:
+            if self._delayed_call is not None:
+                self._delayed_call.cancel()
+                self._delayed_call = None
+            return
+
+        delay = max(self._heap[0][0] - self._reactor.seconds(), 0)
+        if self._delayed_call is None:
+            self._delayed_call = self._reactor.callLater(delay, self._fire)
+        else:
+            self._delayed_call.reset(delay)
+
+    def _fire(self) -> None:
+        self._delayed_call = None
+        now = self._reactor.seconds()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, timer = heapq.heappop(self._heap)
+            if timer.cancelled:
+                self._cancelled -= 1
+                continue
+            # not cancellable anymore
+            timer.cancelled = True
+            due.append(timer)
+
+        for timer in due:
+            d = defer.maybeDeferred(timer.fn, *timer.args, **timer.kwargs)
+            d.addErrback(log.err, f'while calling timer function {timer.fn!r}')
+
+        self._reschedule()
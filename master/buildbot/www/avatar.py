@@ -15,6 +15,7 @@
 
 import base64
 import hashlib
+from collections import OrderedDict
 from urllib.parse import urlencode
 from urllib.parse import urljoin
 from urllib.parse import urlparse
@@ -22,11 +23,14 @@ from urllib.parse import urlunparse
 
 from twisted.internet import defer
 from twisted.python import log
+from twisted.python.failure import Failure
 
 from buildbot import config
+from buildbot.util import bytes2unicode
 from buildbot.util import httpclientservice
 from buildbot.util import unicode2bytes
 from buildbot.util.config import ConfiguredMixin
+from buildbot.util.state import StateMixin
 from buildbot.www import resource
 
 
@@ -37,6 +41,116 @@ class AvatarBase(ConfiguredMixin):
         raise NotImplementedError()
 
 
+class AvatarCache(StateMixin):
+    """
+    Caches the result of the avatar lookups, so that a page showing the same authors many times
+    does not trigger as many requests to the avatar providers.
+
+    Both the avatars that were found and the lookups that did not find anything are cached, the
+    latter for a shorter time. Concurrent lookups of the same avatar are coalesced. If persist is
+    True, the redirections are also stored in the database so that they survive restarts.
+    """
+
+    name = "avatar_cache"
+
+    def __init__(self, ttl=24 * 60 * 60, negative_ttl=60 * 60, max_size=10000, persist=False):
+        for arg, value in (('ttl', ttl), ('negative_ttl', negative_ttl), ('max_size', max_size)):
+            if not isinstance(value, int) or value < 0:
+                config.error(f'AvatarCache {arg} must be a non-negative integer')
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.persist = persist
+
+        self.master = None
+        self.hits = self.misses = 0
+        # key -> (expiration time, result), in least recently used order
+        self._entries = OrderedDict()
+        # key -> list of Deferreds waiting for an ongoing lookup
+        self._pending = {}
+
+    def _now(self):
+        return self.master.reactor.seconds()
+
+    def _get_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self._now():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put_entry(self, key, expires, result):
+        self._entries[key] = (expires, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _state_name(self, key):
+        return 'avatar_' + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    @defer.inlineCallbacks
+    def _load_persisted(self, key):
+        value = yield self.getState(self._state_name(key), None)
+        if value is None or value['expires'] <= self._now():
+            return None
+        result = None if value['url'] is None else resource.Redirect(value['url'])
+        return (value['expires'], result)
+
+    @defer.inlineCallbacks
+    def _lookup(self, key, lookup_fn):
+        if self.persist:
+            entry = yield self._load_persisted(key)
+            if entry is not None:
+                self._put_entry(key, *entry)
+                return entry[1]
+
+        result = yield lookup_fn()
+        expires = self._now() + (self.negative_ttl if result is None else self.ttl)
+        self._put_entry(key, expires, result)
+
+        # only the redirections can be persisted, the avatars served directly may be too large
+        if self.persist and (result is None or isinstance(result, resource.Redirect)):
+            url = None if result is None else bytes2unicode(result.url)
+            yield self.setState(self._state_name(key), {'url': url, 'expires': expires})
+        return result
+
+    @defer.inlineCallbacks
+    def get(self, key, lookup_fn):
+        """
+        Returns the cached result for key, calling lookup_fn() if there is none. The result is
+        either a resource.Redirect, a (content type, data) tuple or None if no avatar was found.
+        """
+        entry = self._get_entry(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+
+        if key in self._pending:
+            self.hits += 1
+            d = defer.Deferred()
+            self._pending[key].append(d)
+            result = yield d
+            return result
+
+        self.misses += 1
+        waiters = self._pending[key] = []
+        try:
+            result = yield self._lookup(key, lookup_fn)
+        except Exception:
+            failure = Failure()
+            del self._pending[key]
+            for d in waiters:
+                d.errback(failure)
+            raise
+        del self._pending[key]
+        for d in waiters:
+            d.callback(result)
+        return result
+
+
 class AvatarGitHub(AvatarBase):
     name = "github"
 
@@ -50,6 +164,7 @@ class AvatarGitHub(AvatarBase):
         client_secret=None,
         debug=False,
         verify=True,
+        max_concurrent_requests=4,
     ):
         self.github_api_endpoint = github_api_endpoint
         if github_api_endpoint is None:
@@ -66,6 +181,10 @@ class AvatarGitHub(AvatarBase):
             ).decode('ascii')
         self.debug = debug
         self.verify = verify
+        if not isinstance(max_concurrent_requests, int) or max_concurrent_requests < 1:
+            config.error('max_concurrent_requests must be a positive integer')
+        # bound the number of requests made to the GitHub API at the same time
+        self._request_lock = defer.DeferredSemaphore(max_concurrent_requests)
 
         self.master = None
         self.client = None
@@ -93,6 +212,12 @@ class AvatarGitHub(AvatarBase):
 
         return self.client
 
+    @defer.inlineCallbacks
+    def _http_get(self, url, headers):
+        http = yield self._get_http_client()
+        res = yield self._request_lock.run(http.get, url, headers=headers)
+        return res
+
     @defer.inlineCallbacks
     def _get_avatar_by_username(self, username):
         headers = {
@@ -100,8 +225,7 @@ class AvatarGitHub(AvatarBase):
         }
 
         url = f'/users/{username}'
-        http = yield self._get_http_client()
-        res = yield http.get(url, headers=headers)
+        res = yield self._http_get(url, headers=headers)
         if res.code == 404:
             # Not found
             return None
@@ -120,8 +244,7 @@ class AvatarGitHub(AvatarBase):
 
         query = f'{email} in:email'
         url = f"/search/users?{urlencode({'q': query})}"
-        http = yield self._get_http_client()
-        res = yield http.get(url, headers=headers)
+        res = yield self._http_get(url, headers=headers)
         if 200 <= res.code < 300:
             data = yield res.json()
             if data['total_count'] == 0:
@@ -145,8 +268,7 @@ class AvatarGitHub(AvatarBase):
         }
         sorted_query = sorted(query.items(), key=lambda x: x[0])
         url = f'/search/commits?{urlencode(sorted_query)}'
-        http = yield self._get_http_client()
-        res = yield http.get(url, headers=headers)
+        res = yield self._http_get(url, headers=headers)
         if 200 <= res.code < 300:
             data = yield res.json()
             if data['total_count'] == 0:
@@ -227,13 +349,23 @@ class AvatarResource(resource.Resource):
     # enable reconfigResource calls
     needsReconfig = True
     defaultAvatarUrl = b"img/nobody.png"
+    cache = None
+    # used when no avatar_cache is configured, and kept across reconfigurations
+    _default_cache = None
 
     def reconfigResource(self, new_config):
         self.avatarMethods = new_config.www.get('avatar_methods', [])
         self.defaultAvatarFullUrl = urljoin(
             unicode2bytes(new_config.buildbotURL), unicode2bytes(self.defaultAvatarUrl)
         )
-        self.cache = {}
+        cache = new_config.www.get('avatar_cache')
+        if cache is None:
+            if self._default_cache is None:
+                self._default_cache = AvatarCache()
+            cache = self._default_cache
+        if cache is not self.cache:
+            self.cache = cache
+            self.cache.master = self.master
         # ensure the avatarMethods is a iterable
         if isinstance(self.avatarMethods, AvatarBase):
             self.avatarMethods = (self.avatarMethods,)
@@ -244,6 +376,17 @@ class AvatarResource(resource.Resource):
     def render_GET(self, request):
         return self.asyncRenderHelper(request, self.renderAvatar)
 
+    @defer.inlineCallbacks
+    def _lookupAvatar(self, email, username, size):
+        for method in self.avatarMethods:
+            try:
+                res = yield method.getUserAvatar(email, username, size, self.defaultAvatarFullUrl)
+            except resource.Redirect as r:
+                return r
+            if res is not None:
+                return res
+        return None
+
     @defer.inlineCallbacks
     def renderAvatar(self, request):
         email = request.args.get(b"email", [b""])[0]
@@ -254,17 +397,12 @@ class AvatarResource(resource.Resource):
             size = 32
         username = request.args.get(b"username", [None])[0]
         cache_key = (email, username, size)
-        if self.cache.get(cache_key):
-            raise self.cache[cache_key]
-        for method in self.avatarMethods:
-            try:
-                res = yield method.getUserAvatar(email, username, size, self.defaultAvatarFullUrl)
-            except resource.Redirect as r:
-                self.cache[cache_key] = r
-                raise
-            if res is not None:
-                request.setHeader(b'content-type', res[0])
-                request.setHeader(b'content-length', unicode2bytes(str(len(res[1]))))
-                request.write(res[1])
-                return
+        res = yield self.cache.get(cache_key, lambda: self._lookupAvatar(email, username, size))
+        if isinstance(res, resource.Redirect):
+            raise res
+        if res is not None:
+            request.setHeader(b'content-type', res[0])
+            request.setHeader(b'content-length', unicode2bytes(str(len(res[1]))))
+            request.write(res[1])
+            return
         raise resource.Redirect(self.defaultAvatarUrl)
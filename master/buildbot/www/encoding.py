@@ -16,10 +16,17 @@
 from __future__ import annotations
 
 import re
+import time
+import zlib
 
+from twisted.internet import defer
+from twisted.internet import threads
 from twisted.web import iweb
 from zope.interface import implementer
 
+from buildbot import config
+from buildbot.process import metrics
+
 try:
     import brotli
 except ImportError:
@@ -31,13 +38,96 @@ except ImportError:
     zstandard = None  # type: ignore[assignment]
 
 
+class ResponseEncodingPolicy:
+    """
+    Describes how responses of the web server are compressed: the preferred encodings, the
+    minimum size of a response worth compressing, the compression level per content type and
+    the size of bodies which are written (and thus compressed) outside of the reactor thread.
+    """
+
+    known_encodings = ('br', 'zstd', 'gzip')
+
+    # these are the levels used before the policy was configurable
+    default_levels = {'br': 11, 'zstd': 3, 'gzip': 9}
+
+    def __init__(
+        self,
+        encodings=('br', 'zstd', 'gzip'),
+        min_size=1024,
+        levels=None,
+        thread_min_size=256 * 1024,
+    ):
+        for encoding in encodings:
+            if encoding not in self.known_encodings:
+                config.error(
+                    f"unknown response encoding {encoding!r}, must be one of "
+                    f"{', '.join(self.known_encodings)}"
+                )
+        if not isinstance(min_size, int) or min_size < 0:
+            config.error("response encoding min_size must be a non-negative integer")
+        if not isinstance(thread_min_size, int) or thread_min_size < 0:
+            config.error("response encoding thread_min_size must be a non-negative integer")
+
+        self.encodings = tuple(encodings)
+        self.min_size = min_size
+        self.thread_min_size = thread_min_size
+        # content type (e.g. 'application/json' or 'text/*') -> encoding -> level
+        self.levels = levels or {}
+
+    def get_level(self, encoding: str, content_type: bytes | None) -> int:
+        if content_type is not None:
+            mime_type = content_type.split(b';', 1)[0].strip().decode('ascii', 'replace')
+            for key in (mime_type, mime_type.split('/', 1)[0] + '/*', '*'):
+                levels = self.levels.get(key)
+                if levels is not None and encoding in levels:
+                    return levels[encoding]
+        elif '*' in self.levels and encoding in self.levels['*']:
+            return self.levels['*'][encoding]
+        return self.default_levels[encoding]
+
+    def should_encode(self, request) -> bool:
+        """
+        Called just before the response headers are written. Responses whose size is known and
+        is smaller than min_size are not worth the compression overhead.
+        """
+        content_length = request.responseHeaders.getRawHeaders(b"content-length")
+        if content_length:
+            try:
+                return int(content_length[0]) >= self.min_size
+            except ValueError:
+                pass
+        return True
+
+
+def compress_in_thread(request, data: bytes) -> defer.Deferred[None]:
+    """
+    Compresses data in a thread, if the response of the request is encoded. The request must
+    then be written with data from the reactor thread, which does not compress it again.
+    """
+    encoder = getattr(request, '_encoder', None)
+    if not isinstance(encoder, _EncoderBase):
+        return defer.succeed(None)
+    return encoder.compress_in_thread(data)
+
+
+def get_response_encoding_policy(www_config) -> ResponseEncodingPolicy:
+    policy = www_config.get('response_encoding')
+    if policy is None:
+        return ResponseEncodingPolicy()
+    return policy
+
+
 @implementer(iweb._IRequestEncoderFactory)
 class _EncoderFactoryBase:
     def __init__(
-        self, encoding_type: bytes, encoder_class: type[iweb._IRequestEncoder] | None
+        self,
+        encoding_type: bytes,
+        encoder_class: type[_EncoderBase] | None,
+        policy: ResponseEncodingPolicy | None = None,
     ) -> None:
         self.encoding_type = encoding_type
         self.encoder_class = encoder_class
+        self.policy = policy if policy is not None else ResponseEncodingPolicy()
         self.check_regex = re.compile(rb"(:?^|[\s,])" + encoding_type + rb"(:?$|[\s,])")
 
     def encoderForRequest(self, request):
@@ -50,31 +140,69 @@ class _EncoderFactoryBase:
 
         acceptHeaders = b",".join(request.requestHeaders.getRawHeaders(b"accept-encoding", []))
         if self.check_regex.search(acceptHeaders):
-            encoding = request.responseHeaders.getRawHeaders(b"content-encoding")
-            if encoding:
-                encoding = b",".join([*encoding, self.encoding_type])
-            else:
-                encoding = self.encoding_type
-
-            request.responseHeaders.setRawHeaders(b"content-encoding", [encoding])
-            return self.encoder_class(request)
+            return self.encoder_class(request, self.encoding_type, self.policy)
         return None
 
 
 class BrotliEncoderFactory(_EncoderFactoryBase):
-    def __init__(self) -> None:
-        super().__init__(b'br', _BrotliEncoder if brotli is not None else None)
+    def __init__(self, policy: ResponseEncodingPolicy | None = None) -> None:
+        super().__init__(b'br', _BrotliEncoder if brotli is not None else None, policy)
 
 
 class ZstandardEncoderFactory(_EncoderFactoryBase):
-    def __init__(self) -> None:
-        super().__init__(b'zstd', _ZstdEncoder if zstandard is not None else None)
+    def __init__(self, policy: ResponseEncodingPolicy | None = None) -> None:
+        super().__init__(b'zstd', _ZstdEncoder if zstandard is not None else None, policy)
+
+
+class GzipEncoderFactory(_EncoderFactoryBase):
+    def __init__(self, policy: ResponseEncodingPolicy | None = None) -> None:
+        super().__init__(b'gzip', _GzipEncoder, policy)
+
+
+@implementer(iweb._IRequestEncoderFactory)
+class ResponseEncoderFactory:
+    """
+    Selects the first encoding of the policy which is accepted by the client.
+    """
+
+    factory_classes = {
+        'br': BrotliEncoderFactory,
+        'zstd': ZstandardEncoderFactory,
+        'gzip': GzipEncoderFactory,
+    }
+
+    def __init__(self, policy: ResponseEncodingPolicy | None = None) -> None:
+        self.set_policy(policy if policy is not None else ResponseEncodingPolicy())
+
+    def set_policy(self, policy: ResponseEncodingPolicy) -> None:
+        self.policy = policy
+        self._factories = [self.factory_classes[e](policy) for e in policy.encodings]
+
+    def encoderForRequest(self, request):
+        for factory in self._factories:
+            encoder = factory.encoderForRequest(request)
+            if encoder is not None:
+                return encoder
+        return None
 
 
 @implementer(iweb._IRequestEncoder)
 class _EncoderBase:
-    def __init__(self, request) -> None:
+    def __init__(self, request, encoding_type: bytes, policy: ResponseEncodingPolicy) -> None:
         self._request = request
+        self._encoding_type = encoding_type
+        self._policy = policy
+        # whether to encode is decided just before the first write, when the response
+        # headers are known
+        self._enabled: bool | None = None
+        self._elapsed = 0.0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        # (data, compressed data) compressed by compress_in_thread, not written yet
+        self._precompressed: tuple[bytes, bytes] | None = None
+
+    def _create_compressor(self, level: int) -> None:
+        pass
 
     def _compress(self, data: bytes) -> bytes:
         return data
@@ -82,27 +210,96 @@ class _EncoderBase:
     def _flush(self) -> bytes:
         return b''
 
+    def _start_encoding(self) -> bool:
+        if self._request.startedWriting or not self._policy.should_encode(self._request):
+            return False
+
+        encoding = self._request.responseHeaders.getRawHeaders(b"content-encoding")
+        if encoding:
+            encoding = b",".join([*encoding, self._encoding_type])
+        else:
+            encoding = self._encoding_type
+        self._request.responseHeaders.setRawHeaders(b"content-encoding", [encoding])
+        # Remove the content-length header, we can't honor it
+        # because we compress on the fly.
+        self._request.responseHeaders.removeHeader(b"content-length")
+
+        content_type = self._request.responseHeaders.getRawHeaders(b"content-type")
+        self._create_compressor(
+            self._policy.get_level(
+                self._encoding_type.decode(), content_type[0] if content_type else None
+            )
+        )
+        return True
+
+    def compress_in_thread(self, data: bytes) -> defer.Deferred[None]:
+        """
+        Compresses data in a thread, for the next call to encode with it. The request is only
+        used from the reactor thread.
+        """
+        if self._enabled is None:
+            self._enabled = self._start_encoding()
+        if not self._enabled:
+            return defer.succeed(None)
+
+        d = threads.deferToThread(self._compress_measured, data)
+
+        @d.addCallback
+        def set_precompressed(compressed: bytes) -> None:
+            self._precompressed = (data, compressed)
+
+        return d
+
     def encode(self, data):
         """
         Write to the request, automatically compressing data on the fly.
         """
-        if not self._request.startedWriting:
-            # Remove the content-length header, we can't honor it
-            # because we compress on the fly.
-            self._request.responseHeaders.removeHeader(b"content-length")
-        return self._compress(data)
+        if self._precompressed is not None and self._precompressed[0] is data:
+            compressed = self._precompressed[1]
+            self._precompressed = None
+            return compressed
+
+        if self._enabled is None:
+            self._enabled = self._start_encoding()
+        if not self._enabled:
+            return data
+        return self._compress_measured(data)
+
+    def _compress_measured(self, data: bytes) -> bytes:
+        start = time.perf_counter()
+        compressed = self._compress(data)
+        self._elapsed += time.perf_counter() - start
+        self._bytes_in += len(data)
+        self._bytes_out += len(compressed)
+        return compressed
 
     def finish(self):
         """
         Finish handling the request request, flushing any data from the buffer.
         """
-        return self._flush()
+        if not self._enabled:
+            if self._enabled is not None:
+                metrics.MetricCountEvent.log(f"www.encoding.{self._encoding_type.decode()}.skipped")
+            return b''
+
+        start = time.perf_counter()
+        data = self._flush()
+        self._elapsed += time.perf_counter() - start
+        self._bytes_out += len(data)
+
+        name = self._encoding_type.decode()
+        metrics.MetricTimeEvent.log(f"www.encoding.{name}", self._elapsed)
+        metrics.MetricCountEvent.log(f"www.encoding.{name}.bytes_in", self._bytes_in)
+        metrics.MetricCountEvent.log(f"www.encoding.{name}.bytes_out", self._bytes_out)
+        return data
 
 
 class _BrotliEncoder(_EncoderBase):
-    def __init__(self, request):
-        super().__init__(request)
-        self._compressor = brotli.Compressor() if brotli is not None else None
+    _compressor = None
+
+    def _create_compressor(self, level: int) -> None:
+        if brotli is not None:
+            self._compressor = brotli.Compressor(quality=level)
 
     def _compress(self, data: bytes) -> bytes:
         if self._compressor is not None:
@@ -118,22 +315,42 @@ class _BrotliEncoder(_EncoderBase):
 
 
 class _ZstdEncoder(_EncoderBase):
-    def __init__(self, request):
-        super().__init__(request)
-        self._compressor = (
-            zstandard.ZstdCompressor(write_content_size=True) if zstandard is not None else None
-        )
-        self._compressobj = self._compressor.compressobj() if zstandard is not None else None
+    _compressor = None
+    _compressobj = None
+
+    def _create_compressor(self, level: int) -> None:
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=level, write_content_size=True)
+            self._compressobj = self._compressor.compressobj()
 
     def _compress(self, data: bytes) -> bytes:
-        if self._compressor is not None:
+        if self._compressobj is not None:
             return self._compressobj.compress(data)
         return data
 
     def _flush(self) -> bytes:
-        if self._compressor is not None:
+        if self._compressobj is not None:
             c_data = self._compressobj.flush()
             self._compressor = None
             self._compressobj = None
             return c_data
         return b''
+
+
+class _GzipEncoder(_EncoderBase):
+    _compressobj = None
+
+    def _create_compressor(self, level: int) -> None:
+        self._compressobj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def _compress(self, data: bytes) -> bytes:
+        if self._compressobj is not None:
+            return self._compressobj.compress(data)
+        return data
+
+    def _flush(self) -> bytes:
+        if self._compressobj is not None:
+            data = self._compressobj.flush()
+            self._compressobj = None
+            return data
+        return b''
@@ -13,8 +13,13 @@
 #
 # Copyright Buildbot Team Members
 
+from __future__ import annotations
+
+import re
 import sys
+from collections import OrderedDict
 
+from twisted.web import http
 from twisted.web import static
 
 from buildbot.util import bytes2unicode
@@ -27,13 +32,173 @@ else:
     import importlib_resources  # type: ignore[import-not-found]
 
 
+def _accepted_encodings(request) -> set[bytes]:
+    accepted: set[bytes] = set()
+    header = request.getHeader(b"accept-encoding")
+    if header is None:
+        return accepted
+    for item in header.split(b","):
+        params = [p.strip() for p in item.split(b";")]
+        encoding = params[0].lower()
+        quality = 1.0
+        for param in params[1:]:
+            if param.startswith(b"q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if encoding and quality > 0:
+            accepted.add(encoding)
+    return accepted
+
+
+class StaticFileCache:
+    """
+    A small LRU cache holding the content of small static files in memory. Entries are
+    validated against the modification time and size of the file on every access.
+    """
+
+    def __init__(self, max_file_size=64 * 1024, max_total_size=16 * 1024 * 1024):
+        self.max_file_size = max_file_size
+        self.max_total_size = max_total_size
+        self.total_size = 0
+        self._entries: OrderedDict[str, tuple[float, int, bytes]] = OrderedDict()
+
+    def get(self, file: static.File) -> bytes | None:
+        mtime = file.getModificationTime()
+        size = file.getsize()
+        if size > self.max_file_size:
+            return None
+
+        entry = self._entries.get(file.path)
+        if entry is not None:
+            if entry[0] == mtime and entry[1] == size:
+                self._entries.move_to_end(file.path)
+                return entry[2]
+            self._remove(file.path)
+
+        try:
+            with file.open() as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        self._entries[file.path] = (mtime, size, data)
+        self.total_size += len(data)
+        while self.total_size > self.max_total_size:
+            self._remove(next(iter(self._entries)))
+        return data
+
+    def _remove(self, path):
+        _, _, data = self._entries.pop(path)
+        self.total_size -= len(data)
+
+
+class StaticFile(static.File):
+    """
+    A static.File which serves precompressed variants (e.g. ``scripts.js.br``) of the
+    requested file when they exist and the client accepts them, marks content-hashed
+    assets as immutable and keeps small files in memory.
+    """
+
+    contentEncodings = {**static.File.contentEncodings, ".br": "br"}
+
+    # in order of preference
+    precompressed_encodings = [(b"br", ".br"), (b"gzip", ".gz")]
+
+    # vite puts all content-hashed files into the assets directory. Additionally, handle
+    # the hex hashes produced by other bundlers, e.g. scripts.0123abcd.js
+    hashed_asset_dirs = ("assets",)
+    hashed_asset_re = re.compile(r"[-.][0-9a-f]{8,}\.")
+    immutable_max_age = 365 * 24 * 3600
+
+    def __init__(
+        self, path, defaultType="text/html", ignoredExts=(), registry=None, file_cache=None
+    ):
+        super().__init__(path, defaultType, ignoredExts, registry)
+        self.file_cache = file_cache if file_cache is not None else StaticFileCache()
+
+    def createSimilarFile(self, path):
+        f = super().createSimilarFile(path)
+        f.file_cache = self.file_cache
+        return f
+
+    def is_hashed_asset(self) -> bool:
+        if self.parent().basename() in self.hashed_asset_dirs:
+            return True
+        return self.hashed_asset_re.search(self.basename()) is not None
+
+    def _set_cache_headers(self, request):
+        if self.is_hashed_asset():
+            request.setHeader(
+                b"cache-control", f"public, max-age={self.immutable_max_age}, immutable".encode()
+            )
+        else:
+            # let clients (and proxies) revalidate using Last-Modified
+            request.setHeader(b"cache-control", b"no-cache")
+
+    def _find_precompressed_variant(self, request) -> StaticFile | None:
+        accepted = _accepted_encodings(request)
+        has_variants = False
+        selected = None
+        for encoding, ext in self.precompressed_encodings:
+            variant = self.createSimilarFile(self.path + ext)
+            if not variant.isfile():
+                continue
+            has_variants = True
+            if encoding in accepted:
+                selected = variant
+                break
+
+        if has_variants:
+            request.setHeader(b"vary", b"Accept-Encoding")
+        return selected
+
+    def _render_from_memory(self, request, data):
+        request.setHeader(b"accept-ranges", b"bytes")
+        if request.setLastModified(self.getModificationTime()) is http.CACHED:
+            return b""
+        self._setContentHeaders(request, len(data))
+        if request.method == b"HEAD":
+            return b""
+        return data
+
+    def render_GET(self, request):
+        self.restat(False)
+
+        if self.type is None:
+            self.type, self.encoding = static.getTypeAndEncoding(
+                self.basename(), self.contentTypes, self.contentEncodings, self.defaultType
+            )
+
+        if not self.isfile():
+            return super().render_GET(request)
+
+        self._set_cache_headers(request)
+
+        # files that are already encoded are served as is
+        if self.encoding is None:
+            variant = self._find_precompressed_variant(request)
+            if variant is not None:
+                return variant.render_GET(request)
+
+        if request.getHeader(b"range") is None:
+            data = self.file_cache.get(self)
+            if data is not None:
+                return self._render_from_memory(request, data)
+
+        return super().render_GET(request)
+
+    render_HEAD = render_GET
+
+
 class Application:
     def __init__(self, package_name, description, ui=True):
         self.description = description
         self.version = importlib_resources.files(package_name).joinpath("VERSION")
         self.version = bytes2unicode(self.version.read_bytes())
         self.static_dir = importlib_resources.files(package_name) / "static"
-        self.resource = static.File(self.static_dir)
+        self.resource = StaticFile(self.static_dir)
         self.ui = ui
 
     def setMaster(self, master):
@@ -29,7 +29,6 @@ from twisted.internet.error import ConnectionDone
 from twisted.python import log
 from twisted.web.error import Error
 from twisted.web.resource import EncodingResourceWrapper
-from twisted.web.server import GzipEncoderFactory
 
 from buildbot.data import exceptions
 from buildbot.data.base import EndpointKind
@@ -38,8 +37,9 @@ from buildbot.util import toJson
 from buildbot.util import unicode2bytes
 from buildbot.www import resource
 from buildbot.www.authz import Forbidden
-from buildbot.www.encoding import BrotliEncoderFactory
-from buildbot.www.encoding import ZstandardEncoderFactory
+from buildbot.www.encoding import ResponseEncoderFactory
+from buildbot.www.encoding import compress_in_thread
+from buildbot.www.encoding import get_response_encoding_policy
 
 if TYPE_CHECKING:
     from typing import Any
@@ -78,6 +78,7 @@ JSON_ENCODED = b"application/json"
 
 class RestRootResource(resource.Resource):
     version_classes: dict[int, type[V2RootResource]] = {}
+    needsReconfig = True
 
     @classmethod
     def addApiVersion(cls, version, version_cls):
@@ -88,23 +89,24 @@ class RestRootResource(resource.Resource):
         super().__init__(master)
 
         min_vers = master.config.www.get('rest_minimum_version', 0)
-        encoders = [
-            BrotliEncoderFactory(),
-            ZstandardEncoderFactory(),
-            GzipEncoderFactory(),
-        ]
+        self.encoder_factory = ResponseEncoderFactory(
+            get_response_encoding_policy(master.config.www)
+        )
 
         latest = max(list(self.version_classes))
         for version, klass in self.version_classes.items():
             if version < min_vers:
                 continue
-            child = EncodingResourceWrapper(klass(master), encoders)
+            child = EncodingResourceWrapper(klass(master), [self.encoder_factory])
             child_path = f'v{version}'
             child_path = unicode2bytes(child_path)
             self.putChild(child_path, child)
             if version == latest:
                 self.putChild(b'latest', child)
 
+    def reconfigResource(self, new_config):
+        self.encoder_factory.set_policy(get_response_encoding_policy(new_config.www))
+
     def render(self, request):
         request.setHeader(b"content-type", JSON_ENCODED)
         min_vers = self.master.config.www.get('rest_minimum_version', 0)
@@ -336,7 +338,14 @@ class V2RootResource(resource.Resource):
             )
 
         if not is_stream_data:
-            request.write(unicode2bytes(data['raw']))
+            raw = unicode2bytes(data['raw'])
+            request.setHeader(b"content-length", unicode2bytes(str(len(raw))))
+            if len(raw) >= self.encoding_policy.thread_min_size:
+                # keep the compression of large bodies off the reactor
+                await compress_in_thread(request, raw)
+                if _is_request_finished(request):
+                    return
+            request.write(raw)
             return
 
         async for chunk in data['raw']:
@@ -429,6 +438,7 @@ class V2RootResource(resource.Resource):
         # and copy some other flags
         self.debug = new_config.www.get('debug')
         self.cache_seconds = new_config.www.get('json_cache_seconds', 0)
+        self.encoding_policy = get_response_encoding_policy(new_config.www)
 
     def render(self, request):
         def writeError(msg, errcode=400):
@@ -16,9 +16,13 @@
 from __future__ import annotations
 
 import calendar
+import copy
 import datetime
+import json
 import os
+import time
 from binascii import hexlify
+from collections import OrderedDict
 
 import jwt
 import twisted
@@ -37,6 +41,7 @@ from zope.interface import implementer
 
 from buildbot import config
 from buildbot.plugins.db import get_plugins
+from buildbot.process import metrics
 from buildbot.util import bytes2unicode
 from buildbot.util import service
 from buildbot.util import unicode2bytes
@@ -47,6 +52,7 @@ from buildbot.www import config as wwwconfig
 from buildbot.www import rest
 from buildbot.www import sse
 from buildbot.www import ws
+from buildbot.www.authz import Forbidden
 
 # as per:
 # http://security.stackexchange.com/questions/95972/what-are-requirements-for-hmac-secret-key
@@ -82,6 +88,10 @@ class BuildbotSession(server.Session):
         self.user_info = {"anonymous": True}
 
     def _fromToken(self, token):
+        user_info = self.site.getVerifiedToken(token)
+        if user_info is not None:
+            self.user_info = user_info
+            return
         try:
             decoded = jwt.decode(
                 token, self.site.session_secret, algorithms=[SESSION_SECRET_ALGORITHM]
@@ -99,6 +109,7 @@ class BuildbotSession(server.Session):
             raise KeyError(str(e)) from e
         # might raise KeyError: will be caught by caller, which makes the token invalid
         self.user_info = decoded['user_info']
+        self.site.addVerifiedToken(token, decoded)
 
     def updateSession(self, request):
         """
@@ -150,11 +161,16 @@ class BuildbotSite(server.Site):
     Supports rotating logs, and JWT sessions
     """
 
+    # maximum number of session tokens whose signature verification is remembered
+    verifiedTokensCacheSize = 1000
+
     def __init__(self, root, logPath, rotateLength, maxRotatedFiles):
         super().__init__(root, logPath=logPath)
         self.rotateLength = rotateLength
         self.maxRotatedFiles = maxRotatedFiles
         self.session_secret = None
+        # token -> (expiration timestamp or None, user_info), in least recently used order
+        self._verified_tokens = OrderedDict()
 
     def _openLogFile(self, path):
         self._nativeize = True
@@ -168,6 +184,30 @@ class BuildbotSite(server.Site):
 
     def setSessionSecret(self, secret):
         self.session_secret = secret
+        self._verified_tokens.clear()
+
+    def getVerifiedToken(self, token):
+        """
+        Returns the user info of a session token whose signature has already been verified, or
+        None if the token is unknown or expired.
+        """
+        entry = self._verified_tokens.get(token)
+        if entry is not None:
+            exp, user_info = entry
+            if exp is None or exp > time.time():
+                self._verified_tokens.move_to_end(token)
+                metrics.MetricCountEvent.log('www.session_token_cache.hits')
+                # the session may update its user info, which must not affect the cache
+                return copy.deepcopy(user_info)
+            del self._verified_tokens[token]
+        metrics.MetricCountEvent.log('www.session_token_cache.misses')
+        return None
+
+    def addVerifiedToken(self, token, decoded):
+        self._verified_tokens[token] = (decoded.get('exp'), copy.deepcopy(decoded['user_info']))
+        self._verified_tokens.move_to_end(token)
+        while len(self._verified_tokens) > self.verifiedTokensCacheSize:
+            self._verified_tokens.popitem(last=False)
 
     def makeSession(self):
         """
@@ -190,8 +230,15 @@ class BuildbotSite(server.Site):
 class WWWService(service.ReconfigurableServiceMixin, service.AsyncMultiService):
     name: str | None = 'www'  # type: ignore[assignment]
 
+    # the authorization decisions of the GET requests are remembered for that many seconds for
+    # each user and endpoint
+    authzCacheTtl = 10
+    authzCacheSize = 1000
+
     def __init__(self):
         super().__init__()
+        # (user, endpoint) -> (expiration time, message of the denial or None)
+        self._authz_cache = OrderedDict()
 
         self.port = None
         self.port_service = None
@@ -212,6 +259,7 @@ class WWWService(service.ReconfigurableServiceMixin, service.AsyncMultiService):
         self.authz = www.get('authz')
         if self.authz is not None:
             self.authz.setMaster(self.master)
+        self._authz_cache.clear()
         need_new_site = False
         if self.site:
             # if config params have changed, set need_new_site to True.
@@ -432,6 +480,31 @@ class WWWService(service.ReconfigurableServiceMixin, service.AsyncMultiService):
         session = request.getSession()
         return session.user_info
 
+    @defer.inlineCallbacks
     def assertUserAllowed(self, request, ep, action, options):
         user_info = self.getUserInfos(request)
-        return self.authz.assertUserAllowed(ep, action, options, user_info)
+        if options or bytes2unicode(action).lower() != 'get':
+            # the decision may depend on the options, e.g. on the owner of a build, and the
+            # control actions are rare enough not to be cached
+            yield self.authz.assertUserAllowed(ep, action, options, user_info)
+            return
+
+        key = (json.dumps(user_info, sort_keys=True, default=str), tuple(ep))
+        now = self.master.reactor.seconds()
+        entry = self._authz_cache.get(key)
+        if entry is None or entry[0] <= now:
+            # only the message of a denial is kept, not the exception and its traceback
+            try:
+                yield self.authz.assertUserAllowed(ep, action, options, user_info)
+                denial = None
+            except Forbidden as e:
+                denial = e.message
+            entry = (now + self.authzCacheTtl, denial)
+            self._authz_cache[key] = entry
+            while len(self._authz_cache) > self.authzCacheSize:
+                self._authz_cache.popitem(last=False)
+        else:
+            self._authz_cache.move_to_end(key)
+
+        if entry[1] is not None:
+            raise Forbidden(entry[1])
@@ -467,7 +467,7 @@ setup_args = {
                 [
                     # Connection seems to be a way too generic name, though
                     ('buildbot.worker.libvirt', ['Connection']),
-                    ('buildbot.changes.filter', ['ChangeFilter']),
+                    ('buildbot.changes.filter', ['ChangeFilter', 'ImportantFiles']),
                     ('buildbot.changes.gerritchangesource', ['GerritChangeFilter']),
                     (
                         'buildbot.changes.svnpoller',
@@ -582,6 +582,10 @@ setup_args = {
                         ],
                     ),
                     ('buildbot.util.ssfilter', ['SourceStampFilter']),
+                    (
+                        'buildbot.process.buildrequestdistributor',
+                        ['FairShareBuilderPrioritizer', 'PredictiveWorkerSelector'],
+                    ),
                     ('buildbot.www.avatar', ['AvatarGravatar', 'AvatarGitHub']),
                     (
                         'buildbot.www.auth',
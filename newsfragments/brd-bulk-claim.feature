@@ -0,0 +1 @@
+The build request distributor now chooses all the builds it can start on a builder before claiming their build requests, and claims them in a single database transaction. Claims made while another claim is running are batched together, and a conflict on one build request only fails the build it belongs to.
@@ -0,0 +1 @@
+With the default ``collapseRequests`` strategy, collapsible build requests are now found through an in-memory index of collapse keys instead of comparing the new request with every unclaimed request, and the collapsed requests are claimed and completed in batches.
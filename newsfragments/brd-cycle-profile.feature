@@ -0,0 +1 @@
+The build request distributor now reports the time spent in each phase of its cycles and the reason why each builder did not start more builds as metrics, and can keep its recent cycles for the new ``/distributor_cycles`` data API endpoint, configured with the ``distributor_cycles`` key of :bb:cfg:`metrics`.
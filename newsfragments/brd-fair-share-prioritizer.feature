@@ -0,0 +1 @@
+Added ``util.FairShareBuilderPrioritizer``, a :bb:cfg:`prioritizeBuilders` policy that shares the workers between projects according to their weights, with optional per-project quotas of running builds and aging of the waiting build requests.
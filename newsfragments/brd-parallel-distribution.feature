@@ -0,0 +1 @@
+The new :bb:cfg:`build_distribution_concurrency` setting lets the build request distributor handle several builders at once, while builders sharing a worker are still handled one after another.
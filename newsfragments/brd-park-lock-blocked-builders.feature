@@ -0,0 +1 @@
+Builders that cannot start builds because a lock is taken are no longer re-evaluated each time any lock is released; they are retried when one of the locks blocking them is released. The time builders spend blocked on each lock is reported as the ``BuildRequestDistributor.blocked_on_lock.<lock name>`` metric.
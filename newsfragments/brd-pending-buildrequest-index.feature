@@ -0,0 +1 @@
+The build request distributor now keeps the unclaimed build requests of each builder in memory, maintained from the build request events, instead of querying the database for every builder in every distribution cycle.
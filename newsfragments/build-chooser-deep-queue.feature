@@ -0,0 +1 @@
+Picking builds from a builder with a deep queue of build requests no longer takes quadratic time: the build chooser now looks up unclaimed requests by id and keeps them in a priority heap.
@@ -0,0 +1 @@
+Builders now expose ``highest_priority``, ``oldest_request_time`` and ``newest_complete_time`` attributes, kept in memory from the build request messages, so that :bb:cfg:`prioritizeBuilders` functions can order builders without accessing the database.
@@ -0,0 +1 @@
+Adding a buildset now inserts its build requests with a single multi-row insert, and loads them back at once to collapse them and to produce their ``new`` events, which makes schedulers triggering many builders much faster.
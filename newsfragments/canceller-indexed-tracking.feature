@@ -0,0 +1 @@
+``OldBuildCanceller`` now indexes the tracked build requests by builder and branch, so that finding the obsoleted requests only visits them, and evaluates its filters once per source stamp for all the builders sharing them.
@@ -0,0 +1 @@
+The first common commit of two codebase commits is now computed with a single recursive query for the ancestors that are not cached yet, and the cache of commit parents is bounded.
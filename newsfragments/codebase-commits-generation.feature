@@ -0,0 +1 @@
+Codebase commits now store their generation, the number of their ancestors, which is used to prune the search for the first common commit of two commits. The parents of the recent commits are cached in compact arrays indexed by commit id, and those of older commits in a bounded LRU cache.
@@ -0,0 +1 @@
+Added a ``/build_matrix`` data API endpoint which returns the recent changes along with the builds started for them in two database queries, so that views such as the grid and console can be built without fetching every build and build request. Build starts and finishes are also sent as ``build_matrix`` cell events for incremental updates.
@@ -0,0 +1 @@
+Added ``util.PredictiveWorkerSelector``, a :bb:cfg:`select_next_worker` strategy that prefers workers that recently ran the same builder and run it the fastest.
@@ -0,0 +1 @@
+The scheduler manager now loads each new change once and delivers it to all the schedulers, instead of every scheduler loading it separately, and reports the fan-out time as the ``SchedulerManager.change_fanout`` metric.
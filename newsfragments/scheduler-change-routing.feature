@@ -0,0 +1 @@
+The scheduler manager now indexes the change filters of the schedulers, so that each new change is only delivered to the schedulers whose filter may match it.
@@ -0,0 +1 @@
+Schedulers with a ``treeStableTimer`` now keep the change classifications in memory, and write them to the database in batches at most ``classificationsWriteDelay`` seconds (5 by default) after the changes are received instead of once per change.
@@ -0,0 +1 @@
+Added ``util.ImportantFiles``, a declarative form of the ``fileIsImportant`` scheduler argument with include and exclude path globs; the rules of all the schedulers are matched at once against the files of each change.
@@ -0,0 +1 @@
+The ``Nightly`` and ``Periodic`` schedulers now share a single timer queue owned by the scheduler manager instead of keeping one reactor delayed call each, and the next build time of ``Nightly`` schedulers is computed once per minute for each cron line.
@@ -0,0 +1 @@
+Timed schedulers firing at the same time now load their change classifications and ``onlyIfChanged`` state with a single query for all of them, and the new ``jitter`` option of ``Nightly`` and ``Periodic`` staggers their actuations.
@@ -0,0 +1,2 @@
+Avatar lookups are now cached with a configurable time to live, including lookups which did not find any avatar, and concurrent lookups of the same avatar are coalesced.
+The cache can optionally be persisted in the database with the new ``www['avatar_cache']`` setting, and ``AvatarGitHub`` limits the number of concurrent requests to the GitHub API.
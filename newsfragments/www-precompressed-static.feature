@@ -0,0 +1 @@
+The web server now serves precompressed ``.br`` and ``.gz`` variants of www plugin static files when the client accepts them, marks content-hashed assets as immutable and keeps small static files in memory.
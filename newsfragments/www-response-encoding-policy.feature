@@ -0,0 +1 @@
+Added ``www['response_encoding']`` to configure the compression of REST API responses: preferred encodings, a minimum response size, compression levels per content type and the size of bodies compressed in a thread. Encoder timings are reported as metrics.
@@ -0,0 +1,2 @@
+The web server now remembers the session tokens whose signature it has verified until they expire, and caches for a few seconds the authorization decisions of ``GET`` requests for each user and endpoint.
+The hit rate of the session token cache is reported through the ``www.session_token_cache.hits`` and ``www.session_token_cache.misses`` metrics.
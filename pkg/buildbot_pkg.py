@@ -16,6 +16,7 @@
 # Method to add build step taken from here
 # https://seasonofcode.com/posts/how-to-add-custom-build-steps-and-commands-to-setuppy.html
 import datetime
+import gzip
 import logging
 import os
 import re
@@ -159,6 +160,40 @@ def getVersion(init_file):
         return "0.0.0"
 
 
+PRECOMPRESSED_EXTENSIONS = ('.css', '.html', '.js', '.json', '.map', '.svg', '.txt')
+PRECOMPRESS_MIN_SIZE = 1024
+
+
+def precompress_static_files(static_dir):
+    """Write .gz and, when brotli is available, .br variants next to the compressible files
+    of static_dir, so that the master can serve them without compressing on the fly."""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    for dirpath, _, filenames in os.walk(static_dir):
+        for filename in filenames:
+            if not filename.endswith(PRECOMPRESSED_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < PRECOMPRESS_MIN_SIZE:
+                continue
+
+            variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(data, quality=11)))
+
+            for ext, compressed in variants:
+                # not worth it if the compressed file is not significantly smaller
+                if len(compressed) > len(data) * 0.9:
+                    continue
+                with open(path + ext, 'wb') as f:
+                    f.write(compressed)
+
+
 # JS build strategy:
 #
 # Obviously, building javascript with setuptools is not really something supported initially
@@ -240,6 +275,7 @@ class BuildJsCommand(Command):
         self.copy_tree(
             os.path.join(package, 'static'), os.path.join("build", "lib", package, "static")
         )
+        precompress_static_files(os.path.join("build", "lib", package, "static"))
 
         assert self.distribution.metadata.version is not None, "version is not set"
         with open(os.path.join("build", "lib", package, "VERSION"), "w") as f: